@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark et_micc.expand.expand_templates
+=========================================
+
+Latency of creating a project as a function of the number of templates expanded
+(the templates of ``micc create --package``, in order), with the templates expanded
+one after another (``MAX_WORKERS = 1``) and concurrently.
+
+Usage::
+
+    python benchmarks/bench_expand.py [repetitions]
+
+The template cache is warmed up first, so the timings measure rendering and
+writing, not compiling the templates.
+"""
+
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import statistics
+from pathlib import Path
+from types import SimpleNamespace
+
+import et_micc.expand
+import et_micc.logger
+
+TEMPLATES = ['package-base', 'package-general', 'package-simple-docs', 'package-general-docs']
+
+
+def create(output_dir, templates, i):
+    """Expand *templates* as project FOO<i> in *output_dir*, and return the time it took."""
+    logger = et_micc.logger.IndentingLogger('bench', level=logging.WARNING)
+    parameters = {'project_name': f'FOO{i}', 'package_name': f'foo{i}'
+                 ,'project_short_description': 'Benchmark project.'
+                 }
+    parameters.update(et_micc.expand.get_template_parameters(
+        et_micc.expand.get_preferences(Path(et_micc.expand.__file__).parent / 'micc.json')))
+    options = SimpleNamespace(templates=templates
+                             ,project_path=output_dir / f'FOO{i}'
+                             ,template_parameters=parameters
+                             ,logger=logger
+                             ,overwrite=False
+                             ,backup=False
+                             )
+    start = time.perf_counter()
+    exit_code = et_micc.expand.expand_templates(options)
+    elapsed = time.perf_counter() - start
+    assert exit_code == 0
+    return elapsed
+
+
+def main(repetitions=20):
+    output_dir = Path(tempfile.mkdtemp())
+    try:
+        create(output_dir, TEMPLATES, 'warmup')
+        i = 0
+        print(f"{'templates':>10} {'sequential [ms]':>16} {'concurrent [ms]':>16}")
+        for n in range(1, len(TEMPLATES) + 1):
+            timings = []
+            for max_workers in (1, et_micc.expand.MAX_WORKERS):
+                saved, et_micc.expand.MAX_WORKERS = et_micc.expand.MAX_WORKERS, max_workers
+                samples = []
+                for _ in range(repetitions):
+                    i += 1
+                    samples.append(create(output_dir, TEMPLATES[:n], i))
+                et_micc.expand.MAX_WORKERS = saved
+                timings.append(1000 * statistics.median(samples))
+            print(f"{n:>10} {timings[0]:>16.2f} {timings[1]:>16.2f}")
+    finally:
+        shutil.rmtree(str(output_dir))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
+
+#eof
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark et_micc.pypi.NameIndex.similar
+========================================
+
+Time to find the names within edit distance 1 and 2 of a number of queries in a
+snapshot of synthetic project names, with the trigram index of
+:py:class:`et_micc.pypi.GramIndex`, and with a linear scan of the names (only
+for the smallest snapshot, it takes minutes for the larger ones). The names are
+made of words taken from the identifiers in the standard library, e.g.
+``py-heapq-parser``, such that they share many trigrams, like real project names.
+
+Usage::
+
+    python benchmarks/bench_similar.py [names ...]
+"""
+
+import re
+import sys
+import time
+import random
+import sysconfig
+import tempfile
+from pathlib import Path
+
+import et_micc.pypi
+
+NAMES = [10000, 100000, 500000]
+
+QUERIES = ['reqests', 'nunpy', 'djanog', 'flsk', 'scikit-lean', 'pytest-mock', 'py']
+
+
+def vocabulary():
+    """The words in the identifiers of (part of) the standard library."""
+    words = set()
+    for path in sorted(Path(sysconfig.get_paths()['stdlib']).glob('*.py'))[:200]:
+        for identifier in re.findall(r"[A-Za-z]{3,}", path.read_text(errors='ignore')):
+            words.update(word.lower() for word in re.findall(r"[A-Z]?[a-z]+", identifier) if 2 < len(word) < 10)
+    return sorted(words)
+
+
+def names(n, words, seed=0):
+    """*n* synthetic project names."""
+    rng = random.Random(seed)
+    prefixes = ['', '', '', 'py', 'py-', 'django-', 'flask-', 'pytest-']
+    result = {'requests', 'numpy', 'django', 'flask', 'scikit-learn', 'pytest-mock'}
+    while len(result) < n:
+        name = rng.choice(prefixes) + '-'.join(rng.choice(words) for _ in range(rng.choice([1, 1, 2, 2, 2, 3])))
+        if rng.random() < 0.1:
+            name += str(rng.randrange(10))
+        result.add(name)
+    return sorted(result)
+
+
+def scan(keys, query, max_distance):
+    key = query.encode('utf-8')
+    return sorted((d, other) for other in keys for d in [et_micc.pypi.distance(key, other)] if 0 < d <= max_distance)
+
+
+def main(*sizes):
+    words = vocabulary()
+    print(f"{len(words)} words")
+    print(f"{'names':>7} {'query':>12} {'k':>2} {'found':>6} {'index [ms]':>11} {'scan [ms]':>10}")
+    for n in sizes or NAMES:
+        with tempfile.TemporaryDirectory() as directory:
+            index = et_micc.pypi.NameIndex(directory, 'file:///')
+            keys = names(n, words)
+            start = time.perf_counter()
+            index.write(keys)
+            print(f"{n:>7} names written in {time.perf_counter() - start:.1f} s")
+            index.similar('')
+            keys = [key.encode('utf-8') for key in keys]
+            for query in QUERIES:
+                for k in (1, 2):
+                    start = time.perf_counter()
+                    found = index.similar(query, k, limit=None)
+                    seconds = time.perf_counter() - start
+                    if n <= NAMES[0]:
+                        start = time.perf_counter()
+                        expected = scan(keys, query, k)
+                        scanned = f"{1000 * (time.perf_counter() - start):>10.2f}"
+                        assert len(found) == len(expected)
+                    else:
+                        scanned = f"{'-':>10}"
+                    print(f"{n:>7} {query:>12} {k:>2} {len(found):>6} {1000 * seconds:>11.2f} {scanned}")
+            index.close()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
+
+#eof
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark et_micc.tomlfile
+==========================
+
+Time to read a :file:`pyproject.toml` file with the read-only tier
+(:py:func:`et_micc.tomlfile.read_toml`) and with the round-tripping tier
+(:py:class:`et_micc.tomlfile.TomlFile`), as a function of the number of
+dependencies and scripts in the file.
+
+Usage::
+
+    python benchmarks/bench_toml.py [repetitions]
+"""
+
+import sys
+import time
+import shutil
+import tempfile
+import statistics
+from pathlib import Path
+
+import et_micc.tomlfile
+
+SIZES = [0, 10, 100, 300, 1000]
+
+
+def pyproject_toml(n):
+    """Text of a pyproject.toml file with *n* dependencies and *n* scripts."""
+    lines = ['[tool.poetry]'
+            ,'name = "FOO"'
+            ,'version = "0.0.0"'
+            ,'description = "Benchmark project."'
+            ,'authors = ["first-name last-name <your.email@whatev.er>"]'
+            ,''
+            ,'[tool.poetry.dependencies]'
+            ,'python = "^3.7"'
+            ]
+    lines.extend(f'package-{i} = "^{i % 10}.{i % 7}.0"  # dependency {i}' for i in range(n))
+    lines.extend(['', '[tool.poetry.scripts]'])
+    lines.extend(f'app{i} = "foo:cli_app{i}.main"' for i in range(n))
+    lines.extend(['', '[build-system]'
+                 ,'requires = ["poetry>=0.12"]'
+                 ,'build-backend = "poetry.masonry.api"'
+                 ,''
+                 ])
+    return '\n'.join(lines)
+
+
+def timeit(read, path, repetitions):
+    """Median time (in ms) to read *path* and look up the version."""
+    samples = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        read(path)['tool']['poetry']['version']
+        samples.append(time.perf_counter() - start)
+    return 1000 * statistics.median(samples)
+
+
+def main(repetitions=20):
+    directory = Path(tempfile.mkdtemp())
+    try:
+        reader = et_micc.tomlfile._toml_reader
+        print(f"read-only tier: {reader.__name__ if reader else 'tomlkit (no tomllib or tomli)'}")
+        print(f"{'entries':>8} {'read_toml [ms]':>15} {'TomlFile [ms]':>14} {'speed up':>9}")
+        for n in SIZES:
+            path = directory / f'pyproject-{n}.toml'
+            path.write_text(pyproject_toml(n))
+            fast = timeit(et_micc.tomlfile.read_toml, path, repetitions)
+            slow = timeit(et_micc.tomlfile.TomlFile, path, repetitions)
+            print(f"{2 * n:>8} {fast:>15.3f} {slow:>14.3f} {slow / fast:>9.1f}")
+    finally:
+        shutil.rmtree(str(directory))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
+
+#eof
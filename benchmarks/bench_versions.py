@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark et_micc.versions
+==========================
+
+Time to resolve the version constraints on a number of dependencies, i.e. to
+intersect all constraints on each dependency, with :py:mod:`et_micc.versions`
+(with a cold and a warm memo cache), and with the interval functions of
+:py:mod:`et_micc.utils`, which handle only a single interval per constraint.
+
+Usage::
+
+    python benchmarks/bench_versions.py [constraints_per_dependency]
+"""
+
+import sys
+import time
+import random
+
+import et_micc.utils
+import et_micc.versions
+
+DEPENDENCIES = [10, 100, 1000]
+
+
+def constraints(n, k, seed=0):
+    """*k* random, mutually compatible constraints on each of *n* dependencies."""
+    rng = random.Random(seed)
+    result = {}
+    for d in range(n):
+        major = rng.randrange(5)
+        result[f'package-{d}'] = [rng.choice([f"^{major}.{rng.randrange(3)}.0"
+                                             ,f">={major}.{rng.randrange(3)}.{rng.randrange(5)}"
+                                             ,f"<{major + 1 + rng.randrange(2)}.0.0"
+                                             ,f">={major}.0.0,<{major + 3}.0.0"
+                                             ])
+                                  for _ in range(k)]
+    return result
+
+
+def resolve_versions(deps):
+    return {pkg: str(et_micc.versions.intersect(cs)) for pkg, cs in deps.items()}
+
+
+def resolve_utils(deps):
+    result = {}
+    for pkg, cs in deps.items():
+        bounds = (None, None)
+        for c in cs:
+            bounds = et_micc.utils.intersect(bounds, et_micc.utils.version_range(c))
+        result[pkg] = bounds
+    return result
+
+
+def timeit(resolve, deps):
+    """Time (in ms) to resolve *deps*."""
+    start = time.perf_counter()
+    resolve(deps)
+    return 1000 * (time.perf_counter() - start)
+
+
+def main(k=10):
+    print(f"{k} constraints per dependency")
+    print(f"{'dependencies':>12} {'utils [ms]':>11} {'versions, cold [ms]':>20} {'versions, warm [ms]':>20}")
+    for n in DEPENDENCIES:
+        deps = constraints(n, k)
+        legacy = timeit(resolve_utils, deps)
+        et_micc.versions.parse.cache_clear()
+        et_micc.versions.version.cache_clear()
+        cold = timeit(resolve_versions, deps)
+        warm = timeit(resolve_versions, deps)
+        print(f"{n:>12} {legacy:>11.2f} {cold:>20.2f} {warm:>20.2f}")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
+
+#eof
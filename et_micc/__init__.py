@@ -8,4 +8,15 @@ Top-level package for :py:mod:`et-micc`.
 """
 __version__ = "1.1.8"
 
-import et_micc.cli_micc # avoid attribute error when executing micc when installed from pypi
+
+def __getattr__(name):
+    """Import :py:mod:`et_micc.cli_micc` on first access (PEP 562).
+
+    This avoids an attribute error when executing micc through the entry point
+    ``et_micc:cli_micc.main`` of older installations, without importing the micc
+    CLI in light weight modules such as :py:mod:`et_micc.client`.
+    """
+    if name == 'cli_micc':
+        import et_micc.cli_micc
+        return et_micc.cli_micc
+    raise AttributeError(f"module 'et_micc' has no attribute '{name}'")
@@ -15,6 +15,39 @@ import et_micc.logger
 
 __template_help = "Ordered list of Cookiecutter templates, or a single Cookiecutter template."
 
+BATCH_EXCLUDED = ('create', 'setup', 'batch', 'serve', 'workspace', 'pypi-index', 'check-names')
+"""Micc commands that cannot be run in a ``micc batch`` script, or with ``micc workspace``."""
+
+BATCH_DEFERRED = ('add', 'deps')
+"""Micc commands whose writes to pyproject.toml, db.json and the documentation
+files are deferred until the end of a ``micc batch`` script. Other commands
+may modify these files on disk, so the deferred writes are flushed before, and
+the files are read again after those commands."""
+
+
+def get_project(options):
+    """Create the project for a micc command, or, in a ``micc batch`` script,
+    reuse the project of the script.
+
+    :param types.SimpleNameSpace options: the options of the micc command.
+    """
+    project = getattr(options, 'batch_project', None)
+    if project is None:
+        project = Project(options)
+    else:
+        project.rebind(options)
+    options.project = project
+    return project
+
+
+def report_trace(options):
+    """Report the attributes of the project that were computed by a micc command
+    (see ``micc --trace``)."""
+    project = getattr(options, 'project', None)
+    if project is not None:
+        materialized = ', '.join(project.materialized) if project.materialized else '(none)'
+        click.echo(f"[TRACE] project attributes computed: {materialized}", err=True)
+
 
 @click.group()
 @click.option('-v', '--verbosity', count=True
@@ -31,9 +64,14 @@ __template_help = "Ordered list of Cookiecutter templates, or a single Cookiecut
     , help="If specified clears the project's ``et_micc.log`` file."
     , default=False, is_flag=True
 )
+@click.option('--trace'
+    , help="If specified reports the project attributes that were computed by the command "
+           "(e.g. template parameters, logger, structure, version) on stderr."
+    , default=False, is_flag=True
+)
 @click.version_option(version=micc_version())
 @click.pass_context
-def main(ctx, verbosity, project_path, clear_log):
+def main(ctx, verbosity, project_path, clear_log, trace):
     """Micc command line interface.
 
     All commands that change the state of the project produce some output that
@@ -59,6 +97,8 @@ def main(ctx, verbosity, project_path, clear_log):
         clear_log=clear_log,
         template_parameters={},
     )
+    if trace:
+        ctx.call_on_close(lambda: report_trace(ctx.obj))
 
 
 @main.command()
@@ -200,6 +240,7 @@ def create(ctx
         }
     )
     project = Project(options)
+    options.project = project
     if project.exit_code:
         ctx.exit(project.exit_code)
 
@@ -230,15 +271,16 @@ def convert_to_package(ctx, overwrite, backup):
     options.overwrite = overwrite
     options.backup = backup
 
-    project = Project(options)
+    project = get_project(options)
     if project.exit_code:
         ctx.exit(project.exit_code)
 
-    with et_micc.logger.logtime(options):
+    with et_micc.logger.logtime(project):
         project.module_to_package_cmd()
 
-        if project.exit_code == et_micc.expand.EXIT_OVERWRITE:
-            options.logger.warning(
+        from et_micc.expand import EXIT_OVERWRITE
+        if project.exit_code == EXIT_OVERWRITE:
+            project.logger.warning(
                 f"It is normally ok to overwrite 'index.rst' as you are not supposed\n"
                 f"to edit the '.rst' files in '{options.project_path}{os.sep}docs.'\n"
                 f"If in doubt: rerun the command with the '--backup' flag,\n"
@@ -272,7 +314,7 @@ def info(ctx,name,version):
     """
     options = ctx.obj
 
-    project = Project(options)
+    project = get_project(options)
     if project.exit_code:
         ctx.exit(project.exit_code)
 
@@ -283,7 +325,7 @@ def info(ctx,name,version):
         print(project.version)
         return
     else:
-        with et_micc.logger.logtime(options):
+        with et_micc.logger.logtime(project):
             project.info_cmd()
 
     if project.exit_code:
@@ -339,14 +381,18 @@ def version(ctx, major, minor, patch, rule, tag, short, dry_run):
     options.short = short
     options.dry_run = dry_run
 
-    project = Project(options)
+    project = get_project(options)
     if project.exit_code:
         ctx.exit(project.exit_code)
 
-    with et_micc.logger.logtime(project):
+    if not (rule or tag):
+        # Showing the version does not change the project, and is not logged.
         project.version_cmd()
-        if project.exit_code == 0 and tag:
-            project.tag_cmd()
+    else:
+        with et_micc.logger.logtime(project):
+            project.version_cmd()
+            if project.exit_code == 0 and tag:
+                project.tag_cmd()
 
     if project.exit_code:
         ctx.exit(project.exit_code)
@@ -358,7 +404,7 @@ def tag(ctx):
     """Create a git tag for the current version and push it to the remote repo."""
     options = ctx.obj
 
-    project = Project(options)
+    project = get_project(options)
     if project.exit_code:
         ctx.exit(project.exit_code)
 
@@ -371,6 +417,46 @@ def tag(ctx):
         ctx.exit(project.exit_code)
 
 
+@main.command()
+@click.option('-d', '--dry-run', is_flag=True
+    , help="Only report what would be updated, do not modify any files."
+    , default=False
+)
+@click.option('--write-new', is_flag=True
+    , help="Write the new template output of drifted files to '<file>.new'."
+    , default=False
+)
+@click.pass_context
+def template_sync(ctx, dry_run, write_new):
+    """Re-apply updated templates to the project.
+
+    Micc records the hash of every file it generates from a template. This
+    command renders the templates of the project again, using the current
+    version of micc, and
+
+    * updates the files that were not modified since they were generated, and
+      whose template output changed,
+    * adds files that are new in the templates,
+    * reports the files that were modified since they were generated, and whose
+      template output changed, so that you can merge the changes manually.
+
+    Files whose template output did not change are not touched.
+    """
+    options = ctx.obj
+    options.dry_run = dry_run
+    options.write_new = write_new
+
+    project = get_project(options)
+    if project.exit_code:
+        ctx.exit(project.exit_code)
+
+    with et_micc.logger.logtime(project):
+        project.template_sync_cmd()
+
+    if project.exit_code:
+        ctx.exit(project.exit_code)
+
+
 @main.command()
 @click.option('--app'
     , default=False, is_flag=True
@@ -454,17 +540,68 @@ def add(ctx
     options.overwrite = overwrite
     options.backup = backup
 
-    project = Project(options)
+    project = get_project(options)
     if project.exit_code:
         ctx.exit(project.exit_code)
 
-    with et_micc.logger.logtime(options):
+    with et_micc.logger.logtime(project):
         project.add_cmd()
 
     if project.exit_code:
         ctx.exit(project.exit_code)
 
 
+@main.group()
+def deps():
+    """Manage the project's dependencies."""
+
+
+@deps.command('add')
+@click.option('-r', '--requirements', 'requirements_files', type=click.File('r'), multiple=True
+    , help="A requirements file, with a dependency and a version constraint on every line "
+           "(e.g. ``numpy>=1.18,<2`` or ``click ^7.0``). May be repeated."
+)
+@click.argument('requirements', nargs=-1)
+@click.pass_context
+def deps_add(ctx, requirements_files, requirements):
+    """Add or update dependencies in pyproject.toml.
+
+    The dependencies are specified as arguments (e.g. ``'numpy>=1.18,<2'`` or
+    ``click@^7.0``), or in requirements files. The version constraints are
+    merged with the current ones, and pyproject.toml is written once.
+    Dependencies with conflicting version constraints are reported and left
+    unchanged.
+    """
+    from et_micc.versions import parse_requirement, ConstraintError
+
+    options = ctx.obj
+    lines = list(requirements)
+    for requirements_file in requirements_files:
+        lines.extend(requirements_file.read().splitlines())
+    options.requirements = []
+    for line in lines:
+        try:
+            requirement = parse_requirement(line)
+        except ConstraintError as e:
+            click.secho(f"[ERROR]\n{e}", fg='bright_red')
+            ctx.exit(1)
+        if requirement:
+            options.requirements.append(requirement)
+    if not options.requirements:
+        click.secho("[ERROR]\nNo dependencies specified.", fg='bright_red')
+        ctx.exit(1)
+
+    project = get_project(options)
+    if project.exit_code:
+        ctx.exit(project.exit_code)
+
+    with et_micc.logger.logtime(project):
+        project.deps_add_cmd()
+
+    if project.exit_code:
+        ctx.exit(project.exit_code)
+
+
 @main.command()
 @click.option('--silent', is_flag=True
     , help="Do not ask for confirmation on deleting a component."
@@ -496,11 +633,11 @@ def mv(ctx, cur_name, new_name, silent, entire_package, entire_project):
         options.entire_package, options.entire_project =  entire_package, entire_project
     # else these flags are ignored.
 
-    project = Project(options)
+    project = get_project(options)
     if project.exit_code:
         ctx.exit(project.exit_code)
 
-    with et_micc.logger.logtime(options):
+    with et_micc.logger.logtime(project):
         project.mv_component()
 
 
@@ -526,7 +663,8 @@ def setup(ctx
     path_to_miccfile = setupdir / 'micc.json'
     if not path_to_miccfile.exists() or force:
         shutil.copyfile(str(micc_file_template),str(path_to_miccfile))
-        preferences = et_micc.expand.set_preferences(path_to_miccfile)
+        from et_micc.expand import set_preferences
+        preferences = set_preferences(path_to_miccfile)
         print("\nConfiguring git:")
         cmds = [['git', 'config', '--global', 'user.name' , preferences['full_name']['default'] ]
                ,['git', 'config', '--global', 'user.email', preferences['email'    ]['default'] ]
@@ -543,6 +681,248 @@ def setup(ctx
           "Done"
     )
 
+
+@main.command()
+@click.option('--socket', 'socket_path', default=None
+    , help="Location of the server socket. Default: $MICC_SOCKET, or ~/.et_micc/micc.sock."
+)
+@click.pass_context
+def serve(ctx, socket_path):
+    """Run a resident micc server.
+
+    The server executes the micc commands sent by ``micc-client``, which accepts
+    the same arguments as ``micc``. This avoids starting a Python interpreter and
+    importing micc and its dependencies for every command. Commands are executed
+    one at a time, in the environment of the server. Stop the server with Ctrl-C.
+    """
+    import et_micc.server
+    ctx.exit(et_micc.server.serve(socket_path))
+
+
+@main.command('pypi-index')
+@click.option('--refresh', is_flag=True, default=False
+    , help="Download the PyPI simple index, if it changed since the last refresh."
+)
+@click.pass_context
+def pypi_index(ctx, refresh):
+    """Show or refresh the local snapshot of the project names on PyPI.
+
+    ``micc create --publish`` consults the snapshot before asking PyPI whether a
+    name is still available.
+    """
+    import time
+    import et_micc.pypi
+
+    index = et_micc.pypi.get_index()
+    if refresh:
+        click.echo(f"Refreshing the snapshot of {index.url} ...")
+        try:
+            modified = index.refresh()
+        except OSError as e:
+            click.secho(f"[ERROR]\nCould not download {index.url}:\n  {e}", fg='bright_red')
+            ctx.exit(1)
+        click.echo("Updated." if modified else "The snapshot is up to date.")
+
+    if not index.available():
+        click.echo(f"There is no snapshot of {index.url}. Run 'micc pypi-index --refresh' to create it.")
+        return
+    meta = index.meta
+    click.echo(f"Snapshot of {index.url} in {index.directory}:\n"
+               f"  names  : {meta['count']}\n"
+               f"  serial : {meta.get('serial')}\n"
+               f"  fetched: {time.ctime(meta['fetched'])}\n"
+               f"  checked: {time.ctime(meta['checked'])}"
+               )
+
+
+@main.command('check-names')
+@click.option('-j', '--jobs', type=int, default=8
+    , help="Maximum number of concurrent requests to PyPI."
+)
+@click.option('--timeout', type=float, default=10
+    , help="Timeout of a request to PyPI in seconds."
+)
+@click.option('-s', '--similar', is_flag=True, default=False
+    , help="Also list the names in the local snapshot of PyPI names that are similar to available names."
+)
+@click.argument('names', nargs=-1, required=True)
+@click.pass_context
+def check_names(ctx, jobs, timeout, similar, names):
+    """Verify whether names are still available on PyPI.
+
+    The exit code is 1 if the availability of a name could not be verified online.
+    Names that are not in the local snapshot of PyPI names are then reported as
+    *unverified*.
+    """
+    import et_micc.pypi
+
+    results = et_micc.pypi.check_names(names, jobs=jobs, timeout=timeout)
+    width = max(len(name) for name in names)
+    exit_code = 0
+    for name in names:
+        exists = results[name]
+        if exists is True:
+            status = click.style("in use", fg='red')
+        elif exists is False:
+            status = click.style("available", fg='green')
+            if similar:
+                close = et_micc.pypi.get_index().similar(name)
+                if close:
+                    status += f"  (similar: {', '.join(other for other, _ in close)})"
+        elif isinstance(exists, et_micc.pypi.Unverified):
+            status = click.style(f"unverified ({exists}; {type(exists.error).__name__}: {exists.error})", fg='yellow')
+            exit_code = 1
+        else:
+            status = click.style(f"unknown ({type(exists).__name__}: {exists})", fg='yellow')
+            exit_code = 1
+        click.echo(f"{name:<{width}}  {status}")
+    if exit_code:
+        ctx.exit(exit_code)
+
+
+@main.command()
+@click.argument('script', type=click.File('r'), default='-')
+@click.pass_context
+def batch(ctx, script):
+    """Run a script of micc commands on a project, in a single process.
+
+    :param str script: file with a micc command per line, without the leading
+        ``micc`` and global options, e.g. ``add --py my_module``. Empty lines and
+        comments (``#``) are ignored. The default (``-``) reads the standard input.
+
+    The project files (``pyproject.toml``, ``db.json``) are read once, and the
+    changes of successive ``micc add`` commands to ``pyproject.toml``, ``db.json``
+    and the documentation files are written once. The script stops at the first
+    command that fails. Commands that ask for confirmation (``micc mv``) read it
+    from the standard input.
+    """
+    import shlex
+    import time
+
+    steps = []
+    for line in script:
+        args = shlex.split(line, comments=True)
+        if args and args[0] == 'micc':
+            args = args[1:]
+        if not args:
+            continue
+        if args[0] in BATCH_EXCLUDED or main.get_command(ctx.parent, args[0]) is None:
+            click.secho(f"[ERROR]\n'micc {args[0]}' cannot be run in a batch script.", fg='bright_red')
+            ctx.exit(1)
+        steps.append(args)
+
+    base_options = vars(ctx.obj)
+    options = SimpleNamespace(**base_options)
+    project = Project(options)
+    options.project = project
+    if project.exit_code:
+        ctx.exit(project.exit_code)
+
+    exit_code = 0
+    start = time.perf_counter()
+    with et_micc.logger.logtime(project):
+        for i, args in enumerate(steps, 1):
+            step_options = SimpleNamespace(**base_options)
+            step_options.template_parameters = {}
+            step_options.clear_log = False
+            step_options.batch_project = project
+            if args[0] in BATCH_DEFERRED:
+                project.defer_writes()
+            else:
+                project.flush()
+
+            step_start = time.perf_counter()
+            exit_code = run_batch_step(ctx.parent, args, step_options)
+            project.logger.info(f"[{i}/{len(steps)}] micc {' '.join(args)} : "
+                                f"{time.perf_counter() - step_start:.3f}s"
+                                + (f" (exit code {exit_code})" if exit_code else "")
+                               )
+            if args[0] not in BATCH_DEFERRED:
+                project.reload()
+            if exit_code:
+                break
+
+        flush_start = time.perf_counter()
+        project.flush()
+        project.logger.info(f"Writing project files: {time.perf_counter() - flush_start:.3f}s")
+    project.logger.info(f"Total: {time.perf_counter() - start:.3f}s")
+
+    if exit_code:
+        ctx.exit(exit_code)
+
+
+def run_batch_step(ctx, args, options):
+    """Run a micc command of a batch script.
+
+    :param click.Context ctx: the context of the micc command group.
+    :param list args: the micc command and its arguments.
+    :param types.SimpleNameSpace options: the options for the command.
+    :returns: the exit code of the command.
+    """
+    try:
+        name, command, args = ctx.command.resolve_command(ctx, args)
+        with command.make_context(name, args, parent=ctx, obj=options) as step_ctx:
+            command.invoke(step_ctx)
+    except click.exceptions.Exit as e:
+        return e.exit_code
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.Abort:
+        click.echo("Aborted!", err=True)
+        return 1
+    return 0
+
+
+@main.command(context_settings=dict(ignore_unknown_options=True, allow_interspersed_args=False))
+@click.option('-j', '--jobs', type=int, default=0
+    , help="Number of projects processed concurrently. Default: the number of CPUs."
+)
+@click.option('--json', 'json_lines', is_flag=True, default=False
+    , help="Report the results as JSON lines rather than as a table."
+)
+@click.argument('command', nargs=-1, required=True, type=click.UNPROCESSED)
+@click.pass_context
+def workspace(ctx, jobs, json_lines, command):
+    """Run a micc command on all projects in a directory tree.
+
+    The directory tree is the project path (``micc -p <path> workspace ...``),
+    by default the current working directory. The results are reported as the
+    commands complete. The exit code is the largest exit code of the commands.
+
+    Example: ``micc -p ~/workspace workspace version -s``
+    """
+    import json
+    import et_micc.workspace
+
+    options = ctx.obj
+    if command[0] in BATCH_EXCLUDED or main.get_command(ctx.parent, command[0]) is None:
+        click.secho(f"[ERROR]\n'micc {command[0]}' cannot be run with 'micc workspace'.", fg='bright_red')
+        ctx.exit(1)
+
+    root = options.project_path
+    projects = et_micc.workspace.find_projects(root)
+    if not json_lines:
+        click.echo(f"Running 'micc {' '.join(command)}' on {len(projects)} projects in {root}")
+        click.echo("exit      time  project")
+
+    exit_code = 0
+    failed = 0
+    for result in et_micc.workspace.run_workspace(projects, list(command), options.verbosity, jobs):
+        if json_lines:
+            click.echo(json.dumps(result))
+        else:
+            click.echo(et_micc.workspace.format_row(result, root))
+        if result['exit_code']:
+            failed += 1
+            exit_code = max(exit_code, result['exit_code'])
+
+    if not json_lines:
+        click.echo(f"{len(projects)} projects, {failed} failed.")
+    if exit_code:
+        ctx.exit(exit_code)
+
+
 if __name__ == "__main__":
     sys.exit(main())  # pragma: no cover
 
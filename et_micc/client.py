@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.client
+=====================
+
+A thin client for the micc server (see :py:mod:`et_micc.server`).
+
+The ``micc-client`` command accepts the same arguments as ``micc``. It forwards
+them to a running micc server, and writes the output of the command to stdout and
+stderr as it arrives. If no micc server is running, the command is executed in the
+client process itself.
+
+This module deliberately imports nothing but the standard library modules it
+needs, so that the client starts as fast as the Python interpreter.
+"""
+
+import os
+import sys
+import json
+import socket
+
+
+def socket_path():
+    """The location of the server socket (see :py:func:`et_micc.server.socket_path`)."""
+    return os.environ.get('MICC_SOCKET', os.path.join(os.path.expanduser('~'), '.et_micc', 'micc.sock'))
+
+
+def run(argv, stdout=None, stderr=None):
+    """Execute a micc command on the micc server.
+
+    :param list argv: the arguments of the micc command.
+    :param stdout: text stream for the output of the command, by default :py:obj:`sys.stdout`.
+    :param stderr: text stream for the error output of the command, by default :py:obj:`sys.stderr`.
+    :returns: the exit code of the command.
+    :raises: OSError if the server cannot be reached.
+    """
+    streams = {'stdout': stdout or sys.stdout, 'stderr': stderr or sys.stderr}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path())
+        request = json.dumps({'argv': list(argv), 'cwd': os.getcwd()}) + '\n'
+        s.sendall(request.encode('utf-8'))
+        with s.makefile('rb') as f:
+            for line in f:
+                frame = json.loads(line.decode('utf-8'))
+                if 'exit' in frame:
+                    return frame['exit']
+                for name, text in frame.items():
+                    streams[name].write(text)
+                    streams[name].flush()
+    print("The micc server closed the connection.", file=sys.stderr)
+    return 1
+
+
+def main():
+    """Entry point of the ``micc-client`` command."""
+    try:
+        exit_code = run(sys.argv[1:])
+    except (FileNotFoundError, ConnectionRefusedError):
+        # no server running
+        from et_micc.cli_micc import main
+        return main(prog_name='micc')
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
+
+#eof
@@ -6,16 +6,27 @@ Module et_micc.expand
 Helper functions for dealing with *Cookiecutter* templates.
 """
 
-import os, shutil, platform
+import os
+import copy
+import types
 from pathlib import Path
 import json
 
 import click
-from cookiecutter.main import cookiecutter
 
 import et_micc.logger
+from et_micc.hooks import HookFailed
+# cookiecutter and the modules depending on jinja2 (et_micc.render, et_micc.sync,
+# et_micc.journal) are imported by the functions that expand templates, so that
+# the micc commands that only need the preferences functions start up fast.
 
 EXIT_OVERWRITE = -3
+EXIT_HOOK_FAILED = -4
+
+MAX_WORKERS = 4
+"""Maximum number of threads for rendering and writing independent templates
+concurrently (see :py:func:`independent_groups`). The number of threads is also
+limited by the number of CPUs. If 1, templates are expanded one after another."""
 
 
 def resolve_template(template):
@@ -36,6 +47,29 @@ def resolve_template(template):
     return template
 
 
+_json_files = {}
+
+def load_json(path):
+    """Load a json file, reusing the data loaded previously if the file did not change.
+
+    The data are memoized per file, and validated by the file's inode, modification
+    time and size, so that a long running micc process (see :py:mod:`et_micc.server`)
+    does not parse files that did not change.
+
+    :param Path path: the json file.
+    :returns: a copy of the data, which the caller may modify.
+    """
+    key = str(path)
+    st = os.stat(key)
+    signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+    memo = _json_files.get(key)
+    if memo is None or memo[0] != signature:
+        with open(key) as f:
+            memo = (signature, json.load(f))
+        _json_files[key] = memo
+    return copy.deepcopy(memo[1])
+
+
 def set_preferences(micc_file):
     """Set the preferences in *micc_file*.
     
@@ -84,8 +118,7 @@ def get_preferences(micc_file):
             # shutil.copyfile(str(micc_file_template),str(dotmicc_miccfile))
             # preferences = set_preferences(dotmicc_miccfile)
     else:
-        with micc_file.open() as f:
-            preferences = json.load(f)
+        preferences = load_json(micc_file)
 
     return preferences
 
@@ -101,17 +134,173 @@ def get_template_parameters(preferences):
         for parameter,description in preferences.items():
             template_parameters[parameter] = description['default']
     elif isinstance(preferences,Path):
-        with preferences.open() as f:
-            template_parameters = json.load(f)
+        template_parameters = load_json(preferences)
     else:
         raise RuntimeError()
     
     return template_parameters
     
     
+def find_existing_files(output_dir, paths):
+    """Find out which of the output paths of a template expansion exist already.
+
+    Rather than testing the existence of every path, each directory involved is
+    listed once, and the listing is intersected with the output paths.
+
+    :param Path output_dir: the output directory.
+    :param list paths: output paths relative to *output_dir*. Entries that are None
+        are ignored.
+    :returns: the set of existing paths.
+    """
+    by_directory = {}
+    for path in paths:
+        if path is not None:
+            directory, name = os.path.split(path)
+            by_directory.setdefault(directory, set()).add(name)
+
+    existing = set()
+    for directory, names in by_directory.items():
+        try:
+            with os.scandir(str(output_dir / directory)) as entries:
+                listing = {entry.name for entry in entries}
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        existing.update(os.path.join(directory, name) for name in names & listing)
+    return existing
+
+
+def independent_groups(manifests):
+    """Partition a list of templates into groups with disjoint output paths.
+
+    Two templates whose outputs overlap end up in the same group, as well as
+    templates that overlap with any template in the group. Templates of different
+    groups can be expanded concurrently. Within a group, the templates must be
+    expanded in the order given, so that the last template writing a file wins.
+
+    :param list manifests: the manifests (see :py:meth:`et_micc.render.TemplateTree.manifest`)
+        of the templates, in order of expansion.
+    :returns: list of groups, each group a sorted list of template indices.
+    """
+    # union-find over the template indices
+    parent = list(range(len(manifests)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for i, manifest in enumerate(manifests):
+        for path in manifest:
+            if path is None:
+                continue
+            j = owner.setdefault(path, i)
+            if j != i:
+                parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(len(manifests)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(groups.values())
+
+
+def expand_group(trees, parameters, output_dir, journal, now=None):
+    """Render a group of templates, in order, and stage the files for writing.
+
+    If several templates of the group output the same file, only the output of
+    the last one is staged.
+
+    :param list trees: list of :py:class:`et_micc.render.TemplateTree` objects.
+    :param dict parameters: rendered template parameters.
+    :param Path output_dir: the output directory.
+    :param et_micc.journal.Journal journal: the journal to stage the files in.
+    :param str now: ISO 8601 time of the expansion (see :py:class:`et_micc.render.NowExtension`).
+    :returns: dict mapping output paths to the :py:class:`et_micc.render.RenderedFile`
+        objects staged.
+    """
+    file_set = {}
+    for tree in trees:
+        file_set.update(tree.render(parameters, now))
+    for path, rendered_file in file_set.items():
+        journal.stage(output_dir / path, rendered_file)
+    return file_set
+
+
+_hook_modules = {}
+
+def load_hooks(template):
+    """Load the in-process hooks of a template (see :py:mod:`et_micc.hooks`).
+
+    :param Path template: path to the template directory.
+    :returns: the module :file:`hooks/micc_hooks.py` of the template, or None
+        if it has none.
+
+    The module is loaded again if the file was modified since it was loaded. Its
+    source is compiled in memory, no bytecode is written to the template directory,
+    which may be read-only.
+    """
+    path = Path(template) / 'hooks' / 'micc_hooks.py'
+    try:
+        key = (str(path), path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        key = (str(path), None)
+    if key not in _hook_modules:
+        if key[1] is not None:
+            module = types.ModuleType(f"micc_hooks_{Path(template).name}")
+            module.__file__ = key[0]
+            exec(compile(path.read_bytes(), key[0], 'exec'), module.__dict__)
+        else:
+            module = None
+        _hook_modules[key] = module
+    return _hook_modules[key]
+
+
+def run_hook(tree, hook_name, project_dir, context):
+    """Run a hook of a template, if it has one.
+
+    If the template provides in-process hooks (:file:`hooks/micc_hooks.py`), the hook
+    is called directly. Otherwise, a *Cookiecutter* hook script is looked for, which is
+    run in a child process. Unlike :py:func:`cookiecutter.hooks.run_hook`, this does not
+    change the current working directory of the process to find the hook script.
+
+    :param et_micc.render.TemplateTree tree: the template.
+    :param str hook_name: 'pre_gen_project' or 'post_gen_project'.
+    :param str project_dir: the directory to run the hook in.
+    :param dict context: the template context.
+    :raises: HookFailed if the hook fails.
+    """
+    hooks = load_hooks(tree.template)
+    if hooks is not None:
+        hook = getattr(hooks, hook_name, None)
+        if hook is not None:
+            hook(project_dir, context)
+        return
+
+    from cookiecutter.exceptions import FailedHookException
+    from cookiecutter.hooks import find_hook, run_script_with_context
+
+    script = find_hook(hook_name, hooks_dir=str(tree.template / 'hooks'))
+    if script is not None:
+        try:
+            run_script_with_context(script, project_dir, context)
+        except FailedHookException as e:
+            raise HookFailed(str(e))
+
+
 def expand_templates(options):
     """Expand a list of cookiecutter :py:obj:`templates` in directory :py:obj:`project_path`. 
 
+    Pre-existing files are detected from the output paths of the templates (see
+    :py:meth:`et_micc.render.TemplateTree.manifest`), without rendering the file
+    contents. Only then the templates are rendered in memory (see :py:mod:`et_micc.render`)
+    and written to the project directory, in a single pass. Templates with disjoint
+    outputs are rendered and written concurrently (see :py:func:`independent_groups`).
+    The post_gen_project hooks are run afterwards, in the order of the templates.
+
+    The templates, the template parameters and the hashes of the generated files are
+    recorded in the project (see :py:mod:`et_micc.sync`).
+
     Expanding templates may require overwriting pre-existing files. *Micc* handles this
     situation in different ways:
 
@@ -125,6 +314,12 @@ def expand_templates(options):
     * If :py:obj:`options.backup` equals :py:const:`True` pre-existing files
       will be backed up (.bak) before the new files are expanded. If anything went
       wrong, you can inspect the backup files, and correct the errors manually.
+      The backup files are hard links to the pre-existing files, not copies.
+
+    The files are written through a :py:class:`et_micc.journal.Journal`: they are
+    first staged next to their targets, and then moved in place. If the expansion
+    fails (e.g. in a post_gen_project hook), the project is rolled back to its
+    original state.
       
     :param types.SimpleNamespace options: namespace object with
         options accepted by et_micc commands. Relevant attributes are 
@@ -136,6 +331,11 @@ def expand_templates(options):
         * **project_path**: Path to the project on which the command operates.
         * **template_parameters**: extra template parameters not read from *micc_file*
     """
+    from concurrent.futures import ThreadPoolExecutor
+    import et_micc.render
+    import et_micc.sync
+    import et_micc.journal
+
     templates = options.templates
     if not isinstance(templates, list):
         templates = [templates]
@@ -144,95 +344,103 @@ def expand_templates(options):
     output_dir = project_path.parent
     micc_logger = options.logger
 
+    if et_micc.journal.recover(project_path):
+        micc_logger.warning(f"An interrupted expansion in {project_path} was rolled back.")
+
+    parameters = et_micc.render.render_parameters(options.template_parameters)
+    context = {'cookiecutter': parameters}
+
+    cache = et_micc.render.TemplateCache()
+    trees = [et_micc.render.get_template_tree(resolve_template(template), cache) for template in templates]
+
+    # Run the pre_gen_project hooks of all templates before anything is written.
+    for tree in trees:
+        project_dir = str(output_dir / tree.render_root(parameters))
+        try:
+            run_hook(tree, 'pre_gen_project', project_dir, context)
+        except HookFailed as e:
+            click.secho(f"ERROR: {e}\n"
+                        f"  (pre_gen_project hook of template {tree.name})\n"
+                        f"Aborting.", fg='bright_red')
+            return EXIT_HOOK_FAILED
+
     # list existing files that would be overwritten if options.overwrite==True
+    existing = find_existing_files(output_dir, [path for tree in trees for path in tree.manifest(parameters)])
     existing_files = {}
-    for template in templates:
-        template = resolve_template(template)             
-        # write a cookiecutter.json file in the cookiecutter template directory
-        cookiecutter_json = template / 'cookiecutter.json'
-        with open(cookiecutter_json,'w') as f:
-            json.dump(options.template_parameters, f, indent=2)
-        
-        # run cookiecutter in an empty temporary directory to check if there are any
-        # existing project files that would be overwritten.
-        tmp = output_dir / '_cookiecutter_tmp_'
-        if tmp.exists():
-            shutil.rmtree(tmp)
-        tmp.mkdir(parents=True, exist_ok=True)
-
-        # expand the Cookiecutter template in a temporary directory,
-        cookiecutter( str(template)
-                    , no_input=True
-                    , overwrite_if_exists=True
-                    , output_dir=str(tmp)
-                    )
-        
-        # find out if there are any files that would be overwritten.
-        os_name = platform.system()
-        for root, _, files in os.walk(tmp):
-            if root==tmp:
-                continue
-            else:
-                root2 = os.path.relpath(root,tmp)
-            for f in files:
-                if os_name=="Darwin" and f==".DS_Store":
-                    continue
-                file = output_dir / root2 / f
-                if file.exists():
-                    if not template in existing_files:
-                        existing_files[template] = []
-                    existing_files[template].append(file)
-    
-        if existing_files:
-            if options.backup:
-                micc_logger.warning("Pre-existing files that will be backed up ('--backup' specified):\n")
-                micc_logger.indent(2)
-                for files in existing_files.values():
-                    for src in files:
-                        src = str(src)
-                        dst = src + '.bak'
-                        shutil.copyfile(src, dst)
-                        micc_logger.warning(f"{src} -> {dst}")
-                micc_logger.dedent()
-                
-            elif not options.overwrite:
-                micc_logger.warning("Pre-existing files that would be overwritten:\n")
-                micc_logger.indent(2)
-                for files in existing_files.values():
-                    for src in files:
-                        micc_logger.warning(str(src))
-                micc_logger.dedent()
-                click.secho("Aborting because 'overwrite==False'.\n"
-                            "  Rerun the command with the '--backup' flag to first backup these files (*.bak).\n"
-                            "  Rerun the command with the '--overwrite' flag to overwrite these files without backup.\n"
-                            "Aborting."
-                           , fg='bright_red'
-                           )
-                return EXIT_OVERWRITE
-            else:
-                micc_logger.warning(f"'--overwrite' specified: pre-existing files will be overwritten WITHOUT backup:\n")
-                for files in existing_files.values():
-                    for src in files:
-                        micc_logger.warning(f"     overwriting {src}")
-                
+    for tree in trees:
+        for path in tree.manifest(parameters):
+            if path in existing:
+                existing_files.setdefault(tree.template, []).append(output_dir / path)
+
+    if existing_files:
+        if options.backup:
+            micc_logger.warning("Pre-existing files that will be backed up ('--backup' specified):\n")
+            micc_logger.indent(2)
+            for files in existing_files.values():
+                for src in files:
+                    micc_logger.warning(f"{src} -> {src}.bak")
+            micc_logger.dedent()
+
+        elif not options.overwrite:
+            micc_logger.warning("Pre-existing files that would be overwritten:\n")
+            micc_logger.indent(2)
+            for files in existing_files.values():
+                for src in files:
+                    micc_logger.warning(str(src))
+            micc_logger.dedent()
+            click.secho("Aborting because 'overwrite==False'.\n"
+                        "  Rerun the command with the '--backup' flag to first backup these files (*.bak).\n"
+                        "  Rerun the command with the '--overwrite' flag to overwrite these files without backup.\n"
+                        "Aborting."
+                       , fg='bright_red'
+                       )
+            return EXIT_OVERWRITE
+        else:
+            micc_logger.warning(f"'--overwrite' specified: pre-existing files will be overwritten WITHOUT backup:\n")
+            for files in existing_files.values():
+                for src in files:
+                    micc_logger.warning(f"     overwriting {src}")
+
     # Now we can safely overwrite pre-existing files.
-    micc_logger.debug(f"Expanding templates using these parameters:\n{json.dumps(options.template_parameters,indent=2)}")
-    for template in templates:
-        template = resolve_template(template)
-        micc_logger.debug(f"Expanding template {template}.")
-        cookiecutter( str(template)
-                    , no_input=True
-                    , overwrite_if_exists=True
-                    , output_dir=str(output_dir)
-                    )
-        # Clean up (see issue #7)
-        cookiecutter_json = template / 'cookiecutter.json'
-        cookiecutter_json.unlink()
-
-    # Clean up
-    if tmp.exists():
-        shutil.rmtree(str(tmp))
-        
+    micc_logger.debug(f"Expanding templates using these parameters:\n{json.dumps(parameters,indent=2)}")
+    groups = [[trees[i] for i in group]
+              for group in independent_groups([tree.manifest(parameters) for tree in trees])]
+    for group in groups:
+        micc_logger.debug(f"Expanding templates {', '.join(tree.name for tree in group)}.")
+    now = et_micc.render.now()
+    journal = et_micc.journal.Journal(project_path)
+    try:
+        max_workers = min(MAX_WORKERS, len(groups), os.cpu_count() or 1)
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                file_sets = list(executor.map(lambda group: expand_group(group, parameters, output_dir, journal, now), groups))
+        else:
+            file_sets = [expand_group(group, parameters, output_dir, journal, now) for group in groups]
+        written = {}
+        for file_set in file_sets:
+            written.update(file_set)
+
+        backup = [src for files in existing_files.values() for src in files] if existing_files and options.backup else []
+        journal.commit(backup=backup)
+
+        for tree in trees:
+            project_dir = str(output_dir / tree.render_root(parameters))
+            try:
+                run_hook(tree, 'post_gen_project', project_dir, context)
+            except HookFailed as e:
+                click.secho(f"ERROR: {e}\n"
+                            f"  (post_gen_project hook of template {tree.name})\n"
+                            f"Aborting.", fg='bright_red')
+                journal.rollback()
+                return EXIT_HOOK_FAILED
+    except BaseException:
+        journal.rollback()
+        raise
+    journal.close()
+
+    # Record the hashes of the generated files, for 'micc template-sync'.
+    et_micc.sync.record_expansion(project_path, templates, options.template_parameters, written, output_dir, now)
+
     return 0
 
 
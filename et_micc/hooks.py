@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.hooks
+====================
+
+In-process template hooks.
+
+A template may provide a module :file:`hooks/micc_hooks.py` defining the
+functions ``pre_gen_project(project_dir, context)`` and/or
+``post_gen_project(project_dir, context)``. These are called by
+:py:func:`et_micc.expand.expand_templates` in the micc process itself, instead
+of running *Cookiecutter* hook scripts in a child Python process:
+
+* ``pre_gen_project`` hooks are called before any file is written. They validate
+  the template parameters, and raise :py:class:`HookFailed` to cancel the expansion.
+* ``post_gen_project`` hooks are called after the template's files were written.
+
+This module contains the hooks of micc's own templates.
+"""
+
+import os
+import re
+
+MODULE_REGEX = r'^[_a-zA-Z][_a-zA-Z0-9]+$'
+
+
+class HookFailed(Exception):
+    """Raised by a hook to cancel the expansion of a template."""
+
+
+def verify_package_name(project_dir, context):
+    """Verify that the package name is a valid Python module name."""
+    module_name = context['cookiecutter']['package_name']
+    if not re.match(MODULE_REGEX, module_name):
+        raise HookFailed(f"The project slug ({module_name}) is not a valid Python module name. "
+                         f"Please do not use a - and use _ instead")
+
+
+def remove_license_if_not_open_source(project_dir, context):
+    """Remove the LICENSE file if the project is not open source."""
+    if context['cookiecutter']['open_source_license'] == 'Not open source':
+        try:
+            os.remove(os.path.join(project_dir, 'LICENSE'))
+        except FileNotFoundError:
+            pass
+
+#eof
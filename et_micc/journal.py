@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.journal
+======================
+
+Journaled, atomic writing of a set of files.
+
+A :py:class:`Journal` writes the files of a template expansion in three steps:
+
+1. *stage*: every file is written to a private temporary file next to its target
+   (see :py:meth:`Journal.stage`). Nothing in the project is modified yet.
+2. *commit*: the journal is written to :file:`.micc-journal.json` in the project
+   directory, and every staged file replaces its target with :py:func:`os.replace`.
+   Pre-existing targets are kept as a hard link, so no data are copied.
+3. *close* (on success) or *rollback* (on failure): the hard links to the
+   pre-existing files are removed, or moved back in place. On rollback, the
+   backups (``.bak``) made by the commit are removed too.
+
+If micc is interrupted during the commit, the next expansion in the project finds
+the journal, and rolls the unfinished expansion back first (see :py:func:`recover`).
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import et_micc.utils
+
+JOURNAL_FILE = '.micc-journal.json'
+"""Name of the journal file in the project directory."""
+
+
+def _link_or_rename(src, dst):
+    """Make *dst* a hard link to *src*, or, if the file system does not support
+    hard links, rename *src* to *dst*.
+
+    :returns: True if *src* still exists.
+    """
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        os.replace(src, dst)
+        return False
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class Journal:
+    """Stage, commit and roll back the files of a template expansion.
+
+    :param Path project_path: the project directory, where the journal is kept.
+    """
+    def __init__(self, project_path):
+        self.path = Path(project_path) / JOURNAL_FILE
+        # list of dicts with keys 'target', 'staged', 'old' (the hard link to the
+        # pre-existing file, or None) and 'bak' (the backup of the pre-existing file,
+        # or None)
+        self.entries = []
+        # directories created for staging, parents first
+        self.directories = []
+        self._lock = threading.Lock()
+
+    def _makedirs(self, directory):
+        """Create *directory* and its missing parents, remembering the ones created."""
+        missing = []
+        while not directory.exists():
+            missing.append(directory)
+            directory = directory.parent
+        for directory in reversed(missing):
+            try:
+                directory.mkdir()
+            except FileExistsError:
+                continue
+            self.directories.append(str(directory))
+
+    def stage(self, target, rendered_file):
+        """Write a rendered file to a temporary file next to *target*.
+
+        This method may be called from several threads.
+
+        :param Path target: the final location of the file.
+        :param et_micc.render.RenderedFile rendered_file: the file to write.
+        """
+        with self._lock:
+            self._makedirs(target.parent)
+        fd, staged = tempfile.mkstemp(dir=str(target.parent), prefix=f".{target.name}.", suffix='.micc-staged')
+        os.close(fd)
+        rendered_file.write(Path(staged))
+        with self._lock:
+            self.entries.append({'target': str(target), 'staged': staged, 'old': None, 'bak': None})
+
+    def commit(self, backup=()):
+        """Move all staged files in place.
+
+        :param backup: targets of which a backup (``.bak``) must be kept. The backup
+            is a hard link to the pre-existing file.
+        """
+        backup = {str(path) for path in backup}
+        for entry in self.entries:
+            if os.path.exists(entry['target']):
+                entry['old'] = entry['staged'][:-len('.micc-staged')] + '.micc-old'
+                if entry['target'] in backup:
+                    entry['bak'] = entry['target'] + '.bak'
+        self.save()
+
+        for entry in self.entries:
+            target = entry['target']
+            if entry['old']:
+                if _link_or_rename(target, entry['old']) and entry['bak']:
+                    _remove(entry['bak'])
+                    _link_or_rename(target, entry['bak'])
+                elif entry['bak']:
+                    shutil.copy2(entry['old'], entry['bak'])
+            os.replace(entry['staged'], target)
+
+    def close(self):
+        """Finish a successful expansion: remove the links to the pre-existing files,
+        and the journal."""
+        for entry in self.entries:
+            if entry['old']:
+                _remove(entry['old'])
+        _remove(str(self.path))
+        self.entries = []
+        self.directories = []
+
+    def rollback(self):
+        """Undo the expansion: restore the pre-existing files, remove the new files and
+        the directories created."""
+        rollback(self.entries, self.directories)
+        _remove(str(self.path))
+        self.entries = []
+        self.directories = []
+
+    def save(self):
+        """Write the journal to :file:`.micc-journal.json`."""
+        data = json.dumps({'entries': self.entries, 'directories': self.directories}, indent=2)
+        et_micc.utils.write_atomically(self.path, data.encode('utf-8'))
+
+
+def rollback(entries, directories):
+    """Undo the commit of *entries*.
+
+    An entry whose staged file still exists was not committed. Otherwise the target
+    is restored from the link to the pre-existing file, or removed if it did not exist.
+    The backups made by the commit are removed.
+
+    :param list entries: journal entries.
+    :param list directories: directories created, parents first.
+    """
+    for entry in reversed(entries):
+        if entry.get('bak'):
+            _remove(entry['bak'])
+        if os.path.exists(entry['staged']):
+            _remove(entry['staged'])
+            if entry['old'] and os.path.exists(entry['old']):
+                if os.path.exists(entry['target']):
+                    _remove(entry['old'])
+                else:
+                    # the pre-existing file was renamed (no hard links)
+                    os.replace(entry['old'], entry['target'])
+        elif entry['old'] and os.path.exists(entry['old']):
+            os.replace(entry['old'], entry['target'])
+        else:
+            _remove(entry['target'])
+    for directory in reversed(directories):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass # not empty, or already removed
+
+
+def recover(project_path):
+    """Roll back an expansion that was interrupted during its commit.
+
+    :param Path project_path: the project directory.
+    :returns: True if an interrupted expansion was rolled back.
+    """
+    path = Path(project_path) / JOURNAL_FILE
+    try:
+        with path.open() as f:
+            journal = json.load(f)
+    except FileNotFoundError:
+        return False
+    except ValueError:
+        # the journal is written atomically, so this is not an interrupted commit.
+        _remove(str(path))
+        return False
+    rollback(journal['entries'], journal['directories'])
+    _remove(str(path))
+    return True
+
+#eof
@@ -122,6 +122,8 @@ class IndentingLogger(logging.Logger):
             self._indent = self._indent[0:length]
 
 
+_loggers = []
+
 def create_logger(path_to_log_file,filemode='a'):
     """Create a logger object for et_micc.
     
@@ -160,9 +162,24 @@ def create_logger(path_to_log_file,filemode='a'):
     logger.console_handler = console_handler
 
     logger.log_file = path_to_log_file
+    _loggers.append(logger)
     return logger
 
 
+def close_loggers():
+    """Close the handlers (and thus the log files) of all loggers created by
+    :py:func:`create_logger`.
+
+    A long running micc process (see :py:mod:`et_micc.server`) calls this after
+    every command.
+    """
+    while _loggers:
+        logger = _loggers.pop()
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+
+
 @contextmanager
 def log(logfun=None, before='doing', after='done.',bracket=True):
     """Print a message before and after executing the body of the contextmanager.
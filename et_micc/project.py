@@ -10,18 +10,22 @@ An OO interface to *micc* projects.
 import os
 import shutil
 import json
+import functools
 from pathlib import Path
 import subprocess
 from operator import xor
-import requests
 
 import click
-import semantic_version
 
 import et_micc.utils
-import et_micc.expand
 import et_micc.logger
+import et_micc.roots
+import et_micc.state
 from et_micc import __version__
+from et_micc.tomlfile import TomlFile, read_toml
+# Modules with heavy dependencies (requests, semantic_version, and et_micc.expand,
+# et_micc.sync, which need cookiecutter and jinja2) are imported by the methods
+# that need them, to keep the start up time of micc commands short.
 # from et_micc.db import Database
 import subprocess
 CURRENT_ET_MICC_BUILD_VERSION = __version__
@@ -31,6 +35,71 @@ def micc_version():
     return __version__
 
 
+def write_behind(method):
+    """Decorator for :py:class:`Project` methods that defers the writes to
+    :file:`pyproject.toml`, :file:`db.json` and the documentation files until the
+    method returns, so that every file is written at most once.
+
+    If writes are already deferred (as in ``micc batch``), the writes are left to
+    the outer flush.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.deferred_writes is not None:
+            return method(self, *args, **kwargs)
+        self.defer_writes()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.flush()
+    return wrapper
+
+
+def get_components(db):
+    """The components of a project, and their kind.
+
+    :param dict db: the project's database (:file:`db.json`).
+    :returns: dict mapping component names to 'app', 'package', 'module', 'f90' or 'cpp'.
+    """
+    components = {}
+    for name, entry in db.items():
+        options = entry.get('options', {})
+        if options.get('app') or options.get('group'):
+            components[name] = 'app'
+        elif options.get('package'):
+            components[name] = 'package'
+        elif options.get('py'):
+            components[name] = 'module'
+        elif options.get('f90'):
+            components[name] = 'f90'
+        elif options.get('cpp'):
+            components[name] = 'cpp'
+    return components
+
+
+class lazy_attribute:
+    """Decorator for :py:class:`Project` methods that compute an attribute on first
+    access.
+
+    The value is stored in the instance's ``__dict__``, so that it is computed only
+    once, and the name of the attribute is appended to the instance's
+    :py:obj:`materialized` list. The attribute can be assigned to, and forgotten
+    with ``project.__dict__.pop(name, None)``.
+    """
+    def __init__(self, method):
+        self.method = method
+        self.name = method.__name__
+        self.__doc__ = method.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = self.method(instance)
+        instance.__dict__[self.name] = value
+        instance.materialized.append(self.name)
+        return value
+
+
 class Project:
     """
     An OO interface to *micc* projects.
@@ -40,40 +109,18 @@ class Project:
 
     def __init__(self, options):
         self.exit_code = 0
-        self.logger = None
         self.options = options
+        # Names of the lazy attributes that were computed, in order (see lazy_attribute).
+        self.materialized = []
+        # Writes to pyproject.toml, db.json and the documentation files that are
+        # deferred until the next flush(), or None (see defer_writes()).
+        self.deferred_writes = None
         project_path = options.project_path
 
-        if hasattr(options, 'template_parameters'):
-            # only needed for expanding templates.
-            # Pick up the default parameters
-            default_parameters = {}
-            template_parameters_json = project_path / 'micc.json'
-            if template_parameters_json.exists():
-                default_parameters.update(
-                    et_micc.expand.get_template_parameters(template_parameters_json)
-                )
-            else:
-                preferences = et_micc.expand.get_preferences(Path('.'))
-                if preferences is None:
-                    self.error("Micc has not been set up yet: the preferences file '~/.et_micc/micc.json' was not found).\n"
-                               "Run 'micc setup' to create it.\n"
-                               "If you do not have a github account yet, you might want to create one first at:\n"
-                               "    https://github.com/join")
-                    return
-                else:
-                    default_parameters.update( et_micc.expand.get_template_parameters(preferences) )
-
-            # Add options.template_parameters to the default parameters
-            # (options.template_parameters takes precedence, so they must be added last)
-            default_parameters.update(options.template_parameters)
-            # Store all the parameters in options.template_parameters.
-            options.template_parameters = default_parameters
-
-        if et_micc.utils.is_project_directory(project_path, self):
-            # existing project
-            self.get_logger()
-            self.version = self.pyproject_toml['tool']['poetry']['version']
+        if ((project_path / 'pyproject.toml').is_file()
+            and et_micc.utils.verify_project_structure(project_path)):
+            # existing project. Its facts are computed when they are needed.
+            pass
         else:
             # not a project directory or not a directory at all
             if getattr(options, 'create', False):
@@ -91,6 +138,225 @@ class Project:
     def project_path(self):
         return self.options.project_path
 
+    @lazy_attribute
+    def pyproject(self):
+        """The content of the project's :file:`pyproject.toml` file, for reading only
+        (see :py:func:`et_micc.tomlfile.read_toml`).
+        """
+        return read_toml(self.project_path / 'pyproject.toml')
+
+    @lazy_attribute
+    def pyproject_toml(self):
+        """The project's :file:`pyproject.toml` file as a :py:class:`et_micc.tomlfile.TomlFile`,
+        for commands that modify it.
+
+        Commands that only read :file:`pyproject.toml` use :py:obj:`self.pyproject`,
+        which does not reflect the changes made through :py:obj:`self.pyproject_toml`.
+        """
+        return TomlFile(self.project_path / 'pyproject.toml')
+
+    @lazy_attribute
+    def state(self):
+        """The project's snapshot (see :py:mod:`et_micc.state`)."""
+        return et_micc.state.ProjectState(self.project_path)
+
+    @lazy_attribute
+    def facts(self):
+        """The facts of an existing project: ``project_name``, ``package_name``,
+        ``structure``, ``src_file`` and ``version``.
+
+        The facts are loaded from the project's snapshot if none of the files they
+        are derived from changed (see :py:mod:`et_micc.state`). Otherwise they are
+        derived from :file:`pyproject.toml` and the project structure, and stored in
+        the snapshot.
+
+        :raises: click.exceptions.Exit if :file:`pyproject.toml` has no project name.
+        """
+        facts = self.state.get('project')
+        if facts is None:
+            package_name = et_micc.utils.pep8_module_name(self.project_path.name)
+            sources = self.state.signatures(['pyproject.toml'
+                                            , package_name + '.py'
+                                            , os.path.join(package_name, '__init__.py')
+                                            ])
+            if not et_micc.utils.is_project_directory(self.project_path, self):
+                self.error(f"Not a project directory ({self.project_path}).")
+                raise click.exceptions.Exit(self.exit_code)
+            facts = {'project_name': str(self.project_name)
+                    ,'package_name': self.package_name
+                    ,'structure': self.structure
+                    ,'src_file': self.src_file
+                    ,'version': str(self.pyproject['tool']['poetry']['version'])
+                    }
+            self.state.put('project', facts, sources)
+        return facts
+
+    @lazy_attribute
+    def project_name(self):
+        """The name of the project, as in :file:`pyproject.toml`."""
+        return self.facts['project_name']
+
+    @lazy_attribute
+    def package_name(self):
+        """The name of the top-level Python module or package."""
+        return self.facts['package_name']
+
+    @lazy_attribute
+    def structure(self):
+        """``'module'`` or ``'package'``."""
+        return self.facts['structure']
+
+    @lazy_attribute
+    def src_file(self):
+        """The source file of the top-level module or package, relative to the project directory."""
+        return self.facts['src_file']
+
+    @lazy_attribute
+    def version(self):
+        """The version of the project, as in :file:`pyproject.toml`."""
+        return self.facts['version']
+
+    @lazy_attribute
+    def components(self):
+        """The components of the project (see :py:func:`get_components`)."""
+        components = self.state.get('components')
+        if components is None:
+            sources = self.state.signatures(['db.json'])
+            self.deserialize_db()
+            components = get_components(self.db)
+            self.state.put('components', components, sources)
+        return components
+
+    @lazy_attribute
+    def version_sites(self):
+        """The places in the project's files that hold the version, besides
+        :file:`pyproject.toml` (see :py:mod:`et_micc.sites`).
+
+        The sites are loaded from the project's snapshot if none of the files that
+        may contain them changed, otherwise these files are scanned again.
+        """
+        import et_micc.sites
+        sites = self.state.get('sites')
+        if sites is None:
+            paths = et_micc.sites.sources(self.package_name, self.project_path)
+            sources = self.state.signatures(['pyproject.toml'] + paths)
+            sites = et_micc.sites.scan(self.project_path, self.package_name, self.version, paths)
+            self.state.put('sites', sites, sources)
+        return sites
+
+    @lazy_attribute
+    def logger(self):
+        """The project's logger, which writes to the console and to the project's log file."""
+        self.get_logger()
+        return self.__dict__['logger']
+
+    @lazy_attribute
+    def template_parameters(self):
+        """The template parameters: :py:obj:`self.options.template_parameters`,
+        completed with the default parameters of the project or the user's preferences
+        (see :py:meth:`init_template_parameters`), or None if micc is not set up yet.
+        """
+        self.init_template_parameters()
+        if self.exit_code:
+            return None
+        return self.options.template_parameters
+
+    def init_template_parameters(self):
+        """Complete :py:obj:`self.options.template_parameters` with the default
+        parameters of the project (:file:`micc.json`) or the user's preferences.
+        """
+        from et_micc.expand import get_preferences, get_template_parameters
+        # Pick up the default parameters
+        default_parameters = {}
+        template_parameters_json = self.project_path / 'micc.json'
+        if template_parameters_json.exists():
+            default_parameters.update(
+                get_template_parameters(template_parameters_json)
+            )
+        else:
+            preferences = get_preferences(Path('.'))
+            if preferences is None:
+                self.error("Micc has not been set up yet: the preferences file '~/.et_micc/micc.json' was not found).\n"
+                           "Run 'micc setup' to create it.\n"
+                           "If you do not have a github account yet, you might want to create one first at:\n"
+                           "    https://github.com/join")
+                return
+            else:
+                default_parameters.update( get_template_parameters(preferences) )
+
+        # Add options.template_parameters to the default parameters
+        # (options.template_parameters takes precedence, so they must be added last)
+        default_parameters.update(self.options.template_parameters)
+        # Store all the parameters in options.template_parameters.
+        self.options.template_parameters = default_parameters
+
+    def rebind(self, options):
+        """Reuse this project object for another micc command (see ``micc batch``).
+
+        The project's files are not read again (see :py:meth:`reload`).
+
+        :param types.SimpleNameSpace options: the options of the next command.
+        """
+        self.exit_code = 0
+        self.options = options
+        # The template parameters depend on the options.
+        self.__dict__.pop('template_parameters', None)
+        options.logger = self.logger
+
+    def reload(self):
+        """Forget what was read from :file:`pyproject.toml`, :file:`db.json` and the
+        project structure, after a command that may have modified them on disk. They
+        are read again when they are needed.
+        """
+        if hasattr(self, 'db'):
+            del self.db
+        for name in ('pyproject', 'pyproject_toml', 'state', 'facts', 'project_name'
+                    , 'package_name', 'structure', 'src_file', 'version', 'components'
+                    , 'version_sites'):
+            self.__dict__.pop(name, None)
+
+    def defer_writes(self):
+        """Defer writing :file:`pyproject.toml`, :file:`db.json` and appending to the
+        documentation files until the next :py:meth:`flush`.
+
+        While writes are deferred, the in-memory :py:obj:`self.pyproject_toml` and
+        :py:obj:`self.db` are more recent than the files.
+        """
+        if self.deferred_writes is None:
+            self.deferred_writes = {}
+
+    def flush(self):
+        """Perform the deferred writes, and stop deferring writes."""
+        deferred_writes, self.deferred_writes = self.deferred_writes, None
+        for filename, text in (deferred_writes or {}).items():
+            if filename == 'pyproject.toml':
+                self.save_pyproject_toml()
+            elif filename == 'db.json':
+                self.serialize_db()
+            else:
+                self.append_to_file(filename, text)
+
+    def save_pyproject_toml(self):
+        """Write :py:obj:`self.pyproject_toml` to :file:`pyproject.toml`, unless writes
+        are deferred."""
+        if self.deferred_writes is None:
+            self.pyproject_toml.save()
+        else:
+            self.deferred_writes['pyproject.toml'] = None
+
+    def append_to_file(self, filename, text):
+        """Append *text* to file *filename* in the project directory, unless writes are
+        deferred.
+
+        :param str filename: path relative to the project directory.
+        :param str text: text to append.
+        """
+        if self.deferred_writes is None:
+            with (self.project_path / filename).open('a') as f:
+                f.write(text)
+        else:
+            self.deferred_writes[filename] = self.deferred_writes.get(filename, '') + text
+
     def error(self, msg):
         """Print an error message :py:obj:`msg` and set the project's :py:obj:`exit_code`."""
         click.secho("[ERROR]\n" + msg, fg='bright_red')
@@ -102,19 +368,20 @@ class Project:
 
     def create(self):
         """Create a new project skeleton."""
+        import et_micc.expand
+        if self.template_parameters is None:
+            return
 
         self.project_path.mkdir(parents=True, exist_ok=True)
 
         if not self.options.allow_nesting:
             # Prevent the creation of a project inside another project
-            p = self.project_path.parent.resolve()
-            while not p.samefile('/'):
-                if et_micc.utils.is_project_directory(p):
-                    self.error(f"Cannot create project in ({self.project_path}):\n"
-                               f"  Specify '--allow-nesting' to create a et_micc project inside another et_micc project ({p})."
-                               )
-                    return
-                p = p.parent
+            p = et_micc.roots.find_enclosing_project(self.project_path.parent)
+            if p is not None:
+                self.error(f"Cannot create project in ({self.project_path}):\n"
+                           f"  Specify '--allow-nesting' to create a et_micc project inside another et_micc project ({p})."
+                           )
+                return
 
         project_name = self.project_path.name
         self.project_name = project_name
@@ -138,9 +405,24 @@ class Project:
             relative_project_path = self.project_path
 
         if self.options.publish:
+            import requests
+            import et_micc.pypi
             rv = et_micc.utils.existsOnPyPI(self.package_name)
-            if rv is False:
-                pass # the name is not yet in use
+            if isinstance(rv, et_micc.pypi.Unverified):
+                self.warning(
+                    f"    The availability of name '{self.package_name}' on PyPI could not be verified online:\n"
+                    f"        {type(rv.error).__name__}: {rv.error}\n"
+                    f"    The name is {rv}, but it may have been registered since."
+                )
+            if rv is False or isinstance(rv, et_micc.pypi.Unverified):
+                # the name is not yet in use, but may be confused with names that are.
+                similar = et_micc.pypi.get_index().similar(self.package_name)
+                if similar:
+                    self.warning(
+                        f"    The name '{self.package_name}' is similar to names already in use on PyPI:\n"
+                        f"        {', '.join(name for name, _ in similar)}\n"
+                        f"    Users may confuse these projects, or install the wrong one by a typo."
+                    )
             else:
                 if rv is True:
                     self.error(
@@ -188,6 +470,7 @@ class Project:
                 with my_micc_file.open('w') as f:
                     json.dump(template_parameters, f)
                     self.logger.debug(f" . Wrote project template parameters to {my_micc_file}.")
+                et_micc.roots.get_index().register(self.project_path, self.project_name)
 
                 with et_micc.logger.log(self.logger.info, "Creating local git repository"):
                     with et_micc.utils.in_directory(self.project_path):
@@ -225,7 +508,8 @@ class Project:
                     "environment and install its dependencies."
                 )
         if self.options.publish:
-            self.logger.info(f"The name '{self.package_name}' is still available on PyPI.")
+            if rv is False:
+                self.logger.info(f"The name '{self.package_name}' is still available on PyPI.")
             self.logger.warning("To claim the name, it is best to publish your project now\n"
                                 "by running 'poetry publish'."
             )
@@ -233,6 +517,9 @@ class Project:
 
     def module_to_package_cmd(self):
         """Convert a module project (:file:`module.py`) to a package project (:file:`package/__init__.py`)."""
+        import et_micc.expand
+        if self.template_parameters is None:
+            return
         if self.structure == 'package':
             self.warning(f"Project ({self.project_name}) is already a package ({self.package}).")
             return
@@ -244,7 +531,7 @@ class Project:
         # add documentation files for general Python project
         self.options.templates = "package-general-docs"
         self.options.template_parameters.update(
-            {'project_short_description': self.pyproject_toml['tool']['poetry']['description']}
+            {'project_short_description': self.pyproject['tool']['poetry']['description']}
         )
         self.exit_code = et_micc.expand.expand_templates(self.options)
         if self.exit_code:
@@ -259,6 +546,7 @@ class Project:
         src = self.project_path / (self.package_name + '.py')
         dst = self.project_path / self.package_name / '__init__.py'
         shutil.move(src, dst)
+        self.record_move(src, dst)
 
 
     def info_cmd(self):
@@ -279,10 +567,7 @@ class Project:
 
         if self.options.verbosity >= 3 and self.structure == 'package':
             package_path = self.project_path / self.package_name
-            files = []
-            files.extend(package_path.glob('**/*.py'))
-            files.extend(package_path.glob('**/cpp_*/'))
-            files.extend(package_path.glob('**/f90_*'))
+            files = [package_path / f for f in self.package_contents()]
             if len(files) > 1:  # __init__.py is always there.
                 click.echo("  contents:")
                 for f in files:
@@ -314,6 +599,30 @@ class Project:
                     click.echo("    " + kind + click.style(str(f.relative_to(package_path)) + extra, fg=fg))
 
 
+    def package_contents(self):
+        """The Python files, and the C++ and Fortran module directories in the package,
+        relative to the package directory.
+
+        The list is stored in the project's snapshot, and only recomputed if a
+        directory of the package changed.
+        """
+        contents = self.state.get('contents')
+        if contents is None:
+            package_path = self.project_path / self.package_name
+            directories = []
+            for directory, subdirectories, _ in os.walk(str(package_path)):
+                subdirectories[:] = [d for d in subdirectories if d != '__pycache__']
+                directories.append(os.path.relpath(directory, str(self.project_path)))
+            sources = self.state.signatures(directories)
+            files = []
+            files.extend(package_path.glob('**/*.py'))
+            files.extend(package_path.glob('**/cpp_*/'))
+            files.extend(package_path.glob('**/f90_*'))
+            contents = [str(f.relative_to(package_path)) for f in files]
+            self.state.put('contents', contents, sources)
+        return contents
+
+    @write_behind
     def version_cmd(self):
         """Bump the version according to :py:obj:`self.options.rule` or show the
         current version if no rule is specified.
@@ -321,7 +630,8 @@ class Project:
         The version is stored in pyproject.toml in the project directory, and in
         :py:obj:`__version__` variable of the top-level package, which is either
         in :file:`<package_name>.py`, :file:`<package_name>/__init__.py`, or in
-        :file:`<package_name>/__version__.py`.
+        :file:`<package_name>/__version__.py`. Other places holding the version,
+        such as :file:`docs/conf.py`, are updated too (see :py:attr:`version_sites`).
         """
         self.options.verbosity = max(1, self.options.verbosity)
 
@@ -333,6 +643,7 @@ class Project:
                            + "version " + click.style(f"({self.version}) ", fg='cyan')
                            )
         else:
+            import semantic_version
             r = f"--{self.options.rule}"
             current_semver = semantic_version.Version(self.version)
             if self.options.rule == 'patch':
@@ -345,24 +656,30 @@ class Project:
                 r = f"--rule {self.options.rule}"
                 new_semver = semantic_version.Version(self.options.rule)
 
-            # update pyproject.toml
             if not self.options.dry_run:
-                self.pyproject_toml['tool']['poetry']['version'] = str(new_semver)
-                self.pyproject_toml.save()
-                # update __version__
-                look_for = f'__version__ = "{current_semver}"'
-                replace_with = f'__version__ = "{new_semver}"'
-                if self.structure == 'module':
-                    # update in <package_name>.py
-                    et_micc.utils.replace_in_file(self.project_path / self.src_file, look_for, replace_with)
-                else:
-                    # update in <package_name>/__init__.py
-                    p = self.project_path / self.package_name / "__version__.py"
-                    if p.exists():
-                        et_micc.utils.replace_in_file(p, look_for, replace_with)
-                    else:
-                        p = self.project_path / self.package_name / '__init__.py'
-                        et_micc.utils.replace_in_file(p, look_for, replace_with)
+                import et_micc.sites
+                current = self.version
+                sites = self.version_sites # before pyproject.toml changes
+                # update __version__, and the other version sites. All sites are verified
+                # before any file is modified.
+                try:
+                    modified = et_micc.sites.rewrite(self.project_path, sites, current, str(new_semver))
+                except ValueError:
+                    # The snapshot missed a modification: scan again.
+                    sites = et_micc.sites.scan(self.project_path, self.package_name, current)
+                    try:
+                        modified = et_micc.sites.rewrite(self.project_path, sites, current, str(new_semver))
+                    except ValueError as e:
+                        self.error(f"The version was not updated: {e}\n"
+                                   f"  A file was modified while micc was updating it. Try again.")
+                        return
+                # update pyproject.toml, last
+                self.pyproject_toml.set(('tool', 'poetry', 'version'), str(new_semver))
+                self.save_pyproject_toml()
+                if not any(site['kind'] == 'python' and Path(site['path']).parts[0] != 'docs' for site in sites):
+                    self.logger.warning(f'No \'__version__ = "{current}"\' found in the top-level package.')
+                for path in modified:
+                    self.logger.debug(f"Updated the version in {path}.")
 
                 self.logger.info(f"({self.project_name})> micc version ({current_semver}) -> ({new_semver})")
             else:
@@ -402,6 +719,44 @@ class Project:
         self.logger.info('Done.')
 
 
+    def template_sync_cmd(self):
+        """Re-apply the (updated) templates that were used to generate the project's files.
+
+        See :py:func:`et_micc.sync.sync_templates`.
+        """
+        import et_micc.sync
+        report = et_micc.sync.sync_templates(self.project_path
+                                            , dry_run=self.options.dry_run
+                                            , write_new=self.options.write_new
+                                            )
+        if report is None:
+            self.error(f"Project ({self.project_name}) has no template record ({et_micc.sync.RECORD_FILE}).\n"
+                       f"Only files generated by micc {__version__} or later can be synchronized.")
+            return
+
+        would = "Would be " if self.options.dry_run else ""
+        for title, paths in ((f"{would}updated (pristine files)", report.updated)
+                            ,(f"{would}added (new template files)", report.added)
+                            ,("Drifted (modified since generated, not updated)", report.drifted)
+                            ,("Missing (removed since generated, not restored)", report.missing)
+                            ,("Not added (file exists already)", report.untracked)
+                            ):
+            if paths:
+                self.logger.info(f"{title}:")
+                self.logger.indent(2)
+                for path in paths:
+                    self.logger.info(path)
+                self.logger.dedent()
+        if report.drifted:
+            if self.options.write_new and not self.options.dry_run:
+                self.warning("The new template output of drifted files was written to '<file>.new'.")
+            else:
+                self.warning("Rerun with '--write-new' to write the new template output of drifted files to '<file>.new'.")
+        if not (report.updated or report.added or report.drifted or report.missing or report.untracked):
+            self.logger.info("All generated files are up to date.")
+
+
+    @write_behind
     def add_cmd(self):
         """Add some source file to the project.
 
@@ -412,6 +767,8 @@ class Project:
         * :py:meth:`add_f90_module`,
         * :py:meth:`add_cpp_module`
         """
+        if self.template_parameters is None:
+            return
         if self.structure == 'module':
             self.error(f"Cannot add to a module project ({self.project_name}).\n"
                        f"  Use `micc convert-to-package' on this project to convert it to a package project."
@@ -513,6 +870,7 @@ class Project:
     
     def add_app(self, db_entry):
         """Add a console script (app, aka CLI) to the package."""
+        import et_micc.expand
         project_path = self.project_path
         app_name = self.options.add_name
         cli_app_name = 'cli_' + et_micc.utils.pep8_module_name(app_name)
@@ -557,7 +915,7 @@ class Project:
                             f.write(line)
                 # Create 'APPS.rst' if it does not exist:
                 txt = ''
-                if not Path('APPS.rst').exists():
+                if not Path('APPS.rst').exists() and 'APPS.rst' not in (self.deferred_writes or {}):
                     # create a title
                     title = "Command Line Interfaces (apps)"
                     line = len(title) * '*' + '\n'
@@ -572,14 +930,13 @@ class Project:
                         f"   :show-nested:\n\n"
                         )
                 file = 'APPS.rst'
-                with open(file, "a") as f:
-                    f.write(txt + txt2)
+                self.append_to_file(file, txt + txt2)
                 db_entry[file] = txt2
 
                 # pyproject.toml
                 self.add_dependencies({'click': '^7.0.0'})
-                self.pyproject_toml['tool']['poetry']['scripts'][app_name] = f"{package_name}:{cli_app_name}.main"
-                self.pyproject_toml.save()
+                self.pyproject_toml.set(('tool', 'poetry', 'scripts', app_name), f"{package_name}:{cli_app_name}.main")
+                self.save_pyproject_toml()
                 db_entry['pyproject.toml'] = f'{app_name} = "refactoring_dev:cli_{app_name}.main"\n'
 
                 # add 'import <package_name>.cli_<app_name> to __init__.py
@@ -590,6 +947,7 @@ class Project:
 
     def add_python_module(self, db_entry):
         """Add a python sub-module or sub-package to this project."""
+        import et_micc.expand
         project_path = self.project_path
         module_name = self.options.add_name
 
@@ -626,12 +984,12 @@ class Project:
                 filename = "API.rst"
                 text = f"\n.. automodule:: {package_name}.{module_name}" \
                         "\n   :members:\n\n"
-                with open(filename, "a") as f:
-                    f.write(text)
+                self.append_to_file(filename, text)
                 db_entry[filename] = text
 
     def add_f90_module(self, db_entry):
         """Add a f90 module to this project."""
+        import et_micc.expand
         project_path = self.project_path
         module_name = self.options.add_name
 
@@ -677,8 +1035,7 @@ class Project:
                 # docs
                 filename = "API.rst"
                 text = f"\n.. include:: ../{package_name}/f90_{module_name}/{module_name}.rst\n"
-                with open(filename, "a") as f:
-                    f.write(text)
+                self.append_to_file(filename, text)
                 db_entry[filename] = text
 
         self.add_auto_build_code(db_entry)
@@ -712,6 +1069,7 @@ class Project:
 
     def add_cpp_module(self, db_entry):
         """Add a cpp module to this project."""
+        import et_micc.expand
         project_path = self.project_path
         module_name = self.options.add_name
 
@@ -756,12 +1114,10 @@ class Project:
             with et_micc.utils.in_directory(project_path):
                 self.add_dependencies({'et-micc-build': f"^{CURRENT_ET_MICC_BUILD_VERSION}"})
                 # docs
-                with open("API.rst", "a") as f:
-                    filename = "API.rst"
-                    text = f"\n.. include:: ../{package_name}/cpp_{module_name}/{module_name}.rst\n"
-                    with open(filename, "a") as f:
-                        f.write(text)
-                    db_entry[filename] = text
+                filename = "API.rst"
+                text = f"\n.. include:: ../{package_name}/cpp_{module_name}/{module_name}.rst\n"
+                self.append_to_file(filename, text)
+                db_entry[filename] = text
 
         self.add_auto_build_code(db_entry)
 
@@ -829,31 +1185,88 @@ class Project:
 
         :param dict deps: (package,version_constraint) pairs.
         """
+        import et_micc.versions
         tool_poetry_dependencies = self.pyproject_toml['tool']['poetry']['dependencies']
         modified = False
         for pkg, version_constraint in deps.items():
             if pkg in tool_poetry_dependencies:
                 # project was already depending on this package
-                range1 = et_micc.utils.version_range(version_constraint)
-                range2 = et_micc.utils.version_range(tool_poetry_dependencies[pkg])
-                if range1 == range2:
-                    # nothing to do: new and old version specifcation are the same
+                current = str(tool_poetry_dependencies[pkg])
+                constraint, conflict = et_micc.versions.merge(current, version_constraint)
+                if conflict:
+                    self.warning(f"Conflicting version constraints for dependency {pkg}: '{current}' and '{version_constraint}'.\n"
+                                 f"  Using '{constraint}'.")
+                if constraint == current:
+                    # nothing to do: the current version constraint implies the new one
                     continue
-                intersection = et_micc.utils.intersect(range1, range2)
-                if et_micc.utils.validate_intersection(intersection):
-                    range = intersection
-                else:
-                    range = et_micc.utils.most_recent(version_constraint, tool_poetry_dependencies[pkg])
-                tool_poetry_dependencies[pkg] = et_micc.utils.version_constraint(range)
+                self.pyproject_toml.set(('tool', 'poetry', 'dependencies', pkg), constraint)
                 modified = True
             else:
                 # an entirely new dependency
-                tool_poetry_dependencies[pkg] = version_constraint
+                self.pyproject_toml.set(('tool', 'poetry', 'dependencies', pkg), version_constraint)
                 modified = True
         if modified:
-            self.pyproject_toml.save()
+            self.save_pyproject_toml()
             self.logger.warning("Dependencies added. Run `poetry install` to install missing dependencies in the project's virtual environment.")
 
+    @write_behind
+    def deps_add_cmd(self):
+        """Add or update the dependencies in :py:obj:`self.options.requirements`
+        (a list of ``(package, version_constraint)`` pairs) in :file:`pyproject.toml`.
+
+        The new version constraints are merged with the current ones in one pass
+        (see :py:func:`et_micc.versions.resolve`), and :file:`pyproject.toml` is
+        saved once. Dependencies with conflicting version constraints, or with a version
+        constraint that cannot be parsed, are reported, and left unchanged.
+        """
+        import re
+        import et_micc.versions
+        from et_micc.pypi import normalize
+
+        tool_poetry_dependencies = self.pyproject_toml['tool']['poetry']['dependencies']
+        # map normalized names to the names and version constraints in pyproject.toml
+        names = {}
+        current = {}
+        for name, value in tool_poetry_dependencies.items():
+            names[normalize(name)] = name
+            if isinstance(value, str):
+                current[name] = str(value)
+            elif hasattr(value, 'get') and value.get('version') is not None:
+                current[name] = str(value['version'])
+
+        requirements = []
+        for name, constraint in self.options.requirements:
+            name = names.get(normalize(name), name)
+            if name in tool_poetry_dependencies and name not in current:
+                self.warning(f"Dependency {name} has no version constraint in pyproject.toml (e.g. a git or path dependency).\n"
+                             f"  Ignoring '{name} {constraint}'.")
+                continue
+            requirements.append((name, constraint))
+
+        updates, conflicts, invalid = et_micc.versions.resolve(current, requirements)
+        for name, constraint in updates.items():
+            if name in current:
+                self.logger.info(f"Updating dependency {name}: '{current[name]}' -> '{constraint}'")
+            else:
+                self.logger.info(f"Adding dependency {name}: '{constraint}'")
+            value = tool_poetry_dependencies.get(name)
+            if value is not None and not isinstance(value, str):
+                self.pyproject_toml.set(('tool', 'poetry', 'dependencies', name, 'version'), constraint)
+            else:
+                self.pyproject_toml.set(('tool', 'poetry', 'dependencies', name), constraint)
+        if updates:
+            self.save_pyproject_toml()
+            self.logger.warning("Dependencies added. Run `poetry install` to install missing dependencies in the project's virtual environment.")
+        elif not conflicts and not invalid:
+            self.logger.info("All dependencies are up to date.")
+
+        if conflicts:
+            lines = [f"  {name}: " + ', '.join(f"'{c}'" for c in constraints) for name, constraints in conflicts.items()]
+            self.error("Conflicting version constraints (the dependencies were left unchanged):\n" + '\n'.join(lines))
+        if invalid:
+            lines = [f"  {name}: {e}" for name, e in invalid.items()]
+            self.error("Invalid version constraints (the dependencies were left unchanged):\n" + '\n'.join(lines))
+
     def module_to_package(self, module_py):
         """Move file :file:`module.py` to :file:`module/__init__.py`.
 
@@ -870,15 +1283,32 @@ class Project:
         package.mkdir()
         dst = str(package / '__init__.py')
         shutil.move(src, dst)
+        self.record_move(src, dst)
 
         et_micc.logger.log(self.logger.debug,
                            f" . Module {module_py} converted to package {package_name}{os.sep}__init__.py."
                            )
 
 
+    def record_move(self, src, dst):
+        """Record in the project's template record that a generated file was moved.
+
+        :param str|Path src: old path of the file.
+        :param str|Path dst: new path of the file.
+        """
+        import et_micc.sync
+        record = et_micc.sync.TemplateRecord(self.project_path)
+        if record:
+            project_path = self.project_path.resolve()
+            record.rename(os.path.relpath(str(Path(src).resolve()), str(project_path))
+                         ,os.path.relpath(str(Path(dst).resolve()), str(project_path))
+                         )
+            record.save()
+
+
     def get_logger(self, log_file_path=None):
         """"""
-        if self.logger:
+        if 'logger' in self.__dict__:
             return
 
         if log_file_path:
@@ -911,7 +1341,13 @@ class Project:
 
 
     def deserialize_db(self):
-        """Read file ``db.json`` into self.db."""
+        """Read file ``db.json`` into self.db.
+
+        While writes are deferred, self.db is more recent than ``db.json``, and
+        is not read again.
+        """
+        if self.deferred_writes is not None and hasattr(self, 'db'):
+            return
 
         db_json = self.project_path / 'db.json'
         if db_json.exists():
@@ -954,7 +1390,13 @@ class Project:
             # store the entry in self.db:
             self.db[self.options.add_name] = db_entry
 
+        if hasattr(self, 'db'):
+            self.components = get_components(self.db)
+
         # finally, serialize self.db
+        if self.deferred_writes is not None:
+            self.deferred_writes['db.json'] = None
+            return
         with et_micc.utils.in_directory(self.project_path):
             with open('db.json','w') as f:
                 json.dump(self.db, f, indent=2)
@@ -965,7 +1407,12 @@ class Project:
         cur_name, new_name = self.options.cur_name, self.options.new_name
         # Look up <cur_name> in the project's database to find out what kind of a component it is:
         self.deserialize_db()
-        db_entry = self.db[cur_name] # may raise KeyError
+        if cur_name not in self.db:
+            self.error(f"Project {self.project_name} has no component named {cur_name}.\n"
+                       f"  Components: {', '.join(sorted(get_components(self.db))) or 'none'}."
+                       )
+            return
+        db_entry = self.db[cur_name]
 
         component_options = db_entry['options']
         if new_name: # rename
@@ -0,0 +1,681 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.pypi
+===================
+
+A local snapshot of the names of the projects on PyPI.
+
+``micc create --publish`` verifies that the name of a new project is not yet
+in use on PyPI. Rather than asking PyPI for every name, micc keeps a snapshot of
+the names in the PyPI *simple index* (`PEP 503 <https://www.python.org/dev/peps/pep-0503/>`_),
+in :file:`~/.et_micc/cache/pypi/`:
+
+* :file:`names.txt`: the normalized project names (see :py:func:`normalize`),
+  sorted, one per line. A name is looked up by bisection in a memory map of the
+  file, without reading it.
+* :file:`names.bloom`: a Bloom filter of the names, which rejects most names
+  that are not in the snapshot without touching :file:`names.txt`.
+* :file:`names.grams`: an inverted index of the trigrams of the names, used to
+  find names that are similar to a given name (see :py:meth:`NameIndex.similar`).
+* :file:`meta.json`: the URL of the index, and the ``ETag`` and PyPI serial
+  (``X-PyPI-Last-Serial``) of the snapshot.
+
+The snapshot is refreshed with ``micc pypi-index --refresh`` (see
+:py:meth:`NameIndex.refresh`). The request is conditional on the ``ETag`` of the
+snapshot, and the files are only rewritten if the serial changed.
+
+Names that are not in the snapshot are verified online by a :py:class:`NameChecker`,
+which checks many names concurrently over a pool of keep-alive connections (see
+:py:func:`check_names` and ``micc check-names``).
+
+The URL of the index is ``https://pypi.org/simple/``, or the value of the
+environment variable ``MICC_PYPI_INDEX``.
+"""
+
+import os
+import re
+import json
+import math
+import mmap
+import time
+import bisect
+import struct
+import hashlib
+from array import array
+from collections import Counter
+from pathlib import Path
+
+import et_micc.utils
+
+DEFAULT_INDEX_URL = 'https://pypi.org/simple/'
+"""The PyPI simple index."""
+
+ERROR_RATE = 0.01
+"""False positive rate of the Bloom filter."""
+
+GRAM = 3
+"""Length of the n-grams in :file:`names.grams`."""
+
+_GRAMS_HEADER = struct.Struct('<4sIII')
+_GRAMS_MAGIC = b'MG01'
+
+_ANCHOR = re.compile(rb"<a\s[^>]*>([^<]+)</a>", re.IGNORECASE)
+
+
+def index_url():
+    """The URL of the simple index: ``$MICC_PYPI_INDEX`` or :py:const:`DEFAULT_INDEX_URL`."""
+    return os.environ.get('MICC_PYPI_INDEX', DEFAULT_INDEX_URL)
+
+
+def normalize(name):
+    """Normalize a project name as in PEP 503: lowercase, with runs of ``-``,
+    ``_`` and ``.`` replaced by a single ``-``."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class BloomFilter:
+    """A Bloom filter of byte strings.
+
+    :param int bits: the number of bits.
+    :param int hashes: the number of hash functions.
+    :param bytes data: the bits, e.g. as read from file (by default all bits are 0).
+    """
+    def __init__(self, bits, hashes, data=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray((bits + 7) // 8) if data is None else data
+
+    @classmethod
+    def for_capacity(cls, n, error_rate=ERROR_RATE):
+        """A Bloom filter for *n* keys, with the given false positive rate."""
+        n = max(n, 1)
+        bits = max(8, int(-n * math.log(error_rate) / math.log(2)**2))
+        hashes = max(1, round(bits / n * math.log(2)))
+        return cls(bits, hashes)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        data = self.data
+        return all(data[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def _bisect(names, key):
+    """Test if the line *key* occurs in *names*, the contents of a file with sorted lines."""
+    lo, hi = 0, len(names)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        start = names.rfind(b'\n', 0, mid) + 1
+        end = names.find(b'\n', start)
+        if end < 0:
+            end = len(names)
+        line = names[start:end]
+        if line == key:
+            return True
+        if line < key:
+            lo = end + 1
+        else:
+            hi = start
+    return False
+
+
+def grams(key):
+    """The set of trigrams of *key*, padded with ``^`` and ``$``.
+
+    The padding makes that every character of *key* occurs in :py:const:`GRAM`
+    trigrams.
+
+    :param bytes key: a normalized name.
+    """
+    padded = b'^^' + key + b'$$'
+    return {padded[i:i + GRAM] for i in range(len(padded) - GRAM + 1)}
+
+
+def _pattern(a):
+    """The bit masks of the positions of the characters in *a*, for :py:func:`_distance`."""
+    pattern = {}
+    for i, c in enumerate(a):
+        pattern[c] = pattern.get(c, 0) | (1 << i)
+    return pattern
+
+
+def _distance(pattern, m, b):
+    """The edit distance between a string *a* of length *m* and *b*, with the
+    bit-parallel algorithm of Myers, extended for transpositions by Hyyrö.
+
+    :param dict pattern: ``_pattern(a)``.
+    """
+    if m == 0:
+        return len(b)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    vp, vn, d0, previous = mask, 0, 0, 0
+    score = m
+    for c in b:
+        eq = pattern.get(c, 0)
+        tr = (((~d0) & eq) << 1) & previous
+        d0 = ((((eq & vp) + vp) ^ vp) | eq | vn | tr) & mask
+        hp = vn | (~(d0 | vp) & mask)
+        hn = d0 & vp
+        if hp & last:
+            score += 1
+        elif hn & last:
+            score -= 1
+        hp = ((hp << 1) | 1) & mask
+        hn = (hn << 1) & mask
+        vp = hn | (~(d0 | hp) & mask)
+        vn = d0 & hp
+        previous = eq
+    return score
+
+
+def distance(a, b):
+    """The edit distance between *a* and *b*, counting insertions, deletions,
+    substitutions and transpositions of adjacent characters (the optimal string
+    alignment distance).
+
+    :param bytes|str a:
+    :param bytes|str b:
+    """
+    return _distance(_pattern(a), len(a), b)
+
+
+class GramIndex:
+    """An inverted index of the trigrams of the names in a snapshot.
+
+    The names are numbered in order of increasing length, so that the names of
+    a given length form a contiguous range of numbers, also in every posting
+    list. The content of :file:`names.grams` is:
+
+    * a header: magic, the number of names, the number of distinct trigrams,
+      the maximum length of the names,
+    * for every length up to the maximum length plus one, the number of the
+      first name of that length (uint32),
+    * the offsets of the names in :file:`names.txt`, by number (uint32),
+    * the sorted trigrams (3 bytes each, padded to a multiple of 4 bytes),
+    * the offsets of the posting lists of the trigrams (uint32, one more than
+      the number of trigrams),
+    * the posting lists: the sorted numbers of the names containing the trigram.
+
+    :param bytes data: the content of :file:`names.grams`.
+    """
+    def __init__(self, data):
+        magic, n_names, n_grams, max_length = _GRAMS_HEADER.unpack_from(data)
+        if magic != _GRAMS_MAGIC:
+            raise ValueError("Not a trigram index.")
+        view = memoryview(data)
+        start = _GRAMS_HEADER.size
+        self.first = view[start:start + 4 * (max_length + 2)].cast('I')
+        start += 4 * (max_length + 2)
+        self.offsets = view[start:start + 4 * n_names].cast('I')
+        start += 4 * n_names
+        table = bytes(view[start:start + GRAM * n_grams])
+        self.grams = {table[i * GRAM:(i + 1) * GRAM]: i for i in range(n_grams)}
+        start += -(-GRAM * n_grams // 4) * 4
+        self.starts = view[start:start + 4 * (n_grams + 1)].cast('I')
+        start += 4 * (n_grams + 1)
+        self.postings = view[start:].cast('I')
+
+    @staticmethod
+    def build(keys):
+        """Build the content of :file:`names.grams`.
+
+        :param list keys: the names in :file:`names.txt`, as bytes, in order.
+        :returns: bytes
+        """
+        offsets = []
+        offset = 0
+        for key in keys:
+            offsets.append(offset)
+            offset += len(key) + 1
+        order = sorted(range(len(keys)), key=lambda i: len(keys[i]))
+        max_length = len(keys[order[-1]]) if keys else 0
+        first = array('I', (max_length + 2) * [len(keys)])
+        postings = {}
+        for number, i in enumerate(order):
+            key = keys[i]
+            if first[len(key)] == len(keys):
+                first[len(key)] = number
+            for gram in grams(key):
+                postings.setdefault(gram, array('I')).append(number)
+        for length in range(max_length, -1, -1):
+            first[length] = min(first[length], first[length + 1])
+        table = sorted(postings)
+        starts = array('I', [0])
+        data = array('I')
+        for gram in table:
+            data.extend(postings[gram])
+            starts.append(len(data))
+        table = b''.join(table)
+        table += bytes(-len(table) % 4)
+        return b''.join([_GRAMS_HEADER.pack(_GRAMS_MAGIC, len(keys), len(postings), max_length)
+                        , first.tobytes(), array('I', (offsets[i] for i in order)).tobytes()
+                        , table, starts.tobytes(), data.tobytes()
+                        ])
+
+    def posting(self, gram):
+        """The sorted numbers of the names containing *gram*."""
+        i = self.grams.get(gram)
+        if i is None:
+            return self.postings[0:0]
+        return self.postings[self.starts[i]:self.starts[i + 1]]
+
+    def length(self, number):
+        """The length of name *number*."""
+        return bisect.bisect_right(self.first, number) - 1
+
+    def candidates(self, key, max_distance):
+        """The numbers of the names that may be within *max_distance* of *key*.
+
+        The length of such a name differs at most *max_distance* from that of *key*,
+        and only that range of every posting list is considered. An edit destroys
+        at most ``GRAM + 1`` trigrams (a transposition), hence such a name shares
+        at least ``len(grams(key)) - max_distance * (GRAM + 1)`` trigrams with *key*.
+        The shortest posting lists are merged, such that a name that shares enough
+        trigrams with *key* occurs in one of them, and the shared trigrams of the
+        names found are counted by bisection in the other lists. If the bound is
+        zero (for short keys), all names in the range of lengths are candidates.
+
+        :param bytes key: a normalized name.
+        :param int max_distance:
+        :returns: list or range of name numbers.
+        """
+        first = self.first
+        lo = first[max(0, min(len(key) - max_distance, len(first) - 1))]
+        hi = first[min(len(key) + max_distance + 1, len(first) - 1)]
+        threshold = len(grams(key)) - max_distance * (GRAM + 1)
+        if threshold < 1:
+            return range(lo, hi)
+        lists = []
+        for gram in grams(key):
+            posting = self.posting(gram)
+            lists.append(posting[bisect.bisect_left(posting, lo):bisect.bisect_left(posting, hi)])
+        lists.sort(key=len)
+        merged = len(lists) - threshold + 1
+        counts = Counter()
+        for posting in lists[:merged]:
+            counts.update(posting)
+        if threshold == 1:
+            return list(counts)
+        candidates = []
+        for number, count in counts.items():
+            for posting in lists[merged:]:
+                if count >= threshold:
+                    break
+                i = bisect.bisect_left(posting, number)
+                if i < len(posting) and posting[i] == number:
+                    count += 1
+            if count >= threshold:
+                candidates.append(number)
+        return candidates
+
+
+def parse_index(data, content_type=''):
+    """The project names in the content of a simple index page.
+
+    :param bytes data: the content, HTML (PEP 503) or JSON (PEP 691).
+    :param str content_type: the content type of the response.
+    :returns: set of normalized names.
+    """
+    if 'json' in content_type:
+        return {normalize(project['name']) for project in json.loads(data.decode('utf-8'))['projects']}
+    return {normalize(name.decode('utf-8').strip()) for name in _ANCHOR.findall(data)}
+
+
+class NameIndex:
+    """The local snapshot of the names in a simple index.
+
+    :param Path directory: location of the snapshot, by default :file:`~/.et_micc/cache/pypi`.
+    :param str url: URL of the simple index, by default :py:func:`index_url`.
+    """
+    def __init__(self, directory=None, url=None):
+        if directory is None:
+            directory = Path.home() / '.et_micc' / 'cache' / 'pypi'
+        self.directory = Path(directory)
+        self.url = url or index_url()
+        self._meta = None
+        self._bloom = None
+        self._names = None
+        self._grams = None
+
+    @property
+    def meta(self):
+        """The metadata of the snapshot (an empty dict if there is no snapshot of
+        :py:obj:`self.url`)."""
+        if self._meta is None:
+            try:
+                with (self.directory / 'meta.json').open() as f:
+                    meta = json.load(f)
+                if meta.get('url') != self.url or (self.directory / 'names.txt').stat().st_size != meta['size']:
+                    meta = {}
+            except (OSError, ValueError, KeyError):
+                meta = {}
+            self._meta = meta
+        return self._meta
+
+    def available(self):
+        """Test if there is a snapshot."""
+        return bool(self.meta)
+
+    def _load(self):
+        if self._bloom is None:
+            meta = self.meta
+            self._bloom = BloomFilter(meta['bits'], meta['hashes'], (self.directory / 'names.bloom').read_bytes())
+            if meta['size']:
+                with (self.directory / 'names.txt').open('rb') as f:
+                    self._names = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._names = b''
+
+    def contains(self, name):
+        """Test if a project name is in the snapshot.
+
+        :param str name: the project name (not necessarily normalized).
+        :returns: True or False, or None if there is no snapshot.
+        """
+        if not self.available():
+            return None
+        self._load()
+        key = normalize(name).encode('utf-8')
+        if key not in self._bloom:
+            return False
+        return _bisect(self._names, key)
+
+    def similar(self, name, max_distance=None, limit=10):
+        """The names in the snapshot that are similar to *name*, i.e. within edit
+        distance *max_distance* (see :py:func:`distance`), but not equal.
+
+        The names are looked up in the trigram index (see :py:class:`GramIndex`),
+        which is built on first use if the snapshot has none.
+
+        :param str name: the project name (not necessarily normalized).
+        :param int max_distance: maximum edit distance. By default, 1 for names of
+            less than 7 characters, and 2 for longer names. (For a larger distance
+            the trigram index prunes few names, and the search is slow.)
+        :param int limit: maximum number of names returned (None for all).
+        :returns: list of (name, distance) tuples, closest first. The list is
+            empty if there is no snapshot.
+        """
+        if not self.available():
+            return []
+        self._load()
+        index = self._load_grams()
+        key = normalize(name).encode('utf-8')
+        if max_distance is None:
+            max_distance = 1 if len(key) < 7 else 2
+        pattern = _pattern(key)
+        names, offsets = self._names, index.offsets
+        found = []
+        for number in index.candidates(key, max_distance):
+            start = offsets[number]
+            other = names[start:start + index.length(number)]
+            d = _distance(pattern, len(key), other)
+            if 0 < d <= max_distance:
+                found.append((d, other))
+        return [(other.decode('utf-8'), d) for d, other in sorted(found)[:limit]]
+
+    def _load_grams(self):
+        if self._grams is None:
+            path = self.directory / 'names.grams'
+            if self.meta.get('grams') is None or not path.is_file() or path.stat().st_size != self.meta['grams']:
+                data = GramIndex.build([name.encode('utf-8') for name in self.names()])
+                et_micc.utils.write_atomically(path, data)
+                self._save_meta(dict(self.meta, grams=len(data)))
+            else:
+                data = path.read_bytes()
+            self._grams = GramIndex(data)
+        return self._grams
+
+    def names(self):
+        """Iterate over the names in the snapshot, in sorted order."""
+        if not self.available():
+            return
+        self._load()
+        names = self._names
+        start = 0
+        while start < len(names):
+            end = names.find(b'\n', start)
+            if end < 0:
+                end = len(names)
+            yield names[start:end].decode('utf-8')
+            start = end + 1
+
+    def refresh(self, timeout=60):
+        """Download the simple index, unless the snapshot is up to date.
+
+        The request carries the ``ETag`` of the snapshot, so that an unmodified
+        index is not downloaded again. The snapshot is only rewritten if the PyPI
+        serial of the index changed (or if the index has no serial).
+
+        :param float timeout: timeout of the request in seconds.
+        :returns: True if the snapshot was rewritten.
+        :raises: OSError (e.g. urllib.error.URLError) if the index cannot be downloaded.
+        """
+        import urllib.request
+        import urllib.error
+
+        meta = self.meta
+        request = urllib.request.Request(self.url, headers={
+            'Accept': 'application/vnd.pypi.simple.v1+json, text/html;q=0.1',
+            'User-Agent': 'et-micc',
+        })
+        if meta.get('etag'):
+            request.add_header('If-None-Match', meta['etag'])
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                serial = response.headers.get('X-PyPI-Last-Serial')
+                etag = response.headers.get('ETag')
+                if serial is not None and serial == meta.get('serial'):
+                    self._save_meta(dict(meta, etag=etag, checked=time.time()))
+                    return False
+                names = parse_index(response.read(), response.headers.get('Content-Type', ''))
+        except urllib.error.HTTPError as e:
+            if e.code == 304: # not modified
+                self._save_meta(dict(meta, checked=time.time()))
+                return False
+            raise
+
+        self.write(names, etag=etag, serial=serial)
+        return True
+
+    def write(self, names, etag=None, serial=None):
+        """Write a snapshot of *names*.
+
+        :param iterable names: the normalized project names.
+        :param str etag: ``ETag`` of the index.
+        :param str serial: PyPI serial of the index.
+        """
+        keys = sorted({name.encode('utf-8') for name in names})
+        bloom = BloomFilter.for_capacity(len(keys))
+        for key in keys:
+            bloom.add(key)
+        data = b'\n'.join(keys)
+        grams_data = GramIndex.build(keys)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.close()
+        et_micc.utils.write_atomically(self.directory / 'names.txt', data)
+        et_micc.utils.write_atomically(self.directory / 'names.bloom', bytes(bloom.data))
+        et_micc.utils.write_atomically(self.directory / 'names.grams', grams_data)
+        now = time.time()
+        self._save_meta({'url': self.url, 'etag': etag, 'serial': serial, 'count': len(keys)
+                        , 'size': len(data), 'bits': bloom.bits, 'hashes': bloom.hashes
+                        , 'grams': len(grams_data), 'fetched': now, 'checked': now
+                        })
+
+    def _save_meta(self, meta):
+        et_micc.utils.write_atomically(self.directory / 'meta.json', json.dumps(meta).encode('utf-8'))
+        self._meta = meta
+
+    def close(self):
+        """Release the memory map of the names, if any."""
+        if isinstance(self._names, mmap.mmap):
+            self._names.close()
+        self._names = None
+        self._bloom = None
+        self._grams = None
+        self._meta = None
+
+
+class NameChecker:
+    """Verifies online whether project names exist in a simple index.
+
+    All requests go through one :py:class:`requests.Session`, whose connection
+    pool keeps the connections to the index alive, with at most *jobs* requests
+    in flight. Answers are cached in memory for *ttl* seconds.
+
+    :param str url: URL of the simple index, by default :py:func:`index_url`.
+    :param int jobs: maximum number of concurrent requests.
+    :param float timeout: timeout of a request in seconds.
+    :param float ttl: time (in s) an answer is cached.
+    """
+    def __init__(self, url=None, jobs=8, timeout=10, ttl=600):
+        self.url = url or index_url()
+        if not self.url.endswith('/'):
+            self.url += '/'
+        self.jobs = jobs
+        self.timeout = timeout
+        self.ttl = ttl
+        self.cache = {}
+        self._session = None
+        self._pool_size = 0
+
+    @property
+    def session(self):
+        """The HTTP session, created on first use. Its connection pool is replaced by
+        a larger one if :py:attr:`jobs` was raised."""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers['User-Agent'] = 'et-micc'
+            self._pool_size = 0
+        if self._pool_size < self.jobs:
+            from requests.adapters import HTTPAdapter
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.jobs)
+            for prefix in ('http://', 'https://'):
+                previous = self._session.adapters.get(prefix)
+                self._session.mount(prefix, adapter)
+                if previous is not None:
+                    previous.close()
+            self._pool_size = self.jobs
+        return self._session
+
+    def exists(self, name):
+        """Does project *name* exist in the index?
+
+        :param str name: the project name (not necessarily normalized).
+        :returns: True|False|Exception. In case of an exception the result is
+            inconclusive. Exceptions are not cached.
+        """
+        key = normalize(name)
+        cached = self.cache.get(key)
+        if cached is not None and time.monotonic() - cached[1] < self.ttl:
+            return cached[0]
+        try:
+            response = self.session.get(f"{self.url}{key}/", timeout=self.timeout)
+            if response.status_code == 404:
+                exists = False
+            else:
+                response.raise_for_status()
+                exists = True
+        except Exception as e:
+            return e
+        self.cache[key] = (exists, time.monotonic())
+        return exists
+
+    def check(self, names):
+        """Verify many names concurrently.
+
+        :param list names: project names.
+        :returns: dict mapping the names to True|False|Exception (see :py:meth:`exists`).
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        names = list(dict.fromkeys(names))
+        self.session # size the connection pool for self.jobs before starting the threads
+        if len(names) < 2:
+            return {name: self.exists(name) for name in names}
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(names))) as executor:
+            return dict(zip(names, executor.map(self.exists, names)))
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class Unverified:
+    """The result of :py:func:`check_names` for a name that is not in the local
+    snapshot, and could not be verified online. The name was available when the
+    snapshot was taken, but may have been registered since.
+
+    :param Exception error: the error of the online check.
+    :param dict meta: the metadata of the snapshot (see :py:attr:`NameIndex.meta`).
+    """
+    def __init__(self, error, meta):
+        self.error = error
+        self.serial = meta.get('serial')
+        self.checked = meta.get('checked')
+
+    def __str__(self):
+        checked = time.strftime('%Y-%m-%d %H:%M', time.localtime(self.checked)) if self.checked else '?'
+        serial = f" (serial {self.serial})" if self.serial is not None else ''
+        return f"not in the snapshot of {checked}{serial}"
+
+
+def check_names(names, jobs=8, timeout=10):
+    """Verify whether project names exist on PyPI.
+
+    Names in the local snapshot (see :py:class:`NameIndex`) exist. The other names
+    are verified online, concurrently (see :py:class:`NameChecker`), as they may have
+    been registered after the snapshot was taken. If that fails, the result is
+    :py:class:`Unverified` if there is a snapshot, and the exception otherwise.
+
+    :param list names: project names.
+    :param int jobs: maximum number of concurrent requests.
+    :param float timeout: timeout of a request in seconds.
+    :returns: dict mapping the names to True|False|Unverified|Exception, as
+        :py:func:`et_micc.utils.existsOnPyPI`.
+    """
+    index = get_index()
+    result = {name: True for name in names if index.contains(name)}
+    checker = get_checker()
+    checker.jobs, checker.timeout = jobs, timeout
+    for name, exists in checker.check([name for name in names if name not in result]).items():
+        if isinstance(exists, Exception) and index.available():
+            exists = Unverified(exists, index.meta)
+        result[name] = exists
+    return result
+
+
+_index = None
+_checker = None
+
+
+def get_checker():
+    """The :py:class:`NameChecker` for :py:func:`index_url`, shared by all name checks
+    in the process."""
+    global _checker
+    if _checker is None or _checker.url.rstrip('/') != index_url().rstrip('/'):
+        if _checker is not None:
+            _checker.close()
+        _checker = NameChecker()
+    return _checker
+
+
+def get_index():
+    """The :py:class:`NameIndex` of the current user, for :py:func:`index_url`."""
+    global _index
+    if _index is None or _index.url != index_url():
+        _index = NameIndex()
+    return _index
+
+#eof
@@ -0,0 +1,598 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.render
+=====================
+
+In-process rendering of *Cookiecutter* templates.
+
+A :py:class:`TemplateTree` reads and compiles the Jinja sources of a template
+once. Rendering it with a set of template parameters produces an in-memory
+file set (a dict mapping output paths to :py:class:`RenderedFile` objects),
+which can be checked against the project directory before anything is written.
+
+Compiled templates are stored in a persistent :py:class:`TemplateCache` under
+:file:`~/.et_micc/cache`, so that the Jinja sources are parsed only once per
+version of a template.
+
+Template files without any Jinja markup (and binary files) are classified as
+*static* when the template is compiled. They are not rendered, but copied by
+the kernel (see :py:func:`copy_file`).
+"""
+
+import os
+import sys
+import errno
+import json
+import shutil
+import hashlib
+import marshal
+import importlib.util
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+from binaryornot.check import is_binary
+from cookiecutter.environment import StrictEnvironment
+from cookiecutter.find import find_template
+from jinja2.exceptions import UndefinedError
+
+from et_micc import __version__
+from et_micc.utils import write_atomically
+
+try:
+    import fcntl
+except ImportError: # not available on Windows
+    fcntl = None
+
+CACHE_SIZE_LIMIT = 32 * 1024 * 1024
+"""Default maximum size (in bytes) of the compiled-template cache."""
+
+CACHE_FORMAT = 4
+"""Version of the layout of the compiled-template cache entries."""
+
+
+class RenderedFile:
+    """A rendered template file, not yet written to disk.
+
+    :param Path source: the template file it was rendered from.
+    :param str|bytes content: rendered text, or raw bytes for binary files.
+    """
+    def __init__(self, source, content):
+        self.source = source
+        self.content = content
+
+    @property
+    def data(self):
+        """The bytes that :py:meth:`write` writes to disk (text files are utf-8 encoded,
+        with platform specific line endings)."""
+        if isinstance(self.content, bytes):
+            return self.content
+        content = self.content
+        if os.linesep != '\n':
+            content = content.replace('\n', os.linesep)
+        return content.encode('utf-8')
+
+    @property
+    def hash(self):
+        """The sha256 hash of :py:attr:`data`."""
+        return hashlib.sha256(self.data).hexdigest()
+
+    def write(self, path):
+        """Write the content to *path*, and copy the permission bits of the source."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('wb') as f:
+            f.write(self.data)
+        shutil.copymode(str(self.source), str(path))
+
+
+FICLONE = 0x40049409
+"""The Linux ioctl request code for cloning a file (reflink)."""
+
+JINJA_MARKUP = ('{{', '{%', '{#')
+"""Strings that mark the start of Jinja expressions, statements and comments."""
+
+
+def copy_file(source, path):
+    """Copy file *source* to *path*, without reading the data into Python.
+
+    The fastest mechanism available is used:
+
+    * a reflink (``FICLONE`` ioctl), which shares the data blocks on copy-on-write
+      file systems such as btrfs and xfs,
+    * :py:func:`os.copy_file_range` (Linux, Python 3.8+), which copies in the kernel,
+    * :py:func:`shutil.copyfile`, which uses ``sendfile`` (Linux) or ``fcopyfile``
+      (macOS) on Python 3.8+, and a plain read/write loop otherwise.
+
+    :param Path source: the file to copy.
+    :param Path path: the destination, which is overwritten if it exists.
+    """
+    with open(str(source), 'rb') as fsrc, open(str(path), 'wb') as fdst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return
+            except OSError:
+                pass # not supported by the file system, or not on the same file system.
+
+        if hasattr(os, 'copy_file_range'):
+            size = os.fstat(fsrc.fileno()).st_size
+            offset = 0
+            try:
+                while offset < size:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset, offset, offset)
+                    if n == 0:
+                        break
+                    offset += n
+                if offset == size:
+                    return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF):
+                    raise
+            fdst.truncate(0)
+    shutil.copyfile(str(source), str(path))
+
+
+class StaticFile(RenderedFile):
+    """A template file that needs no rendering.
+
+    The file is copied by the kernel when it is written (see :py:func:`copy_file`),
+    and its content is only read if needed.
+
+    :param Path source: the template file.
+    :param str hash: the sha256 hash of the file, computed when the template was compiled.
+    """
+    def __init__(self, source, hash):
+        self.source = source
+        self._hash = hash
+
+    @property
+    def content(self):
+        return self.source.read_bytes()
+
+    @property
+    def hash(self):
+        return self._hash
+
+    def write(self, path):
+        """Copy the source to *path*, and copy the permission bits of the source."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        copy_file(self.source, path)
+        shutil.copymode(str(self.source), str(path))
+
+
+def render_parameters(parameters, env=None):
+    """Render the template parameters the way *Cookiecutter* does with ``no_input=True``.
+
+    Parameter values may refer to earlier parameters, e.g.
+    ``"github_repo": "{{ cookiecutter.project_name }}"``. Choice variables (lists)
+    take their first item, dicts are rendered after all other variables, and
+    private variables (starting with ``'_'``) are left untouched.
+
+    :param dict parameters: (parameter name, parameter value) pairs.
+    :returns: an OrderedDict with the rendered parameters.
+    """
+    if env is None:
+        env = StrictEnvironment()
+
+    def render(raw, rendered):
+        if raw is None:
+            return None
+        if isinstance(raw, dict):
+            return {render(k, rendered): render(v, rendered) for k, v in raw.items()}
+        if isinstance(raw, list):
+            return [render(v, rendered) for v in raw]
+        if not isinstance(raw, str):
+            raw = str(raw)
+        return env.from_string(raw).render(cookiecutter=rendered)
+
+    rendered = OrderedDict()
+    for key, raw in parameters.items():
+        if key.startswith('_'):
+            rendered[key] = raw
+        elif isinstance(raw, list):
+            rendered[key] = render(raw, rendered)[0]
+        elif not isinstance(raw, dict):
+            rendered[key] = render(raw, rendered)
+    for key, raw in parameters.items():
+        if isinstance(raw, dict) and not key.startswith('_'):
+            rendered[key] = render(raw, rendered)
+    return rendered
+
+
+NOW_VARIABLE = '_micc_now'
+"""Name of the render variable holding the time at which ``{% now %}`` tags are rendered."""
+
+
+def now():
+    """The current time, as an ISO 8601 string, for :py:class:`NowExtension`."""
+    return datetime.now(timezone.utc).isoformat()
+
+
+class NowExtension(Extension):
+    """The ``{% now %}`` tag of *jinja2_time*, rendered at a given time.
+
+    Templates using ``{% now %}`` (e.g. the copyright year in :file:`LICENSE`) are
+    rendered with the time of the original expansion when they are rendered again,
+    so that their output does not depend on the date of rendering. The time is
+    the ISO 8601 string of the render variable :py:data:`NOW_VARIABLE`, or the
+    current time if it is missing.
+
+    It replaces the *jinja2_time* extension of the environment of a
+    :py:class:`TemplateTree`. As the time is read from the render context, the
+    same template can be rendered concurrently at different times.
+    """
+    tags = {'now'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(datetime_format='%Y-%m-%d')
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        node = parser.parse_expression()
+        if parser.stream.skip_if('comma'):
+            datetime_format = parser.parse_expression()
+        else:
+            datetime_format = nodes.Const(None)
+        if isinstance(node, (nodes.Add, nodes.Sub)):
+            operator = '+' if isinstance(node, nodes.Add) else '-'
+            args = [node.left, nodes.Const(operator), node.right]
+        else:
+            args = [node, nodes.Const('+'), nodes.Const('')]
+        call = self.call_method('_now', [nodes.ContextReference()] + args + [datetime_format], lineno=lineno)
+        return nodes.Output([call], lineno=lineno)
+
+    def _now(self, context, tz, operator, offset, datetime_format):
+        import arrow
+        when = context.get(NOW_VARIABLE)
+        d = arrow.now(tz) if when is None else arrow.get(when).to(tz)
+        shift = {}
+        for param in filter(None, offset.split(',')):
+            interval, value = param.split('=')
+            shift[interval.strip()] = float(operator + value.strip())
+        return d.shift(**shift).strftime(datetime_format or self.environment.datetime_format)
+
+
+def referenced_parameters(env, source):
+    """Find the template parameters that a Jinja source refers to.
+
+    :param Environment env: Jinja environment.
+    :param str source: Jinja source.
+    :returns: a set of parameter names, or None if the source uses the
+        ``cookiecutter`` variable in a way that does not reveal the parameter names.
+    """
+    ast = env.parse(source)
+    names = set()
+    references = 0
+    for node in ast.find_all((nodes.Getattr, nodes.Getitem)):
+        if isinstance(node.node, nodes.Name) and node.node.name == 'cookiecutter':
+            if isinstance(node, nodes.Getattr):
+                names.add(node.attr)
+            elif isinstance(node.arg, nodes.Const):
+                names.add(node.arg.value)
+            else:
+                return None
+            references += 1
+    cookiecutter = [node for node in ast.find_all(nodes.Name) if node.name == 'cookiecutter']
+    if len(cookiecutter) != references:
+        return None
+    return names
+
+
+def tree_signature(files):
+    """Compute a signature of the (relative path, mtime, size) of the files of a template tree.
+
+    :param list files: list of (relative path, source file) tuples, as produced by
+        :py:meth:`TemplateTree.walk`.
+    """
+    signature = hashlib.sha1()
+    for relpath, source in files:
+        st = source.stat()
+        signature.update(f"{relpath}\0{st.st_mtime_ns}\0{st.st_size}\0".encode('utf-8'))
+    return signature.hexdigest()
+
+
+class TemplateCache:
+    """Persistent, content-addressed cache of compiled templates.
+
+    Each entry holds the compiled Jinja code of all files of a template tree and
+    the list of its template output paths. Entries are keyed on the hash of the
+    template tree's contents and the micc version (and the Python and Jinja
+    versions, as these determine the compiled code).
+
+    To avoid hashing the contents of a template on every use, the tree hash is
+    stored in an index file together with the (path, mtime, size) signature of
+    the template's files. The tree is only rehashed when the signature changes.
+
+    The cache is kept below *size_limit* bytes by evicting the least recently
+    used entries.
+
+    :param Path directory: location of the cache, by default :file:`~/.et_micc/cache`.
+    :param int size_limit: maximum size of the cache in bytes.
+    """
+    def __init__(self, directory=None, size_limit=CACHE_SIZE_LIMIT):
+        if directory is None:
+            directory = Path.home() / '.et_micc' / 'cache'
+        self.directory = Path(directory)
+        self.size_limit = size_limit
+        self.version_tag = (f"{__version__}-f{CACHE_FORMAT}-py{sys.version_info[0]}{sys.version_info[1]}"
+                            f"-{importlib.util.MAGIC_NUMBER.hex()}-jinja{jinja2.__version__}")
+
+    def tree_hash(self, root, files):
+        """Compute the hash of a template tree, reusing the stored one if the tree did not change.
+
+        :param Path root: the ``{{cookiecutter.project_name}}`` directory of the template.
+        :param list files: list of (relative path, source file) tuples, as produced by
+            :py:meth:`TemplateTree.walk`.
+        """
+        signature = tree_signature(files)
+
+        index = self.directory / f"index-{hashlib.sha1(str(root).encode('utf-8')).hexdigest()}.json"
+        try:
+            with index.open() as f:
+                stored = json.load(f)
+            if stored['signature'] == signature:
+                return stored['tree_hash']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        tree_hash = hashlib.sha256()
+        for relpath, source in files:
+            tree_hash.update(relpath.encode('utf-8') + b'\0')
+            tree_hash.update(source.read_bytes() + b'\0')
+        tree_hash = tree_hash.hexdigest()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        write_atomically(index, json.dumps({'signature': signature, 'tree_hash': tree_hash}).encode('utf-8'))
+        return tree_hash
+
+    def entry_path(self, tree_hash):
+        """Path of the cache entry for the template tree with hash *tree_hash*."""
+        return self.directory / f"{tree_hash}-{self.version_tag}.marshal"
+
+    def load(self, tree_hash):
+        """Load a cache entry.
+
+        :returns: the cached entry, or None if there is no (valid) entry.
+        """
+        path = self.entry_path(tree_hash)
+        try:
+            with path.open('rb') as f:
+                entry = marshal.load(f)
+            # mark as recently used:
+            os.utime(str(path))
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return entry
+
+    def store(self, tree_hash, entry):
+        """Store a cache entry, and evict least recently used entries if the cache is too big."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.entry_path(tree_hash)
+        write_atomically(path, marshal.dumps(entry))
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Remove the least recently used entries until the cache is below its size limit.
+
+        :param Path keep: an entry that must not be removed.
+        """
+        entries = []
+        for path in self.directory.glob('*.marshal'):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.size_limit:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+
+class TemplateTree:
+    """A *Cookiecutter* template whose Jinja sources are compiled once.
+
+    :param Path template: path to the template directory, i.e. the directory
+        containing the ``{{cookiecutter.project_name}}`` directory (and,
+        optionally, a ``hooks`` directory).
+    :param TemplateCache cache: persistent cache for the compiled template. If
+        None, the template is compiled without caching.
+    """
+    def __init__(self, template, cache=None):
+        self.template = Path(template)
+        self.name = self.template.name
+        self.env = StrictEnvironment(keep_trailing_newline=True)
+        for key in [key for key, ext in self.env.extensions.items() if 'now' in ext.tags]:
+            del self.env.extensions[key]
+        self.env.add_extension(NowExtension)
+        self.root = Path(find_template(str(self.template)))
+
+        files = self.walk()
+        self.signature = tree_signature(files)
+        entry = None
+        if cache is not None:
+            tree_hash = cache.tree_hash(self.root, files)
+            entry = cache.load(tree_hash)
+        if entry is None:
+            entry = self.compile(files)
+            if cache is not None:
+                cache.store(tree_hash, entry)
+
+        # names of the parameters that affect the output paths, or None if unknown
+        # (in which case all parameters are assumed to affect the output paths).
+        self.path_parameters = entry['path_parameters']
+        self._manifests = {}
+
+        # list of (unrendered relative path, compiled path template, compiled content
+        # template or None for static files, source file, hash of static files,
+        # True for text files)
+        self.files = []
+        for relpath, path_code, content_code, static_hash, text in entry['files']:
+            self.files.append(( relpath
+                              , self.from_code(path_code)
+                              , None if content_code is None else self.from_code(content_code)
+                              , self.root.parent / relpath
+                              , static_hash
+                              , text
+                             ))
+
+    def walk(self):
+        """List the files of the template.
+
+        :returns: list of (relative path, source file) tuples. The relative path
+            is relative to the template directory, and thus starts with
+            ``{{cookiecutter.project_name}}``.
+        """
+        files = []
+        for dirpath, dirnames, filenames in os.walk(str(self.root)):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename == '.DS_Store':
+                    continue
+                source = Path(dirpath) / filename
+                relpath = os.path.join(self.root.name, os.path.relpath(str(source), str(self.root)))
+                files.append((relpath, source))
+        return files
+
+    def compile(self, files):
+        """Compile the file names and file contents of the template.
+
+        Files are classified as *static* if they are binary, or text without Jinja
+        markup and without carriage returns (so that rendering them would reproduce
+        the source exactly). For static files only the hash of the content is
+        stored, instead of compiled code.
+
+        :param list files: list of (relative path, source file) tuples.
+        :returns: a (marshallable) dict with the compiled code.
+        """
+        compiled = []
+        path_parameters = set()
+        for relpath, source in files:
+            if path_parameters is not None:
+                names = referenced_parameters(self.env, relpath)
+                path_parameters = None if names is None else path_parameters | names
+            path_code = self.env.compile(relpath, relpath)
+            data = source.read_bytes()
+            binary = is_binary(str(source))
+            text = None if binary else data.decode('utf-8')
+            if binary or not ('\r' in text or any(markup in text for markup in JINJA_MARKUP)):
+                content_code = None
+                static_hash = hashlib.sha256(data).hexdigest()
+            else:
+                # universal newlines, as in Path.read_text()
+                text = text.replace('\r\n', '\n').replace('\r', '\n')
+                content_code = self.env.compile(text, relpath, str(source))
+                static_hash = None
+            compiled.append((relpath, path_code, content_code, static_hash, not binary))
+        return { 'files': compiled
+               , 'path_parameters': None if path_parameters is None else sorted(path_parameters)
+               }
+
+    def from_code(self, code):
+        """Create a Jinja template from compiled code."""
+        return self.env.template_class.from_code(self.env, code, self.env.make_globals(None))
+
+    def render_root(self, parameters):
+        """Render the name of the template's root directory (i.e. the project directory name)."""
+        return self.env.from_string(self.root.name).render(cookiecutter=parameters)
+
+    def manifest(self, parameters):
+        """The output paths of the template, without rendering the file contents.
+
+        Manifests are memoized, keyed by the values of the parameters that affect
+        the output paths (:py:attr:`path_parameters`).
+
+        :param dict parameters: rendered template parameters
+            (see :py:func:`render_parameters`).
+        :returns: a tuple with, for each file of the template, its output path relative
+            to the output directory, or None if the file is not output.
+        :raises: UndefinedError if a file name uses an undefined parameter.
+        """
+        if self.path_parameters is None:
+            key = repr(sorted(parameters.items()))
+        else:
+            key = tuple(repr(parameters.get(name)) for name in self.path_parameters)
+        manifest = self._manifests.get(key)
+        if manifest is None:
+            context = {'cookiecutter': parameters}
+            manifest = []
+            for relpath, path_template, *_ in self.files:
+                try:
+                    path = path_template.render(**context)
+                except UndefinedError as e:
+                    raise UndefinedError(f"Unable to render '{relpath}' in template {self.name}: {e}")
+                # If the rendered file name is empty, the file is skipped (as cookiecutter does).
+                manifest.append(os.path.normpath(path) if os.path.basename(path) else None)
+            manifest = tuple(manifest)
+            self._manifests[key] = manifest
+        return manifest
+
+    def render(self, parameters, now=None):
+        """Render the template in memory.
+
+        :param dict parameters: rendered template parameters
+            (see :py:func:`render_parameters`).
+        :param str now: ISO 8601 time at which ``{% now %}`` tags are rendered (see
+            :py:class:`NowExtension`), by default the current time.
+        :returns: an OrderedDict mapping output paths, relative to the output
+            directory, to :py:class:`RenderedFile` objects.
+        :raises: UndefinedError if the template uses an undefined parameter.
+        """
+        context = {'cookiecutter': parameters, NOW_VARIABLE: now}
+        file_set = OrderedDict()
+        for path, (relpath, _, content_template, source, static_hash, text) in zip(self.manifest(parameters), self.files):
+            if path is None:
+                continue
+            if content_template is None:
+                if text and os.linesep != '\n':
+                    # text files are written with platform specific line endings
+                    file_set[path] = RenderedFile(source, source.read_text(encoding='utf-8'))
+                else:
+                    file_set[path] = StaticFile(source, static_hash)
+                continue
+            try:
+                content = content_template.render(**context)
+            except UndefinedError as e:
+                raise UndefinedError(f"Unable to render '{relpath}' in template {self.name}: {e}")
+            file_set[path] = RenderedFile(source, content)
+        return file_set
+
+
+_trees = {}
+
+def get_template_tree(template, cache=None):
+    """Get the :py:class:`TemplateTree` of a template, reusing the one created previously
+    if the template did not change.
+
+    This matters for long running micc processes (see :py:mod:`et_micc.server`), which
+    expand the same templates over and over again. The template is considered unchanged
+    if the relative paths, modification times and sizes of its files did not change
+    (see :py:func:`tree_signature`).
+
+    :param Path template: path to the template directory.
+    :param TemplateCache cache: persistent cache for the compiled template.
+    """
+    key = str(template)
+    tree = _trees.get(key)
+    if tree is not None:
+        try:
+            if tree_signature(tree.walk()) == tree.signature:
+                return tree
+        except FileNotFoundError:
+            pass
+    tree = TemplateTree(template, cache)
+    _trees[key] = tree
+    return tree
+
+#eof
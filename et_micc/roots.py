@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.roots
+====================
+
+Discovery of project directories.
+
+A project directory has a :file:`pyproject.toml` file exposing the project name
+(``['tool']['poetry']['name']``), and a Python module or package named after the
+directory (see :py:func:`et_micc.utils.is_project_directory`). Finding the project
+directory that contains a given directory means testing that directory and all
+its parents. This module keeps that cheap:
+
+* a directory without a :file:`pyproject.toml` file is rejected with a single
+  ``stat`` call, the file is not opened,
+* the project name found in a :file:`pyproject.toml` file is memoized in a
+  :py:class:`RootIndex`, in the process and on disk, keyed by the inode,
+  modification time and size of the file. The file is parsed only if it is new,
+  or modified since.
+
+The index also remembers the project directories created by micc, so that the
+test whether a new project would be nested inside another one can start with
+the known project directories (see :py:func:`find_enclosing_project`).
+"""
+
+import os
+import json
+from pathlib import Path
+
+from et_micc.tomlfile import read_toml
+import et_micc.utils
+
+MARKER = 'pyproject.toml'
+"""The file that marks a candidate project directory."""
+
+INDEX_SIZE = 256
+"""Maximum number of directories remembered by the on-disk :py:class:`RootIndex`."""
+
+
+class RootIndex:
+    """Memo of the project names found in :file:`pyproject.toml` files.
+
+    Entries map a directory to the signature ``[st_ino, st_mtime_ns, st_size]`` of
+    its :file:`pyproject.toml` file and the project name found in it (None if the
+    file has no project name). An entry is only used if the signature still
+    matches the file. The least recently added entries are dropped when there
+    are more than :py:const:`INDEX_SIZE`.
+
+    :param Path path: location of the on-disk index, by default
+        :file:`~/.et_micc/cache/project-roots.json`.
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = Path.home() / '.et_micc' / 'cache' / 'project-roots.json'
+        self.path = Path(path)
+        self._entries = None
+
+    @property
+    def entries(self):
+        """The entries of the index, read from disk on first use."""
+        if self._entries is None:
+            try:
+                with self.path.open() as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def project_name(self, directory):
+        """The project name in :file:`pyproject.toml` in *directory*.
+
+        :param str directory: absolute path of a directory.
+        :returns: the project name, or None if the directory has no
+            :file:`pyproject.toml` file, or if it has no project name.
+        """
+        try:
+            st = os.stat(os.path.join(directory, MARKER))
+        except OSError:
+            return None
+        signature = [st.st_ino, st.st_mtime_ns, st.st_size]
+        entry = self.entries.get(directory)
+        if entry is not None and entry[:3] == signature:
+            return entry[3]
+
+        try:
+            name = str(read_toml(os.path.join(directory, MARKER))['tool']['poetry']['name'])
+        except Exception:
+            name = None
+        self.remember(directory, signature, name)
+        return name
+
+    def register(self, directory, name):
+        """Add a project directory, e.g. one that was just created, to the index.
+
+        :param str|Path directory: path of the project directory.
+        :param str name: the project name in its :file:`pyproject.toml` file.
+        """
+        directory = os.path.realpath(str(directory))
+        try:
+            st = os.stat(os.path.join(directory, MARKER))
+        except OSError:
+            return
+        self.remember(directory, [st.st_ino, st.st_mtime_ns, st.st_size], name)
+
+    def remember(self, directory, signature, name):
+        """Add an entry to the index, and save the index.
+
+        :param str directory: absolute path of a directory.
+        :param list signature: ``[st_ino, st_mtime_ns, st_size]`` of its :file:`pyproject.toml` file.
+        :param str name: the project name found in the file, or None.
+        """
+        entries = self.entries
+        entries.pop(directory, None)
+        entries[directory] = signature + [name]
+        while len(entries) > INDEX_SIZE:
+            del entries[next(iter(entries))]
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            et_micc.utils.write_atomically(self.path, json.dumps(entries).encode('utf-8'))
+        except OSError:
+            pass # the index is only a cache.
+
+
+_index = None
+
+
+def get_index():
+    """The :py:class:`RootIndex` of the current user."""
+    global _index
+    if _index is None:
+        _index = RootIndex()
+    return _index
+
+
+def is_project_root(directory, index=None):
+    """Test if *directory* is a project directory, without parsing its
+    :file:`pyproject.toml` file if it was seen before.
+
+    :param str|Path directory: path to a directory.
+    :param RootIndex index: the index to use, by default :py:func:`get_index`.
+    :returns: bool.
+    """
+    if index is None:
+        index = get_index()
+    directory = os.path.abspath(str(directory))
+    if index.project_name(directory) is None:
+        return False
+    return et_micc.utils.verify_project_structure(Path(directory))
+
+
+def find_project_root(path, index=None):
+    """Find the nearest project directory containing *path*.
+
+    The file system root itself is not considered.
+
+    :param str|Path path: path to a directory.
+    :param RootIndex index: the index to use, by default :py:func:`get_index`.
+    :returns: the path of the project directory, or None if *path* is not inside
+        a project directory.
+    """
+    directory = os.path.realpath(str(path))
+    while True:
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        if is_project_root(directory, index):
+            return Path(directory)
+        directory = parent
+
+
+def find_enclosing_project(path, index=None):
+    """Find a project directory containing *path*, if any.
+
+    The project directories in the index that contain *path* are verified first,
+    nearest first. Only if none of them is still a project directory, the parents
+    of *path* are tested (see :py:func:`find_project_root`). Hence, the returned
+    project directory is not necessarily the nearest one.
+
+    :param str|Path path: path to a directory.
+    :param RootIndex index: the index to use, by default :py:func:`get_index`.
+    :returns: the path of a project directory, or None if *path* is not inside
+        a project directory.
+    """
+    if index is None:
+        index = get_index()
+    path = os.path.realpath(str(path))
+    known = [directory for directory, entry in index.entries.items()
+             if entry[3] is not None and os.path.dirname(directory) != directory
+                and (path == directory or path.startswith(directory + os.sep))
+            ]
+    for directory in sorted(known, key=len, reverse=True):
+        if is_project_root(directory, index):
+            return Path(directory)
+    return find_project_root(path, index)
+
+#eof
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.server
+=====================
+
+A resident micc process, that executes micc commands sent by a client
+(see :py:mod:`et_micc.client`) over a Unix domain socket.
+
+The server avoids the cost of starting a Python interpreter, importing micc and its
+dependencies, and loading the preferences and templates for every micc command.
+State that is kept between commands is validated against the modification times of
+the files it was loaded from (see :py:func:`et_micc.expand.load_json` and
+:py:func:`et_micc.render.get_template_tree`).
+
+Protocol
+--------
+The client sends a single line with a json object ``{"argv": [...], "cwd": "..."}``:
+the arguments of the micc command, and the working directory to execute it in. The
+server executes the command, and streams the output back as lines with json objects
+``{"stdout": "..."}`` and ``{"stderr": "..."}``, followed by ``{"exit": <exit code>}``.
+
+Commands are executed one at a time, in the environment of the server. Commands
+that read from the standard input (such as ``micc setup``) get an empty input.
+"""
+
+import os
+import io
+import sys
+import json
+import socket
+import traceback
+import socketserver
+from pathlib import Path
+
+import click
+
+import et_micc.logger
+
+DEFAULT_SOCKET = Path.home() / '.et_micc' / 'micc.sock'
+"""The default location of the server socket. It can be overridden with the
+environment variable ``MICC_SOCKET``."""
+
+
+def socket_path(path=None):
+    """The location of the server socket.
+
+    :param str|Path path: explicit location. If None, the environment variable
+        ``MICC_SOCKET`` or :py:const:`DEFAULT_SOCKET` is used.
+    """
+    if path is None:
+        path = os.environ.get('MICC_SOCKET', str(DEFAULT_SOCKET))
+    return Path(path)
+
+
+class FrameWriter(io.RawIOBase):
+    """A binary stream that sends everything written to it to the client, as a
+    ``{"<name>": "<text>"}`` frame.
+
+    :param socket.socket connection: connection to the client.
+    :param str name: 'stdout' or 'stderr'.
+    """
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        frame = json.dumps({self.name: data.decode('utf-8', errors='replace')}) + '\n'
+        try:
+            self.connection.sendall(frame.encode('utf-8'))
+        except OSError:
+            pass # the client went away, the command runs to completion anyway.
+        return len(data)
+
+
+def command_name(argv):
+    """Find the name of the micc (sub)command in the arguments of a micc command."""
+    args = iter(argv)
+    for arg in args:
+        if arg in ('-p', '--project-path'):
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg
+    return None
+
+
+def run_micc(argv, stdout, stderr):
+    """Run a micc command in this process, with its output redirected.
+
+    The command gets an empty standard input. Its loggers are closed afterwards,
+    so that no log files are kept open between commands.
+
+    :param list argv: the arguments of the micc command.
+    :param stdout: text stream for the standard output of the command.
+    :param stderr: text stream for the standard error of the command.
+    :returns: the exit code of the command.
+    """
+    from et_micc.cli_micc import main
+
+    saved = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(''), stdout, stderr
+    try:
+        try:
+            rv = main.main(args=argv, prog_name='micc', standalone_mode=False)
+            exit_code = rv if isinstance(rv, int) else 0
+        except click.ClickException as e:
+            e.show()
+            exit_code = e.exit_code
+        except click.Abort:
+            click.echo("Aborted!", err=True)
+            exit_code = 1
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved
+        et_micc.logger.close_loggers()
+    return exit_code
+
+
+def run_command(argv, connection):
+    """Run a micc command, with its output sent to *connection*.
+
+    :param list argv: the arguments of the micc command.
+    :param socket.socket connection: connection to the client.
+    :returns: the exit code of the command.
+    """
+    def text_stream(name):
+        return io.TextIOWrapper(FrameWriter(connection, name), encoding='utf-8', line_buffering=True, write_through=True)
+
+    return run_micc(argv, text_stream('stdout'), text_stream('stderr'))
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """Execute a single micc command sent by a client."""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            argv = [str(arg) for arg in request['argv']]
+            cwd = request['cwd']
+        except (ValueError, KeyError, TypeError):
+            self.send({'stderr': "Invalid request.\n"})
+            self.send({'exit': 1})
+            return
+
+        if command_name(argv) in ('serve', 'setup'):
+            self.send({'stderr': "The commands 'micc serve' and 'micc setup' cannot be run through the micc server.\n"})
+            self.send({'exit': 1})
+            return
+
+        saved_cwd = os.getcwd()
+        try:
+            os.chdir(cwd)
+            exit_code = run_command(argv, self.connection)
+        except OSError as e:
+            self.send({'stderr': f"{e}\n"})
+            exit_code = 1
+        finally:
+            os.chdir(saved_cwd)
+        self.send({'exit': exit_code})
+
+    def send(self, frame):
+        try:
+            self.wfile.write((json.dumps(frame) + '\n').encode('utf-8'))
+        except OSError:
+            pass
+
+
+def is_running(path):
+    """Test if a server is listening on socket *path*."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(str(path))
+        except OSError:
+            return False
+    return True
+
+
+def serve(path=None, ready=None):
+    """Run a micc server until it is interrupted.
+
+    Commands are executed one at a time, as they change the working directory and
+    the standard streams of the process.
+
+    As clients can run any micc command as the owner of the server, the socket is
+    only accessible by the owner (mode 0o600), and its directory must be private
+    (mode 0o700). The default directory (:file:`~/.et_micc`) is made private if needed.
+
+    :param str|Path path: location of the socket (see :py:func:`socket_path`).
+    :param callable ready: called without arguments when the server accepts connections.
+    :returns: 0 on a normal shut down, 1 if another server is using the socket, or
+        if the socket is not private.
+    """
+    path = socket_path(path)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    st = path.parent.stat()
+    if st.st_uid == os.getuid() and st.st_mode & 0o077 and path.parent == DEFAULT_SOCKET.parent:
+        path.parent.chmod(0o700)
+        st = path.parent.stat()
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        click.secho(f"[ERROR]\nThe directory of the socket, {path.parent}, must be owned by you,\n"
+                    f"and not be accessible by other users (mode 0o700).", fg='bright_red')
+        return 1
+    if os.path.lexists(str(path)):
+        if path.lstat().st_uid != os.getuid():
+            click.secho(f"[ERROR]\nThe socket {path} is owned by another user.", fg='bright_red')
+            return 1
+        if is_running(path):
+            click.secho(f"[ERROR]\nA micc server is already listening on {path}.", fg='bright_red')
+            return 1
+        path.unlink() # stale socket of a server that was killed.
+
+    server = socketserver.UnixStreamServer(str(path), CommandHandler)
+    # Only the owner may connect, as clients can run any micc command as the owner.
+    os.chmod(str(path), 0o600)
+    try:
+        if ready is not None:
+            ready()
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+    return 0
+
+#eof
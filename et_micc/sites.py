@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.sites
+====================
+
+The *version sites* of a project: the places in its files that hold the version
+of the project, besides :file:`pyproject.toml`.
+
+* ``__version__ = "x.y.z"`` in :file:`<package_name>.py`,
+  :file:`<package_name>/__init__.py` and :file:`<package_name>/__version__.py`,
+* ``version = "x.y.z"`` and ``release = "x.y.z"`` in :file:`docs/conf.py`,
+* ``project(... VERSION x.y.z ...)`` in :file:`CMakeLists.txt`, and in the
+  :file:`CMakeLists.txt` files of the binary extensions (:file:`<package_name>/*/CMakeLists.txt`),
+* the heading of the entry of the current version in :file:`HISTORY.rst`.
+
+The sites are found by a single scan of these files (Python files are tokenized),
+which records the byte offset and length of every occurrence of the current
+version. Only occurrences that equal the current version are sites. The sites
+are stored in the project's snapshot (see :py:mod:`et_micc.state`), so that they
+are not searched again as long as none of these files changed.
+
+:py:func:`rewrite` patches all sites with a new version. A new version does not
+replace the heading in :file:`HISTORY.rst`, but gets a new entry above it.
+"""
+
+import io
+import re
+import ast
+import time
+import tokenize
+from pathlib import Path
+
+import et_micc.utils
+
+PYTHON_NAMES = {'__version__'}
+"""Names of the variables holding the version in the package."""
+
+DOCS_NAMES = {'version', 'release'}
+"""Names of the variables holding the version in :file:`docs/conf.py`."""
+
+_CMAKE_PROJECT = re.compile(rb"\bproject\s*\(([^)]*)\)", re.IGNORECASE)
+_CMAKE_VERSION = re.compile(rb"\bVERSION\s+([0-9][0-9A-Za-z.+-]*)")
+_RST_UNDERLINE = re.compile(rb"([=\-~^*#+`'\"])\1*[ \t]*\r?\n?")
+
+
+def sources(package_name, project_path):
+    """The files that may contain version sites, relative to the project directory.
+
+    The package directory itself is included, as adding a binary extension adds
+    a :file:`CMakeLists.txt` file to it.
+
+    :param str package_name: the package name of the project.
+    :param Path project_path: the project directory.
+    :returns: list of paths relative to the project directory.
+    """
+    package = Path(package_name)
+    paths = [Path(f'{package_name}.py')
+            , package / '__init__.py'
+            , package / '__version__.py'
+            , Path('docs') / 'conf.py'
+            , Path('CMakeLists.txt')
+            , Path('HISTORY.rst')
+            , package
+            ]
+    try:
+        for entry in sorted((Path(project_path) / package).iterdir()):
+            if (entry / 'CMakeLists.txt').is_file():
+                paths.append(package / entry.name / 'CMakeLists.txt')
+    except OSError:
+        pass
+    return paths
+
+
+def _site(path, kind, offset, length):
+    return {'path': str(path), 'kind': kind, 'offset': offset, 'length': length}
+
+
+def scan_python(data, names, version):
+    """Find the assignments of the string *version* to one of *names* at the
+    start of a statement, e.g. ``__version__ = "1.2.3"``.
+
+    :param bytes data: the content of a Python file.
+    :param set names: the variable names.
+    :param str version: the version.
+    :returns: list of (offset, length) of the version strings, without the quotes.
+    """
+    lines = data.splitlines(keepends=True)
+    starts = [0]
+    for line in lines:
+        starts.append(starts[-1] + len(line))
+    found = []
+    try:
+        tokens = [token for token in tokenize.tokenize(io.BytesIO(data).readline)
+                  if token.type not in (tokenize.COMMENT, tokenize.NL)]
+    except (tokenize.TokenError, SyntaxError):
+        return found
+    encoding = tokens[0].string if tokens and tokens[0].type == tokenize.ENCODING else 'utf-8'
+    statement_start = (tokenize.ENCODING, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT)
+    for i in range(1, len(tokens) - 3):
+        name, op, string, end = tokens[i:i + 4]
+        if not (name.type == tokenize.NAME and name.string in names and tokens[i - 1].type in statement_start
+                and op.type == tokenize.OP and op.string == '='
+                and string.type == tokenize.STRING
+                and end.type in (tokenize.NEWLINE, tokenize.ENDMARKER)):
+            continue
+        body = string.string.lstrip('rRbBuUfF')
+        quote = body[:3] if body[:3] in ('"""', "'''") else body[:1]
+        try:
+            value = ast.literal_eval(string.string)
+        except (ValueError, SyntaxError):
+            continue
+        if value != version or body[len(quote):len(body) - len(quote)] != version:
+            continue
+        row, col = string.start
+        line = lines[row - 1].decode(encoding)
+        offset = starts[row - 1] + len(line[:col].encode(encoding)) \
+               + len(string.string) - len(body) + len(quote)
+        found.append((offset, len(version.encode(encoding))))
+    return found
+
+
+def scan_cmake(data, version):
+    """Find the ``VERSION`` arguments of the ``project()`` commands that equal *version*.
+
+    :param bytes data: the content of a :file:`CMakeLists.txt` file.
+    :param str version: the version.
+    :returns: list of (offset, length).
+    """
+    found = []
+    for project in _CMAKE_PROJECT.finditer(data):
+        for match in _CMAKE_VERSION.finditer(data, project.start(1), project.end(1)):
+            if match.group(1) == version.encode('ascii'):
+                found.append((match.start(1), match.end(1) - match.start(1)))
+    return found
+
+
+def scan_history(data, version):
+    """Find the section heading of *version* in :file:`HISTORY.rst`, e.g.
+    ``v1.2.3 (2020-01-01)``, underlined.
+
+    :param bytes data: the content of :file:`HISTORY.rst`.
+    :param str version: the version.
+    :returns: list of (offset, length) of the heading line, without the line end.
+    """
+    heading = re.compile(rb"^v?" + re.escape(version.encode('ascii')) + rb"(?![0-9A-Za-z.+-])[^\r\n]*", re.MULTILINE)
+    for match in heading.finditer(data):
+        following = data[match.end():].lstrip(b'\r\n')
+        if following[:1] and following.startswith(following[:1] * 3) and _RST_UNDERLINE.match(following):
+            return [(match.start(), match.end() - match.start())]
+    return []
+
+
+def scan(project_path, package_name, version, paths=None):
+    """Find the version sites of a project.
+
+    :param Path project_path: the project directory.
+    :param str package_name: the package name of the project.
+    :param str version: the current version of the project.
+    :param list paths: the files to scan, by default :py:func:`sources`.
+    :returns: list of sites: dicts with the ``path`` of the file relative to the
+        project directory, the ``kind`` of site (``'python'``, ``'cmake'`` or
+        ``'history'``), and the byte ``offset`` and ``length`` of the version (or
+        of the heading in :file:`HISTORY.rst`).
+    """
+    project_path = Path(project_path)
+    if paths is None:
+        paths = sources(package_name, project_path)
+    sites = []
+    for path in paths:
+        path = Path(path)
+        try:
+            data = (project_path / path).read_bytes()
+        except OSError: # missing, or a directory
+            continue
+        if path.name == 'CMakeLists.txt':
+            found, kind = scan_cmake(data, version), 'cmake'
+        elif path.name == 'HISTORY.rst':
+            found, kind = scan_history(data, version), 'history'
+        elif path.parts[0] == 'docs':
+            found, kind = scan_python(data, DOCS_NAMES, version), 'python'
+        else:
+            found, kind = scan_python(data, PYTHON_NAMES, version), 'python'
+        sites.extend(_site(path, kind, offset, length) for offset, length in found)
+    return sites
+
+
+def rewrite(project_path, sites, current, new):
+    """Patch the version sites of a project with a new version.
+
+    All files are patched in memory first, and verified to still contain the
+    current version at every site. Only then the files are replaced, each one
+    atomically (see :py:func:`et_micc.utils.write_atomically`).
+
+    :param Path project_path: the project directory.
+    :param list sites: the sites, as returned by :py:func:`scan`.
+    :param str current: the current version.
+    :param str new: the new version.
+    :returns: list of the paths of the files that were modified.
+    :raises: ValueError if a site does not contain the current version (the
+        sites are stale), in which case no file is modified.
+    """
+    project_path = Path(project_path)
+    by_path = {}
+    for site in sites:
+        by_path.setdefault(site['path'], []).append(site)
+    current_b, new_b = current.encode('utf-8'), new.encode('utf-8')
+    patched = {}
+    for path, file_sites in by_path.items():
+        data = (project_path / path).read_bytes()
+        for site in sorted(file_sites, key=lambda site: site['offset'], reverse=True):
+            start, end = site['offset'], site['offset'] + site['length']
+            if site['kind'] == 'history':
+                if current == new:
+                    continue
+                heading = data[start:end]
+                if not heading.lstrip(b'v').startswith(current_b):
+                    raise ValueError(f"Stale version site in {path} at offset {start}.")
+                newline = b'\r\n' if data[end:end + 2] == b'\r\n' else b'\n'
+                underline = _RST_UNDERLINE.match(data[end:].lstrip(b'\r\n')).group(0).rstrip(b'\r\n \t')
+                title = f"v{new} ({time.strftime('%Y-%m-%d')})".encode('utf-8')
+                if len(underline) < len(title):
+                    underline = underline[:1] * len(title)
+                data = data[:start] + title + newline + underline + newline + newline + data[start:]
+            else:
+                if data[start:end] != current_b:
+                    raise ValueError(f"Stale version site in {path} at offset {start}.")
+                data = data[:start] + new_b + data[end:]
+        patched[path] = data
+    for path, data in patched.items():
+        et_micc.utils.write_atomically(project_path / path, data)
+    return list(patched)
+
+#eof
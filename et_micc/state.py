@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.state
+====================
+
+A snapshot of facts derived from the files of a project, in :file:`.micc/state`.
+
+Every micc command needs some facts about the project, such as its name, version
+and structure, which are derived from :file:`pyproject.toml`, :file:`db.json` and
+the presence of files. The snapshot stores these facts together with the
+signatures (inode, modification time and size) of the files and directories they
+were derived from. As long as none of these changed, the facts are loaded from the
+snapshot, which is a single file read.
+
+The facts are stored in named entries, which are validated independently, e.g.
+``'project'`` (see :py:class:`et_micc.project.Project`) and ``'contents'`` (see
+:py:meth:`et_micc.project.Project.info_cmd`).
+
+Signatures are taken *before* the facts are derived, so that a modification while
+the facts are derived invalidates the entry. Files that were modified shortly
+before the entry was stored are not trusted, as file systems with a coarse
+timestamp resolution may not reflect a subsequent modification in the signature.
+"""
+
+import os
+import json
+import time
+from pathlib import Path
+
+import et_micc.utils
+from et_micc import __version__
+
+STATE_FILE = Path('.micc') / 'state'
+"""Location of the snapshot, relative to the project directory."""
+
+STATE_FORMAT = 1
+"""Version of the layout of the snapshot."""
+
+TIMESTAMP_RESOLUTION_NS = 2 * 10**9
+"""Files modified less than this (in ns) before an entry was stored invalidate the entry."""
+
+
+def signature(path):
+    """The signature ``[st_ino, st_mtime_ns, st_size]`` of a file or directory, or
+    None if it does not exist."""
+    try:
+        st = os.stat(str(path))
+    except OSError:
+        return None
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+
+class ProjectState:
+    """The snapshot of a project, read on construction.
+
+    :param Path project_path: the project directory.
+    """
+    def __init__(self, project_path):
+        self.project_path = Path(project_path)
+        self.path = self.project_path / STATE_FILE
+        try:
+            with self.path.open() as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if state.get('format') == STATE_FORMAT and state.get('micc') == __version__:
+            self.entries = state['entries']
+        else:
+            self.entries = {}
+
+    def signatures(self, paths):
+        """Take the signatures of the files or directories *paths*.
+
+        :param list paths: paths relative to the project directory (``'.'`` is the
+            project directory itself).
+        :returns: dict mapping the paths to their signatures, to be passed to :py:meth:`put`.
+        """
+        return {str(path): signature(self.project_path / path) for path in paths}
+
+    def get(self, name):
+        """The facts of entry *name*, or None if there is no valid entry."""
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        stored = entry['stored']
+        for path, sig in entry['sources'].items():
+            if signature(self.project_path / path) != sig:
+                return None
+            if sig is not None and sig[1] + TIMESTAMP_RESOLUTION_NS > stored:
+                return None
+        return entry['facts']
+
+    def put(self, name, facts, sources):
+        """Store entry *name*, and write the snapshot.
+
+        :param dict facts: json serializable facts.
+        :param dict sources: the signatures of the sources of *facts*, taken with
+            :py:meth:`signatures` before the facts were derived.
+        """
+        self.entries[name] = {'facts': facts, 'sources': sources, 'stored': int(time.time() * 10**9)}
+        state = {'format': STATE_FORMAT, 'micc': __version__, 'entries': self.entries}
+        try:
+            self.path.parent.mkdir(exist_ok=True)
+            et_micc.utils.write_atomically(self.path, json.dumps(state).encode('utf-8'))
+        except OSError:
+            pass # the snapshot is only a cache.
+
+#eof
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.sync
+===================
+
+Keep track of the files generated from templates, and re-apply updated templates.
+
+Every template expansion in a project is recorded in :file:`micc-templates.json`
+in the project directory (alongside :file:`micc.json`): the templates expanded,
+the template parameters used, and the sha256 hash of every file written. This
+allows :py:func:`sync_templates` to re-render the templates of a project with the
+current version of *micc*, and to decide for every file whether it can be updated
+safely:
+
+* *pristine* files (unchanged since they were generated) whose template output
+  changed are rewritten,
+* files that are new in the template are created,
+* *drifted* files (modified since they were generated) are reported, and left
+  untouched.
+
+Files that are not affected by a template change are not touched at all.
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+
+import et_micc.utils
+
+RECORD_FILE = 'micc-templates.json'
+"""Name of the file recording the template expansions of a project."""
+
+
+def file_hash(path):
+    """Compute the sha256 hash of a file, or None if the file does not exist.
+
+    :param Path path: the file.
+    """
+    try:
+        with open(str(path), 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+class TemplateRecord:
+    """The record of template expansions in a project.
+
+    The record is a json file with two entries:
+
+    * ``expansions``: a list of ``{'templates': [...], 'parameters': {...}, 'now': time}``
+      items, one for every call to :py:func:`et_micc.expand.expand_templates`. ``now``
+      is the ISO 8601 time at which the ``{% now %}`` tags were rendered.
+    * ``files``: maps the path of every generated file (relative to the project
+      directory) to ``{'expansion': i, 'output': path, 'hash': sha256}``, where
+      ``i`` is the index of the expansion that generated the file, and ``output``
+      the path as generated by the template (the file may have been moved since,
+      see :py:meth:`rename`). The hash is None for files removed by a hook.
+
+    :param Path project_path: the project directory.
+    """
+    def __init__(self, project_path):
+        self.path = Path(project_path) / RECORD_FILE
+        try:
+            with self.path.open() as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            record = {}
+        self.expansions = record.get('expansions', [])
+        self.files = record.get('files', {})
+
+    def __bool__(self):
+        return bool(self.expansions)
+
+    def add_expansion(self, templates, parameters, now=None):
+        """Add an expansion to the record.
+
+        :param list templates: the templates expanded (names or paths).
+        :param dict parameters: the (unrendered) template parameters.
+        :param str now: ISO 8601 time of the expansion.
+        :returns: the index of the expansion.
+        """
+        self.expansions.append({'templates': [str(template) for template in templates]
+                               ,'parameters': parameters
+                               ,'now': now
+                               })
+        return len(self.expansions) - 1
+
+    def set_file(self, path, expansion, hash, output=None):
+        """Record a generated file.
+
+        :param str path: path of the file, relative to the project directory.
+        :param int expansion: index of the expansion that generated the file.
+        :param str hash: sha256 hash of the file contents as generated, or None if the
+            file was removed by a hook.
+        :param str output: the path as generated by the template, if different from *path*.
+        """
+        self.files[Path(path).as_posix()] = {'expansion': expansion
+                                            ,'output': Path(output if output else path).as_posix()
+                                            ,'hash': hash
+                                            }
+
+    def rename(self, src, dst):
+        """Record that a generated file was moved.
+
+        :param str src: old path of the file, relative to the project directory.
+        :param str dst: new path of the file, relative to the project directory.
+        """
+        entry = self.files.pop(Path(src).as_posix(), None)
+        if entry is not None:
+            self.files[Path(dst).as_posix()] = entry
+
+    def save(self):
+        """Write the record to :file:`micc-templates.json`."""
+        data = json.dumps({'expansions': self.expansions, 'files': self.files}, indent=2)
+        et_micc.utils.write_atomically(self.path, (data + '\n').encode('utf-8'))
+
+
+def record_expansion(project_path, templates, parameters, file_set, output_dir, now=None):
+    """Record an expansion, and the files it generated, in the project's template record.
+
+    Files of *file_set* that do not exist after the expansion (because a
+    post_gen_project hook removed them) are recorded with a hash of None, so that
+    they are not recreated by :py:func:`sync_templates`.
+
+    :param Path project_path: the project directory.
+    :param list templates: the templates expanded (names or paths).
+    :param dict parameters: the (unrendered) template parameters.
+    :param dict file_set: maps output paths (relative to *output_dir*) to
+        :py:class:`et_micc.render.RenderedFile` objects.
+    :param Path output_dir: the output directory of the expansion.
+    :param str now: ISO 8601 time at which the templates were rendered.
+    """
+    record = TemplateRecord(project_path)
+    expansion = record.add_expansion(templates, parameters, now)
+    for path, rendered_file in file_set.items():
+        path = output_dir / path
+        hash = rendered_file.hash if path.exists() else None
+        record.set_file(os.path.relpath(str(path), str(project_path)), expansion, hash)
+    record.save()
+
+
+class SyncReport:
+    """The outcome of :py:func:`sync_templates`.
+
+    Lists of paths relative to the project directory:
+
+    * ``updated``: pristine files rewritten with new template output,
+    * ``added``: files new in the templates,
+    * ``drifted``: files that were modified since they were generated, and for
+      which the template output changed,
+    * ``missing``: generated files that were removed from the project, and for
+      which the template output changed,
+    * ``untracked``: files new in the templates, which already exist in the project.
+    """
+    def __init__(self):
+        self.updated = []
+        self.added = []
+        self.drifted = []
+        self.missing = []
+        self.untracked = []
+
+
+def sync_templates(project_path, dry_run=False, write_new=False):
+    """Re-apply the templates recorded for a project.
+
+    Every recorded expansion is rendered again (in memory), with the current version
+    of its templates and the time of the original expansion (so that e.g. copyright
+    years are not updated), and the rendered files are compared to the recorded hashes. Only
+    pristine files whose template output changed are rewritten, and files that are new
+    in the templates are created. Drifted files are left untouched.
+
+    :param Path project_path: the project directory.
+    :param bool dry_run: only report, do not modify any files.
+    :param bool write_new: write the new template output of drifted files next to
+        them, with a ``.new`` suffix, for merging them manually.
+    :returns: a :py:class:`SyncReport` object, or None if the project has no
+        template record.
+    """
+    import et_micc.render
+    # import here to avoid a circular import
+    from et_micc.expand import resolve_template
+
+    record = TemplateRecord(project_path)
+    if not record:
+        return None
+
+    output_dir = project_path.parent
+    report = SyncReport()
+    cache = et_micc.render.TemplateCache()
+    by_output = {(entry['expansion'], entry['output']): path for path, entry in record.files.items()}
+    modified = False
+
+    for expansion, recorded in enumerate(record.expansions):
+        parameters = et_micc.render.render_parameters(recorded['parameters'])
+        file_set = {}
+        for template in recorded['templates']:
+            tree = et_micc.render.get_template_tree(resolve_template(template), cache)
+            file_set.update(tree.render(parameters, recorded.get('now')))
+
+        for output, rendered_file in file_set.items():
+            output = Path(os.path.relpath(str(output_dir / output), str(project_path))).as_posix()
+            path = by_output.get((expansion, output))
+            new_hash = rendered_file.hash
+            if path is None:
+                if output in record.files:
+                    # generated by a later expansion
+                    continue
+                if (project_path / output).exists():
+                    report.untracked.append(output)
+                    continue
+                report.added.append(output)
+                if not dry_run:
+                    rendered_file.write(project_path / output)
+                    record.set_file(output, expansion, new_hash)
+                    modified = True
+                continue
+
+            entry = record.files[path]
+            if entry['hash'] in (None, new_hash):
+                # removed by a hook, or template output unchanged
+                continue
+            current_hash = file_hash(project_path / path)
+            if current_hash is None:
+                report.missing.append(path)
+            elif current_hash == new_hash:
+                # the file was already updated (e.g. merged manually)
+                if not dry_run:
+                    entry['hash'] = new_hash
+                    modified = True
+            elif current_hash == entry['hash']:
+                report.updated.append(path)
+                if not dry_run:
+                    rendered_file.write(project_path / path)
+                    entry['hash'] = new_hash
+                    modified = True
+            else:
+                report.drifted.append(path)
+                if write_new and not dry_run:
+                    with open(str(project_path / path) + '.new', 'wb') as f:
+                        f.write(rendered_file.data)
+
+    if modified:
+        record.save()
+    return report
+
+#eof
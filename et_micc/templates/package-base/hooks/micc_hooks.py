@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""In-process hooks of the package-base template (see :py:mod:`et_micc.hooks`)."""
+
+from et_micc.hooks import verify_package_name as pre_gen_project
+from et_micc.hooks import remove_license_if_not_open_source as post_gen_project
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""In-process hooks of the package-general template (see :py:mod:`et_micc.hooks`)."""
+
+from et_micc.hooks import verify_package_name as pre_gen_project
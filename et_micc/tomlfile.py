@@ -2,25 +2,68 @@
 """
 Module et_micc.tomlfile
 =======================
+
+Two tiers of access to :file:`.toml` files (:file:`pyproject.toml` in particular):
+
+* :py:func:`read_toml` reads a file into plain Python dicts and lists. It uses the
+  fast parser :py:mod:`tomllib` (Python 3.11+) or ``tomli``, if available.
+* :py:class:`TomlFile` reads a file into a *tomlkit* document, which preserves the
+  formatting and comments of the file when it is modified and written back.
+
+Commands that only read a :file:`.toml` file should use :py:func:`read_toml`.
+*tomlkit* is only imported when a :py:class:`TomlFile` is created.
+
+A :py:class:`TomlFile` is written atomically, and only if its content changed
+semantically (see :py:meth:`TomlFile.save`).
 """
-# This is a copy of poetry/utils/toml_file.py
+# TomlFile is a copy of poetry/utils/toml_file.py
 # It is there to avoid introducing a dependency on poetry in et_micc.
-from tomlkit.toml_file import TOMLFile as BaseTOMLFile
 from typing import Union
 
 # from ._compat import Path
 from pathlib import Path
 
+try:
+    import tomllib as _toml_reader # Python 3.11+
+except ImportError:
+    try:
+        import tomli as _toml_reader
+    except ImportError:
+        _toml_reader = None
+
+
+def _loads(text):
+    """Parse TOML *text* into plain dicts and lists, for comparing contents."""
+    if _toml_reader is not None:
+        return _toml_reader.loads(text)
+    import tomlkit
+    return tomlkit.loads(text).value
+
 
-class TomlFile(BaseTOMLFile):
+def read_toml(path):
+    """Read a :file:`.toml` file for reading only.
+
+    :param str|Path path: path to the .toml file.
+    :returns: the content of the file as plain dicts and lists (or, if neither
+        :py:mod:`tomllib` nor ``tomli`` are available, as a *tomlkit* document).
+    :raises: FileNotFoundError if the file does not exist, ValueError if the file
+        is not valid TOML.
+    """
+    if _toml_reader is not None:
+        with open(str(path), 'rb') as f:
+            return _toml_reader.load(f)
+    return TomlFile(path)._content_
+
+
+class TomlFile:
     """Read/write access to :file:`.toml` files (:file:`pyproject.toml` in particular).
-    
+
     Open a :file:`.toml` file and read its content
-    
+
     The content is accessed by subscripting:
-    
+
     .. code-block:: python
-    
+
        toml = TomlFile('path/to/toml')
        # Read an item from the .toml file's content:
        old_name = toml['tool']['poetry']['name']
@@ -28,14 +71,20 @@ class TomlFile(BaseTOMLFile):
        toml['tool']['poetry']['name'] = 'new_name'
        # Now modify the file with the modified content:
        toml.save()
-        
+       # Or, modify a nested item and mark it as modified:
+       toml.set(('tool', 'poetry', 'version'), '1.0.0')
+
+    The keys of the items modified with :py:meth:`set` or by subscripting the
+    :py:class:`TomlFile` itself are kept in :py:attr:`dirty`.
+
     :param str|Path path: path to the .toml file.
     :raises: FileNotFoundError if the file does not exist.
     """
     def __init__(self, path):  # type: (Union[str, Path]) -> None
-        super(TomlFile, self).__init__(str(path))
-
         self._path_ = Path(path)
+        self._text_ = None
+        # keys (tuples) of the items modified since the file was read or saved.
+        self.dirty = set()
         if self.exists():
             self._content_ = self.read()
         else:
@@ -50,14 +99,29 @@ class TomlFile(BaseTOMLFile):
         """Does the :file:`.toml` file exist?"""
         return self._path_.exists()
 
+    def read(self):
+        """Read the :file:`.toml` file into a *tomlkit* document."""
+        import tomlkit
+        with self._path_.open(encoding='utf-8') as f:
+            self._text_ = f.read()
+        return tomlkit.loads(self._text_)
+
+    def write(self, data):
+        """Write the *tomlkit* document *data* to the :file:`.toml` file, atomically."""
+        from et_micc.utils import write_atomically
+        text = data.as_string()
+        write_atomically(self._path_, text.encode('utf-8'))
+        self._text_ = text
+        self.dirty.clear()
+
     def __getattr__(self, item):
         """Delegate to self.path."""
         return getattr(self._path_, item)
 
     def __str__(self):
         """string representation of self.path"""
-        return str(self._path)
-    
+        return str(self._path_)
+
     def __getitem__(self,item):
         """Read access the content of the :file:`.toml` file."""
         return self._content_[item]
@@ -65,9 +129,38 @@ class TomlFile(BaseTOMLFile):
     def __setitem__(self,item,value):
         """Write access the content of the :file:`.toml` file."""
         self._content_[item] = value
+        self.dirty.add((item,))
+
+    def set(self, keys, value):
+        """Modify a (nested) item of the content of the :file:`.toml` file.
+
+        :param tuple keys: the keys of the item, e.g. ``('tool', 'poetry', 'version')``.
+        :param value: the new value.
+        """
+        container = self._content_
+        for key in keys[:-1]:
+            container = container[key]
+        container[keys[-1]] = value
+        self.dirty.add(tuple(keys))
+
+    def is_modified(self):
+        """Test if the content differs semantically from the :file:`.toml` file as
+        it was read (or last saved). Mere formatting differences do not count."""
+        text = self._content_.as_string()
+        if text == self._text_:
+            return False
+        return _loads(text) != _loads(self._text_)
 
     def save(self):
-        """Write the current content of the :file:`.toml` file back to file."""
-        self.write(self._content_)\
-        
-# eof
\ No newline at end of file
+        """Write the current content of the :file:`.toml` file back to file, if it
+        was modified (see :py:meth:`is_modified`).
+
+        :returns: True if the file was written.
+        """
+        if not self.is_modified():
+            self.dirty.clear()
+            return False
+        self.write(self._content_)
+        return True
+
+# eof
@@ -12,16 +12,16 @@ Utility functions for et_micc.
 import os
 import re
 import subprocess
-import copy
+import tempfile
 from pathlib import Path
 from contextlib import contextmanager
 
-import semantic_version as sv
-
-from et_micc.tomlfile import TomlFile
+from et_micc.tomlfile import read_toml
 import et_micc.logger
+import et_micc.roots
 
-from pypi_simple import PyPISimple
+# Heavy dependencies (semantic_version, requests) are imported by the functions
+# that need them, to keep the start up time of micc commands short.
 
 
 def operator_version(version_constraint_string):
@@ -29,6 +29,8 @@ def operator_version(version_constraint_string):
 
     :returns: (str,semantic_version.Version)
     """
+    import semantic_version as sv
+
     for i in range(2):
         if version_constraint_string[i].isdigit():
             operator = version_constraint_string[:i]
@@ -47,7 +49,12 @@ def version_range(version_constraint_string):
     
     Note that the lower bound is inclusive, but the upper bound is exclusive.
     If one of the bounds is None, then it is unbound in that direction.
+
+    This supports only ``^``, ``==``, ``>=``, ``<=``, ``>``, ``<`` and comma separated
+    lists of these. See :py:mod:`et_micc.versions` for the full constraint syntax.
     """
+    import semantic_version as sv
+
     if version_constraint_string.startswith('^'):
         vc = version_constraint_string[1:]
         vn = sv.Version(vc).next_major()
@@ -103,15 +110,19 @@ def intersect(version_range_1, version_range_2):
 
 def validate_intersection(intersection):
     """Test if the intersection is not empty.
+
+    :param tuple intersection: interval [lower_bound,upper_bound[ (see :py:func:`version_range`).
     :returns: bool
     """
-    if None in intersection[0]:
+    if None in intersection:
         return True
     else:
-        return intersection[0].__cmp__(intersection[1]) != 1
+        return intersection[0] < intersection[1]
 
 
 def most_recent(version_constraint_string1, version_constraint_string2):
+    import semantic_version as sv
+
     range1 = version_range(version_constraint_string1)
     range2 = version_range(version_constraint_string2)
     if (not range1[1] is None) and (not range2[0] is None) and sv.compare(range1[1],range2[0])==-1:
@@ -128,6 +139,8 @@ def version_constraint(version_range):
 
 def convert_caret_specification(spec):
     """"""
+    import semantic_version as sv
+
     if spec.startswith('^'):
         v = spec[1:]
         vlower = sv.Version(v)
@@ -172,18 +185,19 @@ def pep8_module_name(name):
 def existsOnPyPI(package):
     """Does package exist already on PyPI?
 
-    :return: True|False|Exception`
+    :return: True|False|:py:class:`et_micc.pypi.Unverified`|Exception`
 
-    In case of an exception, the result is inconclusive.
-    """
-    try:
-        with PyPISimple() as client:
-            requests_page = client.get_project_page(package)
+    The local snapshot of the PyPI names is consulted first (see :py:mod:`et_micc.pypi`).
+    A name in the snapshot exists. Other names are verified online, as they may have
+    been registered after the snapshot was taken. If that fails (e.g. PyPI cannot be
+    reached), the result is :py:class:`et_micc.pypi.Unverified`: the name is not in
+    the snapshot, but may have been registered since.
 
-    except Exception as e:
-        return e
-
-    return not requests_page is None
+    In case of an exception (no snapshot, and PyPI cannot be reached), the result is
+    inconclusive.
+    """
+    import et_micc.pypi
+    return et_micc.pypi.check_names([package])[package]
 
 # 'pip search name' will soon disappear
 # seehttps://stackoverflow.com/questions/65307988/error-using-pip-search-pip-search-stopped-working
@@ -245,7 +259,8 @@ def is_project_directory(path,project=None):
 
         * project.project_name
         * project.package_name
-        * project.pyproject_toml
+        * project.pyproject (the content of :file:`pyproject.toml`, for reading only,
+          see :py:func:`et_micc.tomlfile.read_toml`)
 
     :returns: bool.
     
@@ -253,17 +268,24 @@ def is_project_directory(path,project=None):
     
     * there is a pyproject.toml file, exposing the project's name:py:obj:`['tool']['poetry']['name']`
     * that there is a python package or module with that name, converted by :py:meth:`pep8_module_name`.
+
+    If :py:obj:`project` is None, the test is delegated to :py:func:`et_micc.roots.is_project_root`,
+    which does not parse :file:`pyproject.toml` if it was seen before.
     """
+    if project is None:
+        # Nothing to set: use the cheap test.
+        return et_micc.roots.is_project_root(path)
+
     if not isinstance(path, Path):
         path = Path(path)
         
     path_to_pyproject_toml = str(path /'pyproject.toml')
     
     try:
-        pyproject_toml = TomlFile(path_to_pyproject_toml)
-        project_name = pyproject_toml['tool']['poetry']['name']
+        pyproject = read_toml(path_to_pyproject_toml)
+        project_name = pyproject['tool']['poetry']['name']
         if not project is None:
-            project.pyproject_toml = pyproject_toml
+            project.pyproject = pyproject
             project.project_name = project_name
     except Exception:
         return False
@@ -380,6 +402,36 @@ def log_completed_process(completed_process, logfun=None):
     return completed_process.returncode
 
 
+# The umask can only be read by setting it. It is read once, at import time,
+# because setting it temporarily would affect files created by other threads.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_atomically(path, data):
+    """Write the bytes *data* to *path*, such that readers never see a partial file.
+
+    The data are written to a private temporary file in the same directory, which
+    then replaces *path* (:py:func:`os.replace` is atomic). The file keeps the
+    permissions of the file it replaces. A new file gets the permissions of a file
+    created with :py:func:`open`, i.e. ``0o666`` minus the umask.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            mode = path.stat().st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp, mode)
+        os.replace(tmp, str(path))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
 def get_project_path(p):
     """Look for a project directory in the parents of path :py:obj:`p`.
     
@@ -387,14 +439,10 @@ def get_project_path(p):
     :returns: the nearest directory above :py:obj:`p` that is project directory.
     :raise: RuntimeError if :py:obj:`p` is noe inside a project directory.
     """
-    root = Path('/')
-    p = Path(p).resolve()
-    p0 = copy.copy(p)
-    while not is_project_directory(p):
-        p = p.parent
-        if p==root:
-            raise RuntimeError(f"Folder {p0} is not inside a Python project.")
-    return p
+    project_path = et_micc.roots.find_project_root(p)
+    if project_path is None:
+        raise RuntimeError(f"Folder {Path(p).resolve()} is not inside a Python project.")
+    return project_path
 
 
 def insert_in_file(file, lines=[], before=False, startswith=None):
@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.versions
+=======================
+
+Version constraints as sets of versions.
+
+A version constraint, as used in the ``[tool.poetry.dependencies]`` table of
+:file:`pyproject.toml`, is parsed into a :py:class:`VersionSet`: a sorted tuple
+of disjoint version intervals. Intersection and union of version sets are linear
+merges of their intervals, so that any number of constraints on a dependency can
+be combined, and the result tested for emptiness, or converted back into a
+constraint string.
+
+Supported constraints:
+
+* comparisons: ``>=1.2``, ``>1.2``, ``<=1.2``, ``<1.2``, ``==1.2.3``, ``!=1.2.3``,
+  and a bare version ``1.2.3`` (meaning ``==1.2.3``),
+* wildcards: ``*``, ``1.*``, ``1.2.*``, ``==1.2.*``, ``!=1.2.*``,
+* caret requirements: ``^1.2.3`` (``>=1.2.3,<2.0.0``), ``^0.2.3`` (``>=0.2.3,<0.3.0``),
+* tilde requirements: ``~1.2.3`` (``>=1.2.3,<1.3.0``), ``~1`` (``>=1,<2``),
+* compatible release: ``~=1.2`` (``>=1.2,<2``), ``~=1.2.3`` (``>=1.2.3,<1.3``),
+* intersection of constraints: ``>=1.2,<2.0`` (or ``>=1.2 <2.0``),
+* union of constraints: ``^1.2 || ^2.0``.
+
+Versions are compared by their numeric release components (trailing zeros do not
+count, ``1.2 == 1.2.0``) and pre-release (``dev`` < ``a`` < ``b`` < ``rc`` <
+final release < ``post``). Parsed versions and constraints are memoized, as the
+same constraints recur over and over.
+"""
+
+import re
+import functools
+
+_VERSION = re.compile(
+    r"""^\s*v?(?P<release>\d+(?:\.\d+)*)
+        (?:[-_.]?(?P<phase>dev|a|alpha|b|beta|c|rc|pre|preview|post)[-_.]?(?P<number>\d*))?
+        (?:\+[0-9a-zA-Z.-]*)?\s*$""", re.VERBOSE | re.IGNORECASE)
+
+_PHASES = {'dev': 0, 'a': 1, 'alpha': 1, 'b': 2, 'beta': 2, 'c': 3, 'rc': 3, 'pre': 3, 'preview': 3, 'post': 5}
+_FINAL = 4
+
+_CLAUSE = re.compile(r"\s*(?P<operator>~=|==|!=|<=|>=|<|>|\^|~|=)?\s*(?P<version>[^\s,<>=!~^|]+)")
+
+
+class ConstraintError(ValueError):
+    """Raised for version constraints that cannot be parsed."""
+
+
+@functools.total_ordering
+class Version:
+    """A version, ordered by its release components and pre-release.
+
+    :param str text: the version, e.g. ``'1.2.3'``, ``'1.2'``, ``'2.0.0rc1'``.
+    :raises: ConstraintError if *text* is not a version.
+    """
+    __slots__ = ('text', 'release', 'key')
+
+    def __init__(self, text):
+        m = _VERSION.match(text)
+        if m is None:
+            raise ConstraintError(f"Invalid version '{text}'.")
+        self.text = text.strip()
+        self.release = tuple(int(c) for c in m.group('release').split('.'))
+        release = self.release
+        while len(release) > 1 and release[-1] == 0:
+            release = release[:-1]
+        phase = m.group('phase')
+        if phase is None:
+            self.key = (release, _FINAL, 0)
+        else:
+            self.key = (release, _PHASES[phase.lower()], int(m.group('number') or 0))
+
+    def __eq__(self, other):
+        return isinstance(other, Version) and self.key == other.key
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"Version('{self.text}')"
+
+    def bump(self, index):
+        """The first version with a larger release component *index*, e.g.
+        ``Version('1.2.3').bump(0) == Version('2.0.0')``, ``Version('1.2.3').bump(1) == Version('1.3.0')``.
+        """
+        release = self.release + (0,) * (index + 1 - len(self.release))
+        release = release[:index] + (release[index] + 1,) + (0,) * max(0, len(release) - index - 1)
+        return version('.'.join(str(c) for c in release))
+
+
+@functools.lru_cache(maxsize=4096)
+def version(text):
+    """Parse a version (memoized).
+
+    :param str text: the version.
+    :returns: :py:class:`Version`.
+    """
+    return Version(text)
+
+
+class VersionSet:
+    """A set of versions, as a sorted tuple of disjoint intervals.
+
+    An interval is a tuple ``(lower, lower_inclusive, upper, upper_inclusive)``,
+    where *lower* and *upper* are :py:class:`Version` objects, or None if the
+    interval is unbounded in that direction. Version sets are immutable.
+
+    :param iterable intervals: the intervals. They are sorted and merged where
+        they overlap or touch. Empty intervals are dropped.
+    """
+    __slots__ = ('intervals',)
+
+    def __init__(self, intervals=()):
+        self.intervals = _normalize(intervals)
+
+    @classmethod
+    def all(cls):
+        """The set of all versions."""
+        return cls([(None, False, None, False)])
+
+    def is_empty(self):
+        return not self.intervals
+
+    def __bool__(self):
+        return bool(self.intervals)
+
+    def __eq__(self, other):
+        return isinstance(other, VersionSet) and self.intervals == other.intervals
+
+    def __hash__(self):
+        return hash(self.intervals)
+
+    def __contains__(self, v):
+        if isinstance(v, str):
+            v = version(v)
+        for lower, lower_inclusive, upper, upper_inclusive in self.intervals:
+            if _above_lower(v, lower, lower_inclusive) and _below_upper(v, upper, upper_inclusive):
+                return True
+        return False
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def intersection(self, other):
+        """The versions in both *self* and *other*.
+
+        :param VersionSet other:
+        :returns: VersionSet
+        """
+        result = []
+        a, b = self.intervals, other.intervals
+        i = j = 0
+        while i < len(a) and j < len(b):
+            lower, lower_inclusive = _max_lower(a[i], b[j])
+            upper, upper_inclusive = _min_upper(a[i], b[j])
+            result.append((lower, lower_inclusive, upper, upper_inclusive))
+            # advance the interval that ends first
+            if _upper_key(a[i]) < _upper_key(b[j]):
+                i += 1
+            else:
+                j += 1
+        return VersionSet(result)
+
+    def union(self, other):
+        """The versions in *self* or *other*.
+
+        :param VersionSet other:
+        :returns: VersionSet
+        """
+        return VersionSet(self.intervals + other.intervals)
+
+    def complement(self):
+        """The versions that are not in *self*."""
+        result = []
+        lower, lower_inclusive = None, False
+        for l, li, u, ui in self.intervals:
+            if l is not None:
+                result.append((lower, lower_inclusive, l, not li))
+            if u is None:
+                return VersionSet(result)
+            lower, lower_inclusive = u, not ui
+        result.append((lower, lower_inclusive, None, False))
+        return VersionSet(result)
+
+    def __str__(self):
+        """The version set as a constraint string. The empty set is represented
+        as ``'<0.0.0'``."""
+        if not self.intervals:
+            return '<0.0.0'
+        alternatives = []
+        for lower, lower_inclusive, upper, upper_inclusive in self.intervals:
+            if lower is not None and lower == upper:
+                alternatives.append(f"=={lower}")
+                continue
+            clauses = []
+            if lower is not None:
+                clauses.append(f"{'>=' if lower_inclusive else '>'}{lower}")
+            if upper is not None:
+                clauses.append(f"{'<=' if upper_inclusive else '<'}{upper}")
+            alternatives.append(','.join(clauses) if clauses else '*')
+        return ' || '.join(alternatives)
+
+    def __repr__(self):
+        return f"VersionSet('{self}')"
+
+
+def _lower_key(interval):
+    lower, lower_inclusive = interval[0], interval[1]
+    # None sorts first, an inclusive bound before an exclusive bound
+    return (0,) if lower is None else (1, lower.key, 0 if lower_inclusive else 1)
+
+
+def _upper_key(interval):
+    upper, upper_inclusive = interval[2], interval[3]
+    # None sorts last, an exclusive bound before an inclusive bound
+    return (2,) if upper is None else (1, upper.key, 1 if upper_inclusive else 0)
+
+
+def _max_lower(a, b):
+    return (a[0], a[1]) if _lower_key(a) >= _lower_key(b) else (b[0], b[1])
+
+
+def _min_upper(a, b):
+    return (a[2], a[3]) if _upper_key(a) <= _upper_key(b) else (b[2], b[3])
+
+
+def _above_lower(v, lower, inclusive):
+    return lower is None or v > lower or (inclusive and v == lower)
+
+
+def _below_upper(v, upper, inclusive):
+    return upper is None or v < upper or (inclusive and v == upper)
+
+
+def _is_empty(interval):
+    lower, lower_inclusive, upper, upper_inclusive = interval
+    if lower is None or upper is None:
+        return False
+    if lower == upper:
+        return not (lower_inclusive and upper_inclusive)
+    return upper < lower
+
+
+def _touches(upper, upper_inclusive, lower, lower_inclusive):
+    """Test if an interval ending at *upper* overlaps or touches an interval starting at *lower*."""
+    if upper is None or lower is None:
+        return True
+    if lower < upper:
+        return True
+    return lower == upper and (upper_inclusive or lower_inclusive)
+
+
+def _normalize(intervals):
+    """Sort intervals, drop empty intervals, and merge overlapping and touching intervals."""
+    intervals = sorted((i for i in intervals if not _is_empty(i)), key=_lower_key)
+    merged = []
+    for interval in intervals:
+        if merged and _touches(merged[-1][2], merged[-1][3], interval[0], interval[1]):
+            last = merged[-1]
+            upper, upper_inclusive = (last[2], last[3]) if _upper_key(last) >= _upper_key(interval) else (interval[2], interval[3])
+            merged[-1] = (last[0], last[1], upper, upper_inclusive)
+        else:
+            merged.append(interval)
+    return tuple(merged)
+
+
+def _wildcard(text):
+    """The interval of versions matching a wildcard version like ``1.2.*``."""
+    prefix = text[:-2]
+    if not prefix:
+        return (None, False, None, False)
+    v = version(prefix)
+    return (v, True, v.bump(len(v.release) - 1), False)
+
+
+def _clause(operator, text):
+    """The version set of a single clause like ``>=1.2``."""
+    if text == '*' or text.endswith('.*'):
+        interval = _wildcard(text)
+        if operator in ('', '==', '='):
+            return VersionSet([interval])
+        if operator == '!=':
+            return VersionSet([interval]).complement()
+        raise ConstraintError(f"Wildcard version '{text}' cannot be used with '{operator}'.")
+
+    v = version(text)
+    if operator in ('', '==', '='):
+        return VersionSet([(v, True, v, True)])
+    if operator == '!=':
+        return VersionSet([(None, False, v, False), (v, False, None, False)])
+    if operator == '>=':
+        return VersionSet([(v, True, None, False)])
+    if operator == '>':
+        return VersionSet([(v, False, None, False)])
+    if operator == '<=':
+        return VersionSet([(None, False, v, True)])
+    if operator == '<':
+        return VersionSet([(None, False, v, False)])
+    if operator == '^':
+        # bump the first non-zero component (or the last one given)
+        release = v.release
+        index = next((i for i, c in enumerate(release) if c), len(release) - 1)
+        return VersionSet([(v, True, v.bump(index), False)])
+    if operator == '~':
+        index = 1 if len(v.release) > 1 else 0
+        return VersionSet([(v, True, v.bump(index), False)])
+    if operator == '~=':
+        if len(v.release) < 2:
+            raise ConstraintError(f"'~={text}' requires at least two version components.")
+        return VersionSet([(v, True, v.bump(len(v.release) - 2), False)])
+    raise ConstraintError(f"Invalid operator '{operator}'.")
+
+
+@functools.lru_cache(maxsize=4096)
+def parse(constraint):
+    """Parse a version constraint (memoized).
+
+    :param str constraint: the version constraint, e.g. ``'^1.2'``, ``'>=1.0,<2.0 || ^3.0'``.
+    :returns: :py:class:`VersionSet`
+    :raises: ConstraintError if the constraint cannot be parsed.
+    """
+    result = VersionSet()
+    for alternative in constraint.split('||'):
+        versions = VersionSet.all()
+        position = 0
+        alternative = alternative.strip()
+        if not alternative:
+            raise ConstraintError(f"Invalid version constraint '{constraint}'.")
+        while position < len(alternative):
+            m = _CLAUSE.match(alternative, position)
+            if m is None:
+                raise ConstraintError(f"Invalid version constraint '{constraint}'.")
+            versions = versions & _clause(m.group('operator') or '', m.group('version'))
+            position = m.end()
+            # skip the separator
+            while position < len(alternative) and alternative[position] in ', ':
+                position += 1
+        result = result | versions
+    return result
+
+
+def intersect(constraints):
+    """The versions that satisfy all *constraints*.
+
+    :param iterable constraints: version constraint strings.
+    :returns: :py:class:`VersionSet` (empty if the constraints conflict).
+    """
+    result = VersionSet.all()
+    for constraint in constraints:
+        result = result & parse(constraint)
+        if not result:
+            break
+    return result
+
+
+def most_recent(constraint_1, constraint_2):
+    """Of two version constraints, the one that allows the most recent versions.
+
+    :param str constraint_1:
+    :param str constraint_2:
+    :returns: *constraint_1* or *constraint_2*.
+    """
+    a, b = parse(constraint_1), parse(constraint_2)
+    if not a:
+        return constraint_2
+    if not b:
+        return constraint_1
+    return constraint_2 if _upper_key(b.intervals[-1]) > _upper_key(a.intervals[-1]) else constraint_1
+
+
+def merge(current, new):
+    """Combine the current version constraint on a dependency with a new one.
+
+    :param str current: the current version constraint.
+    :param str new: the new version constraint.
+    :returns: tuple ``(constraint, conflict)``: the combined constraint (the
+        current or the new constraint itself if it implies the other one), and
+        False; or, if the constraints conflict, the constraint that allows the most
+        recent versions (see :py:func:`most_recent`), and True.
+    """
+    a, b = parse(current), parse(new)
+    both = a & b
+    if both == a:
+        return current, False
+    if both == b:
+        return new, False
+    if both:
+        return str(both), False
+    return most_recent(current, new), True
+
+
+_REQUIREMENT = re.compile(r"^\s*(?P<name>[A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)\s*(?:\[[^\]]*\])?\s*@?(?P<constraint>.*)$")
+
+
+def parse_requirement(line):
+    """Parse a line of a requirements file, e.g. ``numpy>=1.18,<2``, ``click ^7.0``,
+    ``click@^7.0`` or ``requests (>=2.0)``.
+
+    Extras (``[...]``) and environment markers (``; ...``) are ignored.
+
+    :param str line: the line.
+    :returns: tuple ``(name, constraint)``, or None if the line is empty, a comment
+        or a pip option. The constraint of a requirement without version is ``'*'``.
+    :raises: ConstraintError if the line is not a valid requirement.
+    """
+    line = line.split('#', 1)[0].split(';', 1)[0].strip()
+    if not line or line.startswith('-'):
+        return None
+    m = _REQUIREMENT.match(line)
+    if m is None:
+        raise ConstraintError(f"Invalid requirement '{line}'.")
+    constraint = m.group('constraint').strip()
+    if constraint.startswith('(') and constraint.endswith(')'):
+        constraint = constraint[1:-1].strip()
+    constraint = constraint or '*'
+    parse(constraint)
+    return m.group('name'), constraint
+
+
+def resolve(current, requirements):
+    """Combine new version constraints on dependencies with the current ones, in
+    one pass.
+
+    All constraints on a dependency are intersected. If the intersection equals
+    one of the constraints, that constraint is used as is (e.g. ``^1.2``), otherwise
+    the intersection is converted into a constraint string.
+
+    :param dict current: the current constraints, mapping dependencies to constraints.
+    :param list requirements: ``(dependency, constraint)`` pairs. A dependency may
+        occur more than once.
+    :returns: tuple ``(updates, conflicts, invalid)``. *updates* maps the dependencies
+        whose constraint is new or changed to their new constraint. *conflicts* maps the
+        dependencies whose constraints have no version in common to the list of
+        their constraints (the current constraint first). *invalid* maps the
+        dependencies with a constraint that cannot be parsed (e.g. the current one)
+        to the :py:class:`ConstraintError`.
+    """
+    grouped = {}
+    for name, constraint in requirements:
+        grouped.setdefault(name, []).append(constraint)
+
+    updates, conflicts, invalid = {}, {}, {}
+    for name, constraints in grouped.items():
+        if name in current:
+            constraints = [current[name]] + constraints
+        try:
+            versions = intersect(constraints)
+            if not versions:
+                conflicts[name] = constraints
+                continue
+            constraint = next((c for c in constraints if parse(c) == versions), None) or str(versions)
+        except ConstraintError as e:
+            invalid[name] = e
+            continue
+        if constraint != current.get(name):
+            updates[name] = constraint
+    return updates, conflicts, invalid
+
+#eof
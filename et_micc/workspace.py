@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Module et_micc.workspace
+========================
+
+Run a micc command on all projects in a directory tree (``micc workspace``).
+
+The project directories are discovered with :py:func:`et_micc.utils.is_project_directory`,
+which uses the project root index of :py:mod:`et_micc.roots`. The command is run
+on each project in a bounded pool of worker processes. Every worker imports micc
+once, and runs the commands it is given in-process, capturing their output. The
+results are reported as they complete, in no particular order. Each command logs
+to the log file of its own project, as usual.
+"""
+
+import io
+import os
+import time
+from pathlib import Path
+
+import et_micc.utils
+
+
+def find_projects(path):
+    """Find the project directories in a directory tree.
+
+    Directories whose name starts with a dot (e.g. :file:`.git`, virtual
+    environments), and :file:`__pycache__` directories are not searched.
+    Project directories are searched too, because projects may be nested.
+
+    :param str|Path path: root of the directory tree.
+    :returns: sorted list of the paths of the project directories.
+    """
+    projects = []
+    for directory, subdirectories, _ in os.walk(str(path)):
+        subdirectories[:] = [d for d in subdirectories if not (d.startswith('.') or d == '__pycache__')]
+        if et_micc.utils.is_project_directory(directory):
+            projects.append(Path(directory))
+    return sorted(projects)
+
+
+def run_in_project(project_path, args, verbosity=1):
+    """Run a micc command on a project, with its output captured.
+
+    This is executed in a worker process, with :py:func:`et_micc.server.run_micc`.
+
+    :param Path project_path: the project directory.
+    :param list args: the micc command and its arguments, e.g. ``['version', '-s']``.
+    :param int verbosity: the verbosity of the micc command.
+    :returns: dict with the project path, the exit code, the output on stdout and
+        stderr, and the time spent in seconds.
+    """
+    import et_micc.server
+
+    argv = ['-p', str(project_path)]
+    if verbosity > 1:
+        argv.append('-' + verbosity * 'v')
+    argv.extend(args)
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    start = time.perf_counter()
+    exit_code = et_micc.server.run_micc(argv, stdout, stderr)
+    return { 'project': str(project_path)
+           , 'exit_code': exit_code
+           , 'seconds': round(time.perf_counter() - start, 3)
+           , 'stdout': stdout.getvalue()
+           , 'stderr': stderr.getvalue()
+           }
+
+
+def run_workspace(projects, args, verbosity=1, jobs=None):
+    """Run a micc command on projects in a pool of worker processes.
+
+    :param list projects: the project directories.
+    :param list args: the micc command and its arguments.
+    :param int verbosity: the verbosity of the micc command.
+    :param int jobs: the number of worker processes, by default the number of CPUs.
+    :returns: generator of the results of :py:func:`run_in_project`, in the order
+        in which they complete.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    if not projects:
+        return
+    jobs = min(jobs or os.cpu_count() or 1, len(projects))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(run_in_project, project_path, args, verbosity) for project_path in projects]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def format_row(result, root):
+    """Format a result of :py:func:`run_in_project` as a table row.
+
+    The row contains the exit code, the time spent and the project directory
+    (relative to *root*), followed by the output of the command. Output that
+    fits on a single line is appended to the row, longer output is indented
+    below it.
+
+    :param dict result: a result of :py:func:`run_in_project`.
+    :param Path root: the root of the workspace.
+    :returns: str
+    """
+    try:
+        project = str(Path(result['project']).relative_to(root))
+    except ValueError:
+        project = result['project']
+    row = f"{result['exit_code']:>4}  {result['seconds']:>7.2f}s  {project}"
+    lines = (result['stdout'] + result['stderr']).rstrip().splitlines()
+    if len(lines) == 1:
+        return f"{row}  {lines[0].strip()}"
+    return '\n'.join([row] + ['      ' + line for line in lines])
+
+#eof
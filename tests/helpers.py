@@ -7,11 +7,15 @@ Tests for et_micc package.
 #===============================================================================
 
 import os,re
+import time
 import shutil
 import contextlib
+import socket
+import threading
 import uuid
 import traceback
 from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from et_micc.tomlfile import TomlFile
 
@@ -85,7 +89,101 @@ def get_version(path_to_file,verbose=False):
         print(f"%% {path_to_file} : version : ({version})")
     return version
 
-    
+
+
+def count_toml_writes(monkeypatch):
+    """Record the names of the toml files written with :py:meth:`TomlFile.write`.
+
+    :param monkeypatch: the pytest ``monkeypatch`` fixture of the test, which
+        restores :py:meth:`TomlFile.write` afterwards.
+    :returns: the list of names, which grows as files are written.
+    """
+    writes = []
+    write = TomlFile.write
+    def counting_write(self, data):
+        writes.append(self.path.name)
+        write(self, data)
+    monkeypatch.setattr(TomlFile, 'write', counting_write)
+    return writes
+
+
+class SimpleIndexHandler(BaseHTTPRequestHandler):
+    """Request handler of :py:class:`SimpleIndex`."""
+    protocol_version = 'HTTP/1.1' # keep connections alive
+
+    def do_GET(self):
+        index = self.server.index
+        index.requests.append(self.path)
+        index.connections.add(self.client_address)
+        index.sockets.add(self.connection)
+        if index.delay:
+            time.sleep(index.delay)
+        if self.path.rstrip('/') == '/simple':
+            etag = f'"{index.serial}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = ''.join(f'<a href="/simple/{name}/">{name}</a>\n' for name in index.names)
+            body = f"<!DOCTYPE html><html><body>\n{body}</body></html>".encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('ETag', etag)
+            self.send_header('X-PyPI-Last-Serial', str(index.serial))
+        else:
+            name = self.path.rstrip('/').rsplit('/', 1)[-1]
+            if name not in index.names:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = f'<!DOCTYPE html><html><body><a href="/{name}-1.0.tar.gz">{name}-1.0.tar.gz</a></body></html>'.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SimpleIndex:
+    """A local stand-in of the PyPI simple index (PEP 503), for use as a context
+    manager. It records the paths of the requests it receives, and the client
+    addresses of the connections.
+
+    :param list names: the (normalized) project names in the index.
+    :param float delay: time (in s) to wait before answering a request.
+    """
+    def __init__(self, names, delay=0):
+        self.names = list(names)
+        self.serial = 1
+        self.delay = delay
+        self.requests = []
+        self.connections = set()
+        self.sockets = set()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), SimpleIndexHandler)
+        self.server.daemon_threads = True
+        self.server.index = self
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/simple/"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+        # also close the connections kept alive, so that the index is really offline
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
 # ==============================================================================
 # ==============================================================================
 if __name__ == "__main__":
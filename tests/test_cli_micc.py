@@ -8,6 +8,8 @@ Tests for et_micc package.
 
 import os
 import sys
+import shutil
+import subprocess
 from pathlib import Path
 from types import SimpleNamespace
 
@@ -15,7 +17,11 @@ from types import SimpleNamespace
 from click.testing import CliRunner
 
 import et_micc.logger
-from tests.helpers import in_empty_tmp_dir, report, get_version
+import et_micc.utils
+import et_micc.sync
+import et_micc.tomlfile
+import et_micc.versions
+from tests.helpers import in_empty_tmp_dir, report, get_version, count_toml_writes
 from et_micc import cli_micc
 
 #===============================================================================
@@ -72,7 +78,217 @@ def test_scenario_2():
         run(runner, ['-v', '-p', 'FOO', 'version','--short'])
         run(runner, ['-vv', '-p', 'FOO', 'version','-p'])
         run(runner, ['-v', '-p', 'FOO', 'version','--short'])
-        
+
+
+def test_hooks():
+    """The in-process template hooks validate the package name and remove the LICENSE file."""
+    runner = CliRunner()
+    with in_empty_tmp_dir():
+        run(runner, ['-p', 'FOO', 'create', '--allow-nesting', '--remote', 'none', '--lic', 'Not'])
+        assert Path('FOO/foo.py').exists()
+        assert not Path('FOO/LICENSE').exists()
+
+        result = runner.invoke(cli_micc.main, ['-p', 'a', 'create', '--allow-nesting', '--remote', 'none'])
+        assert result.exit_code
+        assert 'not a valid Python module name' in result.output
+        assert not Path('a/a.py').exists()
+
+
+def test_template_sync():
+    """Only pristine files are updated by 'micc template-sync'."""
+    runner = CliRunner()
+    with in_empty_tmp_dir():
+        run(runner, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none'])
+        run(runner, ['-p', 'FOO', 'add', '--py', 'bar', '--package'])
+        record = et_micc.sync.TemplateRecord(Path('FOO'))
+        assert 'foo/bar/__init__.py' in record.files
+        assert 'foo/bar.py' not in record.files
+        result = run(runner, ['-p', 'FOO', 'template-sync'])
+        assert 'All generated files are up to date.' in result.output
+
+        # Pretend that README.rst and tests/test_foo.py were generated by an older template,
+        # and that tests/test_foo.py was modified since.
+        old = "generated by an older template\n"
+        readme = Path('FOO/README.rst')
+        expected = readme.read_text()
+        readme.write_text(old)
+        record.files['README.rst']['hash'] = et_micc.sync.file_hash(readme)
+        record.files['tests/test_foo.py']['hash'] = et_micc.sync.file_hash(readme)
+        Path('FOO/tests/test_foo.py').write_text("modified\n")
+        # Pretend that AUTHORS.rst is new in the template.
+        Path('FOO/AUTHORS.rst').unlink()
+        del record.files['AUTHORS.rst']
+        record.save()
+
+        result = run(runner, ['-p', 'FOO', 'template-sync', '--dry-run'])
+        assert readme.read_text() == old
+        assert not Path('FOO/AUTHORS.rst').exists()
+
+        result = run(runner, ['-p', 'FOO', 'template-sync', '--write-new'])
+        assert readme.read_text() == expected
+        assert Path('FOO/AUTHORS.rst').exists()
+        assert Path('FOO/tests/test_foo.py').read_text() == "modified\n"
+        assert Path('FOO/tests/test_foo.py.new').exists()
+        assert 'tests/test_foo.py' in result.output
+
+
+def test_template_sync_later(monkeypatch):
+    """Files rendered with {% now %} are not updated by 'micc template-sync' a year later."""
+    import arrow
+    runner = CliRunner()
+    with in_empty_tmp_dir():
+        run(runner, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none'])
+        assert Path('FOO/micc-templates.json').stat().st_mode == Path('FOO/micc.json').stat().st_mode
+
+        now = arrow.now
+        monkeypatch.setattr(arrow, 'now', lambda *args: now(*args).shift(years=1))
+        result = run(runner, ['-p', 'FOO', 'template-sync', '--dry-run'])
+        assert 'All generated files are up to date.' in result.output
+
+
+def test_batch():
+    """'micc batch' produces the same project as the separate commands."""
+    script = ("add --py mod1\n"
+              "add --py mod2 --package # a sub-package\n"
+              "add --app app1\n"
+              "version -p\n"
+              "add --cpp cpp1\n"
+              "mv mod1 mod3\n"
+              )
+    runner = CliRunner()
+    with in_empty_tmp_dir():
+        for d in ('batch', 'separate'):
+            os.mkdir(d)
+            with et_micc.utils.in_directory(d):
+                run(runner, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none'])
+        with et_micc.utils.in_directory('batch'):
+            result = run(runner, ['-p', 'FOO', 'batch'], input_=script)
+            assert '[6/6] micc mv mod1 mod3' in result.output
+        with et_micc.utils.in_directory('separate'):
+            for line in script.splitlines():
+                run(runner, ['-p', 'FOO', *line.split('#')[0].split()])
+
+        for file in ('pyproject.toml', 'API.rst', 'APPS.rst', 'docs/index.rst', 'foo/__init__.py', 'foo/mod3.py'):
+            assert Path('batch/FOO', file).read_text() == Path('separate/FOO', file).read_text()
+        db = Path('batch/FOO/db.json').read_text()
+        assert db.replace('batch', 'separate') == Path('separate/FOO/db.json').read_text()
+
+        with et_micc.utils.in_directory('batch'):
+            result = runner.invoke(cli_micc.main, ['-p', 'FOO', 'batch'], input="add --py mod4\ncreate BAR\n")
+            assert result.exit_code == 1
+            assert not Path('FOO/foo/mod4.py').exists()
+
+
+def test_single_write(monkeypatch):
+    """'micc add --app' and 'micc version' write pyproject.toml once, and only if it changes."""
+    runner = CliRunner()
+    writes = count_toml_writes(monkeypatch)
+    with in_empty_tmp_dir():
+        run(runner, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none'])
+        run(runner, ['-p', 'FOO', 'add', '--app', 'app1'])
+        assert writes == ['pyproject.toml']
+        assert 'click' in et_micc.tomlfile.read_toml('FOO/pyproject.toml')['tool']['poetry']['dependencies']
+        run(runner, ['-p', 'FOO', 'add', '--app', 'app2'])
+        assert writes == 2 * ['pyproject.toml']
+        run(runner, ['-p', 'FOO', 'version', '-p'])
+        assert writes == 3 * ['pyproject.toml']
+        run(runner, ['-p', 'FOO', 'version', '-r', '0.0.1'])
+        assert writes == 3 * ['pyproject.toml']
+
+
+def test_deps_add(monkeypatch):
+    """'micc deps add' merges many constraints, writes pyproject.toml once, and reports conflicts."""
+    runner = CliRunner()
+    writes = count_toml_writes(monkeypatch)
+    with in_empty_tmp_dir():
+        run(runner, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none'])
+        Path('requirements.txt').write_text("numpy>=1.18,<2\nclick ^7.0\n# comment\nnumpy ^1.19\n")
+        run(runner, ['-p', 'FOO', 'deps', 'add', '-r', 'requirements.txt', 'click>=7.1', 'six'])
+        assert writes == ['pyproject.toml']
+        dependencies = et_micc.tomlfile.read_toml('FOO/pyproject.toml')['tool']['poetry']['dependencies']
+        assert dependencies['numpy'] == '^1.19'
+        assert dependencies['click'] == '>=7.1,<8.0'
+        assert dependencies['six'] == '*'
+
+        result = runner.invoke(cli_micc.main, ['-p', 'FOO', 'deps', 'add', 'click<7', 'six==1.15'])
+        assert result.exit_code == 1
+        assert "click: '>=7.1,<8.0', '<7'" in result.output
+        assert writes == 2 * ['pyproject.toml']
+        dependencies = et_micc.tomlfile.read_toml('FOO/pyproject.toml')['tool']['poetry']['dependencies']
+        assert dependencies['click'] == '>=7.1,<8.0'
+        assert dependencies['six'] == '==1.15'
+
+        # an invalid constraint in pyproject.toml is reported, not raised
+        pyproject_toml = Path('FOO/pyproject.toml')
+        pyproject_toml.write_text(pyproject_toml.read_text().replace('numpy = "^1.19"', 'numpy = ">=1.0 <2 foo"'))
+        result = runner.invoke(cli_micc.main, ['-p', 'FOO', 'deps', 'add', 'numpy^1.2'])
+        assert result.exit_code == 1
+        assert not isinstance(result.exception, et_micc.versions.ConstraintError)
+        assert 'Invalid version constraints' in result.output and 'numpy' in result.output
+
+
+def test_trace():
+    """Commands compute only the project attributes they need."""
+    runner = CliRunner()
+    with in_empty_tmp_dir():
+        run(runner, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none'])
+        log = Path('FOO/FOO.micc.log').read_text()
+        result = run(runner, ['--trace', '-p', 'FOO', 'version', '-s'])
+        trace = result.output.splitlines()[-1]
+        assert result.output.startswith('0.0.0')
+        assert trace.startswith('[TRACE]') and 'version' in trace
+        for name in ('logger', 'template_parameters', 'components', 'pyproject_toml'):
+            assert name not in trace
+        assert Path('FOO/FOO.micc.log').read_text() == log
+
+        trace = run(runner, ['--trace', '-p', 'FOO', 'tag']).output.splitlines()[-1]
+        assert 'logger' in trace
+        for name in ('template_parameters', 'components', 'pyproject_toml', 'structure'):
+            assert name not in trace
+
+
+def run_concurrently(commands, env):
+    """Run micc commands in concurrent processes, and return their exit codes."""
+    processes = [ subprocess.Popen( [sys.executable, '-m', 'et_micc.cli_micc', *command]
+                                  , env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                                  )
+                  for command in commands
+                ]
+    return [process.wait() for process in processes]
+
+
+def test_concurrent_expansion():
+    """Run 32 ``micc create`` and ``micc add`` commands at the same time.
+
+    All processes share the same (initially empty) template cache.
+    """
+    n = 32
+    with in_empty_tmp_dir() as tmp:
+        home = tmp / 'home'
+        (home / '.et_micc').mkdir(parents=True)
+        shutil.copyfile(str(Path(et_micc.__file__).parent / 'micc.json'), str(home / '.et_micc' / 'micc.json'))
+        env = dict(os.environ
+                  , HOME=str(home)
+                  , PYTHONPATH=os.pathsep.join([str(Path(et_micc.__file__).parent.parent), os.environ.get('PYTHONPATH', '')])
+                  , GIT_AUTHOR_NAME='micc', GIT_AUTHOR_EMAIL='micc@micc'
+                  , GIT_COMMITTER_NAME='micc', GIT_COMMITTER_EMAIL='micc@micc'
+                  )
+        projects = [f'FOO{i}' for i in range(n)]
+        exit_codes = run_concurrently([['-p', project, 'create', '-p', '--allow-nesting', '--remote', 'none']
+                                       for project in projects], env)
+        assert exit_codes == n * [0]
+        exit_codes = run_concurrently([['-p', project, 'add', '--py', 'bar']
+                                       for project in projects], env)
+        assert exit_codes == n * [0]
+        for project in projects:
+            package = project.lower()
+            assert Path(project, package, '__init__.py').exists()
+            assert Path(project, 'docs', 'conf.py').exists()
+            assert Path(project, package, 'bar.py').exists()
+            assert f"Module {package}.bar" in Path(project, package, 'bar.py').read_text()
+        # the expansion leaves nothing behind, except for the projects:
+        assert sorted(os.listdir(str(tmp))) == sorted(projects + ['home'])
+
  
 # def test_scenario_1b():
 #     """
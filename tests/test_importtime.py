@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the start up time of read-only micc commands.
+
+The commands are run in a fresh Python process with ``python -X importtime``,
+and the modules imported are verified. Heavy dependencies must only be imported
+by the commands that need them.
+"""
+
+import os
+import sys
+import subprocess
+from pathlib import Path
+
+from click.testing import CliRunner
+
+import et_micc
+import et_micc.tomlfile
+from et_micc import cli_micc
+from tests.helpers import in_empty_tmp_dir, report
+
+HEAVY_MODULES = ['requests', 'pypi_simple', 'cookiecutter', 'jinja2', 'semantic_version', 'et_micc.render']
+if et_micc.tomlfile._toml_reader is not None:
+    # read-only commands do not need the round-tripping TOML parser
+    HEAVY_MODULES.append('tomlkit')
+
+
+def importtime(arguments, cwd):
+    """Run ``micc <arguments>`` with ``python -X importtime``.
+
+    :returns: dict mapping the names of the modules imported to their cumulative import time (in us).
+    """
+    env = dict(os.environ
+              , PYTHONPATH=os.pathsep.join([str(Path(et_micc.__file__).parent.parent), os.environ.get('PYTHONPATH', '')])
+              )
+    completed = subprocess.run( [sys.executable, '-X', 'importtime', '-c'
+                                , 'import sys; from et_micc.cli_micc import main; sys.exit(main())', *arguments]
+                              , cwd=str(cwd), env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                              )
+    assert completed.returncode == 0, completed.stderr.decode('utf-8')
+    modules = {}
+    for line in completed.stderr.decode('utf-8').splitlines():
+        if line.startswith('import time:') and not line.endswith('imported package'):
+            fields = line[len('import time:'):].split('|')
+            if fields[0].strip().isdigit():
+                modules[fields[2].strip()] = int(fields[1])
+    return modules
+
+
+def test_read_only_commands():
+    runner = CliRunner()
+    with in_empty_tmp_dir():
+        report(runner.invoke(cli_micc.main, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none']))
+        for arguments in (['version', '-s'], ['info'], ['--version']):
+            modules = importtime(arguments, 'FOO')
+            print(f"micc {' '.join(arguments)}: {modules['et_micc.cli_micc'] / 1000:.1f} ms")
+            for module in HEAVY_MODULES:
+                assert module not in modules, f"'micc {' '.join(arguments)}' imports {module}"
+
+
+# ==============================================================================
+# The code below is for debugging a particular test in eclipse/pydev.
+# (normally all tests are run with pytest)
+# ==============================================================================
+if __name__ == "__main__":
+    the_test_you_want_to_debug = test_read_only_commands
+
+    print(f"__main__ running {the_test_you_want_to_debug}")
+    the_test_you_want_to_debug()
+    print('-*# finished #*-')
+# ==============================================================================
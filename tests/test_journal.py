@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for et_micc.journal module."""
+
+import os
+from pathlib import Path
+
+import et_micc.journal
+import et_micc.render
+from tests.helpers import in_empty_tmp_dir
+
+
+def stage(journal, path, content):
+    source = Path('source')
+    source.write_text('')
+    journal.stage(path, et_micc.render.RenderedFile(source, content))
+
+
+def test_commit():
+    with in_empty_tmp_dir():
+        project = Path('FOO')
+        project.mkdir()
+        (project / 'a.txt').write_text("old a\n")
+        inode = (project / 'a.txt').stat().st_ino
+
+        journal = et_micc.journal.Journal(project)
+        stage(journal, project / 'a.txt', "new a\n")
+        stage(journal, project / 'docs' / 'b.txt', "new b\n")
+        # nothing is modified before the commit
+        assert (project / 'a.txt').read_text() == "old a\n"
+        assert not (project / 'docs' / 'b.txt').exists()
+
+        journal.commit(backup=[project / 'a.txt'])
+        journal.close()
+        assert (project / 'a.txt').read_text() == "new a\n"
+        assert (project / 'docs' / 'b.txt').read_text() == "new b\n"
+        # the backup is the original file, not a copy
+        assert (project / 'a.txt.bak').stat().st_ino == inode
+        assert sorted(os.listdir(str(project))) == ['a.txt', 'a.txt.bak', 'docs']
+
+
+def test_rollback():
+    with in_empty_tmp_dir():
+        project = Path('FOO')
+        project.mkdir()
+        (project / 'a.txt').write_text("old a\n")
+
+        journal = et_micc.journal.Journal(project)
+        stage(journal, project / 'a.txt', "new a\n")
+        stage(journal, project / 'docs' / 'b.txt', "new b\n")
+        journal.commit(backup=[project / 'a.txt'])
+        assert (project / 'a.txt.bak').exists()
+        journal.rollback()
+        assert (project / 'a.txt').read_text() == "old a\n"
+        assert os.listdir(str(project)) == ['a.txt']
+
+
+def test_recover():
+    with in_empty_tmp_dir():
+        project = Path('FOO')
+        project.mkdir()
+        (project / 'a.txt').write_text("old a\n")
+
+        journal = et_micc.journal.Journal(project)
+        stage(journal, project / 'a.txt', "new a\n")
+        stage(journal, project / 'b.txt', "new b\n")
+        # interrupt the commit after the first file
+        staged = journal.entries[1]['staged']
+        os.rename(staged, staged + '.x')
+        try:
+            journal.commit()
+        except FileNotFoundError:
+            pass
+        os.rename(staged + '.x', staged)
+        assert (project / et_micc.journal.JOURNAL_FILE).exists()
+
+        assert et_micc.journal.recover(project)
+        assert (project / 'a.txt').read_text() == "old a\n"
+        assert os.listdir(str(project)) == ['a.txt']
+        assert not et_micc.journal.recover(project)
+
+
+# ==============================================================================
+# The code below is for debugging a particular test in eclipse/pydev.
+# (normally all tests are run with pytest)
+# ==============================================================================
+if __name__ == "__main__":
+    the_test_you_want_to_debug = test_recover
+
+    print(f"__main__ running {the_test_you_want_to_debug}")
+    the_test_you_want_to_debug()
+    print('-*# finished #*-')
+# ==============================================================================
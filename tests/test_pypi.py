@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for et_micc.pypi module."""
+
+import time
+import logging
+import random
+import shutil
+from pathlib import Path
+
+from click.testing import CliRunner
+
+import et_micc.pypi
+import et_micc.utils
+from et_micc import cli_micc
+from tests.helpers import SimpleIndex, in_empty_tmp_dir, report
+
+NAMES = ['click', 'et-micc', 'numpy', 'requests', 'zope-interface']
+
+
+def test_normalize():
+    assert et_micc.pypi.normalize('Zope.Interface') == 'zope-interface'
+    assert et_micc.pypi.normalize('et_micc') == 'et-micc'
+    assert et_micc.pypi.normalize('a-_.b') == 'a-b'
+
+
+def test_bloom_filter():
+    bloom = et_micc.pypi.BloomFilter.for_capacity(1000)
+    keys = [f'name-{i}'.encode() for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f'other-{i}'.encode() in bloom for i in range(1000))
+    assert false_positives < 50
+
+
+def test_name_index(tmp_path):
+    with SimpleIndex(NAMES) as server:
+        index = et_micc.pypi.NameIndex(tmp_path, server.url)
+        assert not index.available()
+        assert index.contains('numpy') is None
+
+        assert index.refresh()
+        assert index.meta['count'] == len(NAMES)
+        for name in NAMES:
+            assert index.contains(name)
+        assert index.contains('Zope.Interface')
+        assert index.contains('ET_micc')
+        assert not index.contains('et-micc-2')
+        assert not index.contains('a')
+        assert not index.contains('zzz')
+        assert list(index.names()) == NAMES
+
+        # the snapshot is persistent, and not downloaded again if not modified
+        index = et_micc.pypi.NameIndex(tmp_path, server.url)
+        assert index.contains('click')
+        assert not index.refresh()
+        assert len(server.requests) == 2
+
+        server.names.append('new-name')
+        server.serial += 1
+        assert index.refresh()
+        assert index.contains('new_name')
+
+
+def test_exists_on_pypi(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    with SimpleIndex(NAMES + ['registered-later']) as server:
+        monkeypatch.setenv('MICC_PYPI_INDEX', server.url)
+        et_micc.pypi.get_index().write(NAMES)
+        # names in the snapshot are not verified online
+        assert et_micc.utils.existsOnPyPI('numpy') is True
+        assert server.requests == []
+        # other names are
+        assert et_micc.utils.existsOnPyPI('registered_later') is True
+        assert et_micc.utils.existsOnPyPI('foo') is False
+        assert len(server.requests) == 2
+    # offline, names that are not in the snapshot cannot be verified
+    assert et_micc.utils.existsOnPyPI('numpy') is True
+    unverified = et_micc.utils.existsOnPyPI('bar')
+    assert isinstance(unverified, et_micc.pypi.Unverified)
+    assert isinstance(unverified.error, Exception)
+    monkeypatch.setenv('MICC_PYPI_INDEX', 'http://127.0.0.1:9/simple/')
+    assert isinstance(et_micc.utils.existsOnPyPI('foo'), Exception)
+
+
+def test_distance():
+    def reference(a, b):
+        d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+        for i in range(1, len(a) + 1):
+            for j in range(1, len(b) + 1):
+                d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+                if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                    d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+        return d[-1][-1]
+
+    assert et_micc.pypi.distance(b'requests', b'reqeusts') == 1
+    assert et_micc.pypi.distance(b'numpy', b'nunpi') == 2
+    assert et_micc.pypi.distance(b'', b'abc') == 3
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = ''.join(rng.choice('abc') for _ in range(rng.randrange(8)))
+        b = ''.join(rng.choice('abc') for _ in range(rng.randrange(8)))
+        assert et_micc.pypi.distance(a, b) == reference(a, b), (a, b)
+
+
+def test_similar(tmp_path):
+    rng = random.Random(0)
+    names = NAMES + ['requests-mock', 'numpy2', 'py', 'pyx', 'a']
+    names += [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz-') for _ in range(rng.randrange(2, 16))) for _ in range(2000)]
+    index = et_micc.pypi.NameIndex(tmp_path, 'http://localhost/simple/')
+    assert index.similar('numpy') == []
+    index.write(names)
+    assert index.similar('reqests') == [('requests', 1)]
+    assert index.similar('Requets') == [('requests', 1)]
+    assert index.similar('nunpy') == [('numpy', 1)]
+    assert index.similar('nunpy', 2)[:2] == [('numpy', 1), ('numpy2', 2)]
+    assert ('requests', 0) not in index.similar('requests')
+    assert ('pyx', 1) in index.similar('py')
+    keys = {et_micc.pypi.normalize(name) for name in names}
+    for query in ['requests-moc', 'ab', 'click', 'zope_interface', 'q']:
+        for k in (1, 2):
+            expected = sorted((d, other) for other in keys
+                              for d in [et_micc.pypi.distance(query.replace('_', '-'), other)] if 0 < d <= k)
+            assert index.similar(query, k, limit=None) == [(other, d) for d, other in expected]
+
+    # a snapshot without trigram index gets one on first use
+    (tmp_path / 'names.grams').unlink()
+    index = et_micc.pypi.NameIndex(tmp_path, 'http://localhost/simple/')
+    assert index.similar('reqests') == [('requests', 1)]
+    assert (tmp_path / 'names.grams').stat().st_size == index.meta['grams']
+
+
+def test_name_checker(caplog):
+    names = [f'name-{i}' for i in range(16)]
+    with SimpleIndex(names[::2], delay=0.2) as server:
+        checker = et_micc.pypi.NameChecker(server.url, jobs=4)
+        start = time.perf_counter()
+        result = checker.check(names)
+        seconds = time.perf_counter() - start
+        assert result == {name: i % 2 == 0 for i, name in enumerate(names)}
+        # 16 requests of 0.2s, 4 at a time, over at most 4 keep-alive connections
+        assert seconds < 2.4
+        assert len(server.connections) <= 4
+        # answers are cached
+        assert checker.check(['Name_0', 'name-1']) == {'Name_0': True, 'name-1': False}
+        assert len(server.requests) == len(names)
+        # raising the number of jobs enlarges the connection pool
+        checker.jobs = 8
+        with caplog.at_level(logging.WARNING, logger='urllib3'):
+            result = checker.check([f'other-{i}' for i in range(16)])
+        assert not any(result.values())
+        assert 'Connection pool is full' not in caplog.text
+        checker.close()
+
+
+def test_check_names_cli(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    runner = CliRunner()
+    with SimpleIndex(NAMES) as server:
+        monkeypatch.setenv('MICC_PYPI_INDEX', server.url)
+        result = runner.invoke(cli_micc.main, ['check-names', 'numpy', 'et-micc-2'])
+        report(result)
+        assert 'numpy      in use' in result.output
+        assert 'et-micc-2  available' in result.output
+        et_micc.pypi.get_index().write(NAMES)
+        result = runner.invoke(cli_micc.main, ['check-names', '--similar', 'et-micc-2'])
+        assert 'similar: et-micc' in result.output
+    # offline, a name that is not in the snapshot is not reported as available
+    result = runner.invoke(cli_micc.main, ['check-names', 'numpy', 'et-micc-3'])
+    assert 'numpy      in use' in result.output
+    assert 'et-micc-3  unverified (not in the snapshot of ' in result.output
+    assert result.exit_code == 1
+    monkeypatch.setenv('MICC_PYPI_INDEX', 'http://127.0.0.1:9/simple/')
+    result = runner.invoke(cli_micc.main, ['check-names', 'foo'])
+    assert 'unknown' in result.output
+    assert result.exit_code == 1
+
+
+def test_create_publish_similar(tmp_path, monkeypatch):
+    (tmp_path / '.et_micc').mkdir()
+    shutil.copy(str(Path.home() / '.et_micc' / 'micc.json'), str(tmp_path / '.et_micc'))
+    monkeypatch.setenv('HOME', str(tmp_path))
+    runner = CliRunner()
+    with SimpleIndex(NAMES) as server:
+        monkeypatch.setenv('MICC_PYPI_INDEX', server.url)
+        et_micc.pypi.get_index().write(NAMES)
+        with in_empty_tmp_dir():
+            result = runner.invoke(cli_micc.main, ['-p', 'reqests', 'create', '--publish', '--allow-nesting', '--remote', 'none'])
+            report(result)
+            assert "similar to names already in use on PyPI:\n        requests\n" in result.output
+            assert Path('reqests/pyproject.toml').exists()
+
+
+def test_create_publish_offline(tmp_path, monkeypatch):
+    (tmp_path / '.et_micc').mkdir()
+    shutil.copy(str(Path.home() / '.et_micc' / 'micc.json'), str(tmp_path / '.et_micc'))
+    monkeypatch.setenv('HOME', str(tmp_path))
+    runner = CliRunner()
+    with SimpleIndex(NAMES) as server:
+        monkeypatch.setenv('MICC_PYPI_INDEX', server.url)
+        et_micc.pypi.get_index().write(NAMES)
+    with in_empty_tmp_dir():
+        # offline, a name in the snapshot is in use
+        result = runner.invoke(cli_micc.main, ['-p', 'numpy', 'create', '--publish', '--allow-nesting', '--remote', 'none'])
+        assert result.exit_code
+        assert not Path('numpy/pyproject.toml').exists()
+        # other names are not verified, but the project is created
+        result = runner.invoke(cli_micc.main, ['-p', 'FOO', 'create', '--publish', '--allow-nesting', '--remote', 'none'])
+        report(result)
+        assert result.exit_code == 0
+        assert "could not be verified online" in result.output
+        assert "not in the snapshot of " in result.output
+        assert "is still available on PyPI" not in result.output
+        assert Path('FOO/pyproject.toml').exists()
+
+
+# ==============================================================================
+# The code below is for debugging a particular test in eclipse/pydev.
+# (normally all tests are run with pytest)
+# ==============================================================================
+if __name__ == "__main__":
+    the_test_you_want_to_debug = test_name_index
+
+    print(f"__main__ running {the_test_you_want_to_debug}")
+    the_test_you_want_to_debug()
+    print('-*# finished #*-')
+# ==============================================================================
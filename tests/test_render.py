@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for et_micc.render module."""
+
+import os
+import shutil
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import et_micc.expand
+import et_micc.render
+from tests.helpers import in_empty_tmp_dir
+
+
+def test_render_parameters():
+    parameters = {'project_name': 'FOO'
+                 ,'github_repo': '{{ cookiecutter.project_name }}'
+                 ,'license': ['MIT license', 'BSD license']
+                 ,'_private': '{{ not rendered }}'
+                 }
+    rendered = et_micc.render.render_parameters(parameters)
+    assert rendered['github_repo'] == 'FOO'
+    assert rendered['license'] == 'MIT license'
+    assert rendered['_private'] == '{{ not rendered }}'
+
+
+def test_render_in_memory():
+    tree = et_micc.render.TemplateTree(et_micc.expand.resolve_template('module-py'))
+    parameters = {'project_name': 'FOO', 'package_name': 'foo', 'module_name': 'bar', 'py': 'py'}
+    with in_empty_tmp_dir():
+        file_set = tree.render(parameters)
+        # nothing is written while rendering
+        assert not Path('FOO').exists()
+    assert sorted(file_set) == [str(Path('FOO/foo/bar.py')), str(Path('FOO/tests/test_bar.py'))]
+    assert 'Module foo.bar' in file_set[str(Path('FOO/foo/bar.py'))].content
+
+
+def test_manifest():
+    tree = et_micc.render.TemplateTree(et_micc.expand.resolve_template('module-py'))
+    assert tree.path_parameters == ['module_name', 'package_name', 'project_name', 'py']
+    parameters = {'project_name': 'FOO', 'package_name': 'foo', 'module_name': 'bar', 'py': 'py'}
+    manifest = tree.manifest(parameters)
+    assert sorted(manifest) == [str(Path('FOO/foo/bar.py')), str(Path('FOO/tests/test_bar.py'))]
+    # parameters that do not affect the output paths reuse the manifest
+    assert tree.manifest(dict(parameters, full_name='John Doe')) is manifest
+    assert tree.manifest(dict(parameters, module_name='baz')) is not manifest
+
+    with in_empty_tmp_dir() as tmp:
+        Path('FOO/tests').mkdir(parents=True)
+        Path('FOO/tests/test_bar.py').touch()
+        assert et_micc.expand.find_existing_files(tmp, manifest) == {str(Path('FOO/tests/test_bar.py'))}
+
+
+
+
+def test_static_files():
+    tree = et_micc.render.TemplateTree(et_micc.expand.resolve_template('package-simple-docs'))
+    parameters = {'project_name': 'FOO', 'package_name': 'foo', 'project_short_description': 'FOO project'}
+    micc_file = Path(et_micc.expand.__file__).parent / 'micc.json'
+    parameters.update(et_micc.expand.get_template_parameters(et_micc.expand.get_preferences(micc_file)))
+    file_set = tree.render(et_micc.render.render_parameters(parameters))
+    requirements = file_set[str(Path('FOO/docs/requirements.txt'))]
+    conf = file_set[str(Path('FOO/docs/conf.py'))]
+    assert isinstance(requirements, et_micc.render.StaticFile)
+    assert not isinstance(conf, et_micc.render.StaticFile)
+    with in_empty_tmp_dir():
+        requirements.write(Path('requirements.txt'))
+        assert Path('requirements.txt').read_bytes() == requirements.source.read_bytes()
+        assert requirements.hash == hashlib.sha256(Path('requirements.txt').read_bytes()).hexdigest()
+
+
+def test_now():
+    tree = et_micc.render.TemplateTree(et_micc.expand.resolve_template('package-simple-docs'))
+    parameters = {'project_name': 'FOO', 'package_name': 'foo', 'project_short_description': 'FOO project'}
+    micc_file = Path(et_micc.expand.__file__).parent / 'micc.json'
+    parameters.update(et_micc.expand.get_template_parameters(et_micc.expand.get_preferences(micc_file)))
+    parameters = et_micc.render.render_parameters(parameters)
+    conf = str(Path('FOO/docs/conf.py'))
+    # the same tree renders {% now %} at different times, also concurrently
+    times = [f'{year}-06-01T12:00:00+00:00' for year in range(2000, 2016)]
+    with ThreadPoolExecutor(4) as executor:
+        contents = list(executor.map(lambda when: tree.render(parameters, when)[conf].content, times))
+    for when, content in zip(times, contents):
+        assert f'copyright = u"{when[:4]}, ' in content
+    assert f'copyright = u"{time.strftime("%Y")}, ' in tree.render(parameters)[conf].content
+
+def test_independent_groups():
+    manifests = [('FOO/a', 'FOO/b'), ('FOO/c',), ('FOO/d', None), ('FOO/b', 'FOO/e'), (None,), ('FOO/e', 'FOO/d')]
+    assert et_micc.expand.independent_groups(manifests) == [[0, 2, 3, 5], [1], [4]]
+
+def test_template_cache():
+    with in_empty_tmp_dir():
+        template = Path('module-py')
+        shutil.copytree(str(et_micc.expand.resolve_template('module-py')), str(template))
+        cache = et_micc.render.TemplateCache(directory=Path('cache'))
+        tree = et_micc.render.TemplateTree(template, cache)
+        entries = list(Path('cache').glob('*.marshal'))
+        assert len(entries) == 1
+        # a second tree is loaded from the cache
+        tree = et_micc.render.TemplateTree(template, cache)
+        assert list(Path('cache').glob('*.marshal')) == entries
+        parameters = {'project_name': 'FOO', 'package_name': 'foo', 'module_name': 'bar', 'py': 'py'}
+        assert 'Module foo.bar' in tree.render(parameters)[str(Path('FOO/foo/bar.py'))].content
+
+        # modifying the template invalidates the cached entry
+        source = template / '{{cookiecutter.project_name}}' / '{{cookiecutter.package_name}}' / '{{cookiecutter.module_name}}.{{cookiecutter.py}}'
+        source.write_text("Module {{ cookiecutter.module_name }} modified\n")
+        tree = et_micc.render.TemplateTree(template, cache)
+        assert len(list(Path('cache').glob('*.marshal'))) == 2
+        assert tree.render(parameters)[str(Path('FOO/foo/bar.py'))].content == "Module bar modified\n"
+
+        # least recently used entries are evicted
+        old = entries[0]
+        new = [entry for entry in Path('cache').glob('*.marshal') if entry != old][0]
+        os.utime(str(old), (0, 0))
+        cache.size_limit = new.stat().st_size
+        cache.evict()
+        assert not old.exists()
+        assert new.exists()
+
+
+# ==============================================================================
+# The code below is for debugging a particular test in eclipse/pydev.
+# (normally all tests are run with pytest)
+# ==============================================================================
+if __name__ == "__main__":
+    the_test_you_want_to_debug = test_render_in_memory
+
+    print(f"__main__ running {the_test_you_want_to_debug}")
+    the_test_you_want_to_debug()
+    print('-*# finished #*-')
+# ==============================================================================
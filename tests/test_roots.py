@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for et_micc.roots module."""
+
+from pathlib import Path
+
+from click.testing import CliRunner
+
+import et_micc.roots
+from et_micc import cli_micc
+from tests.helpers import in_empty_tmp_dir, report
+
+
+class CountingReader:
+    """Replacement for et_micc.roots.read_toml that counts how many files are parsed."""
+    def __init__(self, read_toml):
+        self.read_toml = read_toml
+        self.parsed = 0
+
+    def __call__(self, path):
+        self.parsed += 1
+        return self.read_toml(path)
+
+
+def test_find_project_root():
+    runner = CliRunner()
+    read_toml = et_micc.roots.read_toml
+    et_micc.roots.read_toml = reader = CountingReader(read_toml)
+    try:
+        with in_empty_tmp_dir():
+            report(runner.invoke(cli_micc.main, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none']))
+            deep = Path('FOO/foo/a/b/c/d')
+            deep.mkdir(parents=True)
+            project_path = Path('FOO').resolve()
+
+            index = et_micc.roots.RootIndex(Path('index.json'))
+            assert et_micc.roots.find_project_root(deep, index) == project_path
+            assert reader.parsed == 1
+            assert et_micc.roots.find_project_root(deep, index) == project_path
+            # the index is persistent
+            index = et_micc.roots.RootIndex(Path('index.json'))
+            assert et_micc.roots.find_project_root(deep, index) == project_path
+            assert reader.parsed == 1
+
+            # a modified pyproject.toml is parsed again
+            pyproject_toml = Path('FOO/pyproject.toml')
+            pyproject_toml.write_text(pyproject_toml.read_text().replace('name = "FOO"', 'name = "BAR"'))
+            assert et_micc.roots.find_project_root(deep, index) == project_path
+            assert reader.parsed == 2
+            assert index.entries[str(project_path)][3] == 'BAR'
+
+            pyproject_toml.write_text("[tool.poetry]\n")
+            assert et_micc.roots.find_project_root(deep, index) is None
+            assert not et_micc.roots.is_project_root('FOO', index)
+    finally:
+        et_micc.roots.read_toml = read_toml
+
+
+def test_nesting():
+    """'micc create' refuses to nest a project, without parsing pyproject.toml
+    of the projects it created itself."""
+    runner = CliRunner()
+    read_toml = et_micc.roots.read_toml
+    et_micc.roots.read_toml = reader = CountingReader(read_toml)
+    try:
+        with in_empty_tmp_dir():
+            report(runner.invoke(cli_micc.main, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none']))
+            assert et_micc.roots.get_index().entries[str(Path('FOO').resolve())][3] == 'FOO'
+            deep = Path('FOO/foo/a/b/c/d')
+            deep.mkdir(parents=True)
+            result = runner.invoke(cli_micc.main, ['-p', str(deep / 'BAR'), 'create', '--remote', 'none'])
+            assert result.exit_code
+            assert "Specify '--allow-nesting'" in result.output
+            assert not (deep / 'BAR' / 'bar.py').exists()
+            assert reader.parsed == 0
+    finally:
+        et_micc.roots.read_toml = read_toml
+
+
+# ==============================================================================
+# The code below is for debugging a particular test in eclipse/pydev.
+# (normally all tests are run with pytest)
+# ==============================================================================
+if __name__ == "__main__":
+    the_test_you_want_to_debug = test_find_project_root
+
+    print(f"__main__ running {the_test_you_want_to_debug}")
+    the_test_you_want_to_debug()
+    print('-*# finished #*-')
+# ==============================================================================
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the micc server (et_micc.server) and its client (et_micc.client)."""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+from pathlib import Path
+
+import pytest
+
+import et_micc
+import et_micc.server
+from tests.helpers import in_empty_tmp_dir
+
+
+def test_serve():
+    # Unix domain socket paths are short, hence the socket is not in the test directory.
+    socket_dir = tempfile.mkdtemp(prefix='micc')
+    env = dict(os.environ
+              , MICC_SOCKET=os.path.join(socket_dir, 'micc.sock')
+              , PYTHONPATH=os.pathsep.join([str(Path(et_micc.__file__).parent.parent), os.environ.get('PYTHONPATH', '')])
+              )
+
+    def client(*arguments):
+        return subprocess.run( [sys.executable, '-m', 'et_micc.client', *arguments]
+                             , env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+                             )
+
+    server = subprocess.Popen([sys.executable, '-m', 'et_micc.cli_micc', 'serve'], env=env)
+    try:
+        for _ in range(100):
+            if os.path.exists(env['MICC_SOCKET']):
+                break
+            time.sleep(0.1)
+        assert server.poll() is None
+        assert os.stat(env['MICC_SOCKET']).st_mode & 0o777 == 0o600
+
+        with in_empty_tmp_dir():
+            completed = client('-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none')
+            assert completed.returncode == 0, completed.stderr
+            assert Path('FOO/pyproject.toml').exists()
+
+            completed = client('-p', 'FOO', 'version', '-s')
+            assert completed.returncode == 0, completed.stderr
+            assert completed.stdout == "0.0.0\n"
+
+            completed = client('-p', 'BAR', 'version', '-s')
+            assert completed.returncode != 0
+
+            completed = client('serve')
+            assert completed.returncode == 1
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(socket_dir)
+
+
+def test_serve_private():
+    socket_dir = tempfile.mkdtemp(prefix='micc')
+    try:
+        os.chmod(socket_dir, 0o755)
+        path = os.path.join(socket_dir, 'micc.sock')
+        assert et_micc.server.serve(path, ready=lambda: pytest.fail("the server must not start")) == 1
+        assert not os.path.exists(path)
+    finally:
+        shutil.rmtree(socket_dir)
+
+
+# ==============================================================================
+# The code below is for debugging a particular test in eclipse/pydev.
+# (normally all tests are run with pytest)
+# ==============================================================================
+if __name__ == "__main__":
+    the_test_you_want_to_debug = test_serve
+
+    print(f"__main__ running {the_test_you_want_to_debug}")
+    the_test_you_want_to_debug()
+    print('-*# finished #*-')
+# ==============================================================================
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for et_micc.sites module."""
+
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+import et_micc.sites
+from et_micc import cli_micc
+from tests.helpers import in_empty_tmp_dir, report
+
+
+def test_scan_python():
+    data = ( '# -*- coding: utf-8 -*-\n'
+             '"""Doc: __version__ = "1.2.3" """\n'
+             'π = "1.2.3"\n'
+             '__version__ = "1.2.3" # comment\n'
+             'if True:\n'
+             "    __version__ = r'1.2.3'\n"
+             'x = __version__ = "1.2.3"\n'
+             '__version__ = "1.2.30"\n'
+           ).encode('utf-8')
+    found = et_micc.sites.scan_python(data, {'__version__'}, '1.2.3')
+    assert len(found) == 2
+    for offset, length in found:
+        assert data[offset:offset + length] == b'1.2.3'
+    assert et_micc.sites.scan_python(b'__version__ = (', {'__version__'}, '1.2.3') == []
+
+
+def test_scan_cmake_history():
+    data = b'cmake_minimum_required(VERSION 3.4)\nproject(foo\n  VERSION 1.2.3\n  LANGUAGES CXX)\n'
+    [(offset, length)] = et_micc.sites.scan_cmake(data, '1.2.3')
+    assert data[offset:offset + length] == b'1.2.3'
+    assert et_micc.sites.scan_cmake(data, '3.4') == []
+
+    data = b'History\n=======\n\nv1.2.30 (2020)\n======\n\nv1.2.3 (2019)\n======\n\ntext\n'
+    [(offset, length)] = et_micc.sites.scan_history(data, '1.2.3')
+    assert data[offset:offset + length] == b'v1.2.3 (2019)'
+    assert et_micc.sites.scan_history(b'1.2.3 is not a heading\n', '1.2.3') == []
+
+
+def test_rewrite(tmp_path):
+    (tmp_path / 'foo').mkdir()
+    (tmp_path / 'foo' / '__init__.py').write_text('__version__ = "0.9.0"\n')
+    (tmp_path / 'HISTORY.rst').write_text('v0.9.0 (2019-01-01)\n' + 20 * '=' + '\n\ntext\n')
+    sites = et_micc.sites.scan(tmp_path, 'foo', '0.9.0')
+    assert [site['kind'] for site in sites] == ['python', 'history']
+
+    modified = et_micc.sites.rewrite(tmp_path, sites, '0.9.0', '0.10.0')
+    assert sorted(modified) == ['HISTORY.rst', str(Path('foo/__init__.py'))]
+    assert (tmp_path / 'foo' / '__init__.py').read_text() == '__version__ = "0.10.0"\n'
+    history = (tmp_path / 'HISTORY.rst').read_text().splitlines()
+    assert history[0].startswith('v0.10.0 (') and history[1] == 20 * '='
+    assert history[3:5] == ['v0.9.0 (2019-01-01)', 20 * '=']
+
+    # the sites are stale now: nothing is modified
+    with pytest.raises(ValueError):
+        et_micc.sites.rewrite(tmp_path, sites, '0.9.0', '1.0.0')
+    assert (tmp_path / 'foo' / '__init__.py').read_text() == '__version__ = "0.10.0"\n'
+
+
+def test_version_cmd():
+    runner = CliRunner()
+    with in_empty_tmp_dir():
+        report(runner.invoke(cli_micc.main, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none']))
+        conf_py = Path('FOO/docs/conf.py')
+        conf_py.write_text(conf_py.read_text().replace('release = foo.__version__', "release = '0.0.0'"))
+        Path('FOO/CMakeLists.txt').write_text('project(foo VERSION 0.0.0)\n')
+
+        report(runner.invoke(cli_micc.main, ['-p', 'FOO', 'version', '-m']))
+        assert '__version__ = "0.1.0"' in Path('FOO/foo/__init__.py').read_text()
+        assert "release = '0.1.0'" in conf_py.read_text()
+        assert 'version = foo.__version__' in conf_py.read_text()
+        assert Path('FOO/CMakeLists.txt').read_text() == 'project(foo VERSION 0.1.0)\n'
+        assert Path('FOO/HISTORY.rst').read_text().index('v0.1.0 (') < Path('FOO/HISTORY.rst').read_text().index('v0.0.0 (')
+
+        report(runner.invoke(cli_micc.main, ['-p', 'FOO', 'version', '-p']))
+        assert '__version__ = "0.1.1"' in Path('FOO/foo/__init__.py').read_text()
+        assert Path('FOO/CMakeLists.txt').read_text() == 'project(foo VERSION 0.1.1)\n'
+
+
+def test_version_cmd_stale(monkeypatch):
+    runner = CliRunner()
+    with in_empty_tmp_dir():
+        report(runner.invoke(cli_micc.main, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none']))
+
+        def rewrite(project_path, sites, current, new):
+            raise ValueError("Stale version site.")
+        monkeypatch.setattr(et_micc.sites, 'rewrite', rewrite)
+        result = runner.invoke(cli_micc.main, ['-p', 'FOO', 'version', '-m'])
+        assert result.exit_code == 1
+        assert 'The version was not updated' in result.output
+        # pyproject.toml is left unchanged too
+        assert 'version = "0.0.0"' in Path('FOO/pyproject.toml').read_text()
+        assert '__version__ = "0.0.0"' in Path('FOO/foo/__init__.py').read_text()
+
+
+# ==============================================================================
+# The code below is for debugging a particular test in eclipse/pydev.
+# (normally all tests are run with pytest)
+# ==============================================================================
+if __name__ == "__main__":
+    the_test_you_want_to_debug = test_version_cmd
+
+    print(f"__main__ running {the_test_you_want_to_debug}")
+    the_test_you_want_to_debug()
+    print('-*# finished #*-')
+# ==============================================================================
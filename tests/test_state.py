@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for et_micc.state module."""
+
+from pathlib import Path
+
+from click.testing import CliRunner
+
+import et_micc.project
+import et_micc.state
+import et_micc.utils
+from et_micc import cli_micc
+from tests.helpers import in_empty_tmp_dir, report
+from tests.test_roots import CountingReader
+
+
+def test_snapshot():
+    """The project facts are loaded from .micc/state, until pyproject.toml changes."""
+    runner = CliRunner()
+    resolution = et_micc.state.TIMESTAMP_RESOLUTION_NS
+    read_toml = et_micc.utils.read_toml
+    et_micc.state.TIMESTAMP_RESOLUTION_NS = 0
+    et_micc.utils.read_toml = et_micc.project.read_toml = reader = CountingReader(read_toml)
+    try:
+        with in_empty_tmp_dir():
+            report(runner.invoke(cli_micc.main, ['-p', 'FOO', 'create', '-p', '--allow-nesting', '--remote', 'none']))
+            report(runner.invoke(cli_micc.main, ['-p', 'FOO', 'info']))
+            assert Path('FOO/.micc/state').exists()
+
+            reader.parsed = 0
+            result = runner.invoke(cli_micc.main, ['-p', 'FOO', '-vvv', 'info'])
+            report(result)
+            assert 'version: 0.0.0' in result.output
+            assert 'foo/__init__.py' in result.output
+            assert reader.parsed == 0
+
+            pyproject_toml = Path('FOO/pyproject.toml')
+            pyproject_toml.write_text(pyproject_toml.read_text().replace('version = "0.0.0"', 'version = "1.2.3"'))
+            result = runner.invoke(cli_micc.main, ['-p', 'FOO', 'info'])
+            report(result)
+            assert 'version: 1.2.3' in result.output
+            assert reader.parsed == 1
+    finally:
+        et_micc.state.TIMESTAMP_RESOLUTION_NS = resolution
+        et_micc.utils.read_toml = et_micc.project.read_toml = read_toml
+
+
+def test_stale_entry(tmp_path):
+    state = et_micc.state.ProjectState(tmp_path)
+    source = tmp_path / 'source'
+    source.write_text('a')
+    sources = state.signatures(['source', 'missing'])
+    state.put('facts', {'a': 1}, sources)
+    # recently modified sources are not trusted
+    assert et_micc.state.ProjectState(tmp_path).get('facts') is None
+
+    resolution = et_micc.state.TIMESTAMP_RESOLUTION_NS
+    et_micc.state.TIMESTAMP_RESOLUTION_NS = 0
+    try:
+        assert et_micc.state.ProjectState(tmp_path).get('facts') == {'a': 1}
+        source.write_text('ab')
+        assert et_micc.state.ProjectState(tmp_path).get('facts') is None
+    finally:
+        et_micc.state.TIMESTAMP_RESOLUTION_NS = resolution
+
+
+# ==============================================================================
+# The code below is for debugging a particular test in eclipse/pydev.
+# (normally all tests are run with pytest)
+# ==============================================================================
+if __name__ == "__main__":
+    the_test_you_want_to_debug = test_snapshot
+
+    print(f"__main__ running {the_test_you_want_to_debug}")
+    the_test_you_want_to_debug()
+    print('-*# finished #*-')
+# ==============================================================================
@@ -5,7 +5,7 @@
 import shutil
 from pathlib import Path
 
-from et_micc.tomlfile import TomlFile
+from et_micc.tomlfile import TomlFile, read_toml
 
 
 def test_exists():
@@ -19,6 +19,13 @@ def test_read():
     assert project_name=='et-micc'
 
 
+def test_read_toml():
+    pyproject = read_toml('pyproject.toml')
+    toml = TomlFile('pyproject.toml')
+    assert pyproject['tool']['poetry']['name'] == 'et-micc'
+    assert pyproject['tool']['poetry']['scripts'] == dict(toml['tool']['poetry']['scripts'])
+
+
 def test_write():
     c = Path('copy.toml')
     if c.exists():
@@ -38,6 +45,30 @@ def test_write():
     assert not c.exists()
 
 
+def test_save():
+    c = Path('copy.toml')
+    shutil.copy('pyproject.toml', str(c))
+    try:
+        toml = TomlFile(c)
+        inode = c.stat().st_ino
+        # nothing changed semantically: nothing is written
+        toml.set(('tool', 'poetry', 'name'), 'et-micc')
+        assert toml.dirty == {('tool', 'poetry', 'name')}
+        assert not toml.save()
+        assert not toml.dirty
+        assert c.stat().st_ino == inode
+
+        toml.set(('tool', 'poetry', 'version'), '9.9.9')
+        assert toml.save()
+        # the file was replaced atomically
+        assert c.stat().st_ino != inode
+        assert read_toml(c)['tool']['poetry']['version'] == '9.9.9'
+        assert c.read_text() == Path('pyproject.toml').read_text().replace(
+            f'version = "{read_toml("pyproject.toml")["tool"]["poetry"]["version"]}"', 'version = "9.9.9"', 1)
+    finally:
+        c.unlink()
+
+
 # ==============================================================================
 # The code below is for debugging a particular test in eclipse/pydev.
 # (normally all tests are run with pytest)
@@ -46,6 +46,11 @@ def test_version_range():
     assert bounds[0] == vv
     assert bounds[1] == vu
 
+    assert et_micc.utils.validate_intersection(et_micc.utils.intersect(bounds, (None, None)))
+    assert not et_micc.utils.validate_intersection(
+        et_micc.utils.intersect(et_micc.utils.version_range(">=2.0.0"), et_micc.utils.version_range("<2.0.0"))
+    )
+
 
 def test_convert_caret_specification():
     spec = ">=1.1.2"
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for et_micc.versions module."""
+
+import pytest
+
+from et_micc.versions import parse, intersect, merge, resolve, parse_requirement, version, ConstraintError
+
+
+def test_parse():
+    assert str(parse('^1.2.3')) == '>=1.2.3,<2.0.0'
+    assert str(parse('^0.2.3')) == '>=0.2.3,<0.3.0'
+    assert str(parse('^0.0.3')) == '>=0.0.3,<0.0.4'
+    assert str(parse('~1.2.3')) == '>=1.2.3,<1.3.0'
+    assert str(parse('~=1.2')) == '>=1.2,<2.0'
+    assert str(parse('1.2.*')) == '>=1.2,<1.3'
+    assert str(parse('*')) == '*'
+    assert str(parse('!=1.2.*')) == '<1.2 || >=1.3'
+    assert str(parse('>=1.0 <2.0')) == '>=1.0,<2.0'
+    assert str(parse('^1.2 || ^2.0')) == '>=1.2,<3.0'
+    assert str(parse('1.2.3')) == '==1.2.3'
+    assert parse('^1.2') is parse('^1.2') # memoized
+    for constraint in ('>=', 'abc', '~=1', '>=1.*', '^1 ||'):
+        with pytest.raises(ConstraintError):
+            parse(constraint)
+
+
+def test_versions():
+    assert version('1.2') == version('1.2.0')
+    assert version('1.2.0rc1') < version('1.2.0') < version('1.2.0.post1') < version('1.10')
+    assert '1.6.0' not in parse('!=1.6.*')
+    assert '1.7' in parse('!=1.6.*')
+    assert '2.0.0' not in parse('^1.2')
+
+
+def test_intersect():
+    assert str(intersect(['^1.2', '>=1.5', '!=1.6.0', '<1.8'])) == '>=1.5,<1.6.0 || >1.6.0,<1.8'
+    assert not intersect(['<1.2', '>=1.2'])
+    assert str(intersect(['<=1.2', '>=1.2'])) == '==1.2'
+    assert parse('^1.2 || ^3').complement() == parse('<1.2 || >=2.0,<3 || >=4')
+
+
+def test_merge():
+    assert merge('^1.2', '^1.2.3') == ('^1.2.3', False)
+    assert merge('>=1.0', '^1.2') == ('^1.2', False)
+    assert merge('^1.2', '>=1.0') == ('^1.2', False)
+    assert merge('^1.2', '>=1.5') == ('>=1.5,<2.0', False)
+    assert merge('^1.2', '^2.0') == ('^2.0', True)
+    assert merge('^2.0', '^1.2') == ('^2.0', True)
+
+
+
+def test_resolve():
+    assert parse_requirement('numpy >= 1.18, <2') == ('numpy', '>= 1.18, <2')
+    assert parse_requirement('click@^7.0') == ('click', '^7.0')
+    assert parse_requirement('requests[security] (>=2.0) ; python_version<"3.8"') == ('requests', '>=2.0')
+    assert parse_requirement('six') == ('six', '*')
+    assert parse_requirement('  # comment') is None
+    updates, conflicts, invalid = resolve({'click': '^7.0', 'numpy': '>=1.0', 'six': '*'}
+                                , [('numpy', '^1.18'), ('numpy', '<1.20'), ('six', '*'), ('pytest', '^5'), ('click', '<7.0')]
+                                )
+    assert updates == {'numpy': '>=1.18,<1.20', 'pytest': '^5'}
+    assert conflicts == {'click': ['^7.0', '<7.0']}
+    assert invalid == {}
+    updates, conflicts, invalid = resolve({'numpy': '>=1.0 <2 foo', 'six': '*'}, [('numpy', '^1.2'), ('six', '^1.15')])
+    assert updates == {'six': '^1.15'} and conflicts == {}
+    assert isinstance(invalid['numpy'], ConstraintError)
+
+
+# ==============================================================================
+# The code below is for debugging a particular test in eclipse/pydev.
+# (normally all tests are run with pytest)
+# ==============================================================================
+if __name__ == "__main__":
+    the_test_you_want_to_debug = test_parse
+
+    print(f"__main__ running {the_test_you_want_to_debug}")
+    the_test_you_want_to_debug()
+    print('-*# finished #*-')
+# ==============================================================================
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for et_micc.workspace module."""
+
+import json
+from pathlib import Path
+
+from click.testing import CliRunner
+
+import et_micc.workspace
+from et_micc import cli_micc
+from tests.helpers import in_empty_tmp_dir, report
+
+
+def test_workspace():
+    runner = CliRunner()
+    with in_empty_tmp_dir():
+        for project in ('FOO', 'sub/BAR'):
+            report(runner.invoke(cli_micc.main, ['-p', project, 'create', '--allow-nesting', '--remote', 'none']))
+        Path('sub/.hidden/BAZ').mkdir(parents=True)
+        assert et_micc.workspace.find_projects('.') == [Path('./FOO'), Path('./sub/BAR')]
+
+        result = runner.invoke(cli_micc.main, ['workspace', '--json', '-j', '2', 'version', '-s'])
+        report(result)
+        assert result.exit_code == 0
+        results = sorted((json.loads(line) for line in result.output.splitlines()), key=lambda r: r['project'])
+        assert [Path(r['project']).name for r in results] == ['FOO', 'BAR']
+        assert all(r['exit_code'] == 0 and r['stdout'] == '0.0.0\n' for r in results)
+
+        # exit codes are aggregated
+        result = runner.invoke(cli_micc.main, ['workspace', 'add', '--py', 'foo'])
+        report(result, assert_exit_code=False)
+        assert result.exit_code == 1
+        assert "2 projects, 2 failed." in result.output
+
+        result = runner.invoke(cli_micc.main, ['workspace', 'create'])
+        assert result.exit_code == 1
+
+
+# ==============================================================================
+# The code below is for debugging a particular test in eclipse/pydev.
+# (normally all tests are run with pytest)
+# ==============================================================================
+if __name__ == "__main__":
+    the_test_you_want_to_debug = test_workspace
+
+    print(f"__main__ running {the_test_you_want_to_debug}")
+    the_test_you_want_to_debug()
+    print('-*# finished #*-')
+# ==============================================================================